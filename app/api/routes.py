@@ -1,65 +1,472 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from typing import Awaitable, BinaryIO, List, Optional, TypeVar
 
-from app.models.schemas import UploadResponse, AskRequest, AskResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Header, Request
+from fastapi.responses import Response, StreamingResponse
+
+from app.config import settings
+from app.models.schemas import (
+    UploadResponse, BulkUploadResponse, IngestStatusResponse, DocumentInfoResponse, AskRequest, AskResponse,
+    AskBatchRequest, AskBatchResponse, StatsResponse, HealthResponse
+)
+from app.services.admission import AdmissionRejected
 from app.services.buddy_store import BUDDY_DB
-from app.deps import get_rag_service
+from app.services.document_service import FileTooLarge, spool_text_upload, spool_upload
+from app.services.ingest_service import BulkFile, FAST_MODE_MAX_CHARS, IngestService, IngestQueueFull
+from app.deps import get_rag_service, get_ingest_service
 
 router = APIRouter()
 
+T = TypeVar("T")
+
+# nginx geleneği: istemci cevabı beklemeden bağlantıyı kapattı
+CLIENT_CLOSED_REQUEST = 499
+
+
+class ClientDisconnected(Exception):
+    """İstemci cevap gelmeden ayrıldı; iş iptal edildi"""
+
+
+async def cancel_on_disconnect(request: Request, work: Awaitable[T]) -> T:
+    """
+    work'ü çalıştırırken istemci bağlantısını izler. İstemci ayrılırsa work iptal
+    edilir: LLM kuyruğundaki bekleme bırakılır, Ollama isteği kapatılır.
+    """
+    task = asyncio.ensure_future(work)
+
+    async def wait_disconnect() -> None:
+        # Body okunduktan sonra gelecek tek mesaj http.disconnect'tir
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+
+    watcher = asyncio.ensure_future(wait_disconnect())
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except BaseException:
+        # Handler'ın kendisi iptal edildi (kapanış, dış timeout): work de iptal edilir,
+        # asıl hata (CancelledError) korunur
+        task.cancel()
+        watcher.cancel()
+        await asyncio.gather(task, watcher, return_exceptions=True)
+        raise
+    watcher.cancel()
+    if not task.done():
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        raise ClientDisconnected()
+    return task.result()
+
+
+def ensure_doc_ready(doc_id: str, ingest_service: IngestService) -> None:
+    """
+    doc_id yoksa 404, hâlâ indeksleniyorsa (veya indekslenemediyse) 409,
+    indekslenip bellekten atıldıysa (kalıcı store yok) 410 fırlatır
+    """
+    if doc_id in BUDDY_DB:
+        return
 
-@router.post("/upload", response_model=UploadResponse)
+    job = ingest_service.get(doc_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="doc_id not found. Upload a txt first.")
+    if job.status == "ready":
+        raise HTTPException(status_code=410, detail="Document was evicted from memory. Upload it again.")
+    if job.status == "failed":
+        raise HTTPException(status_code=409, detail=f"Document indexing failed: {job.error}")
+    raise HTTPException(status_code=409, detail=f"Document is not ready yet (status: {job.status}).")
+
+
+def _file_kind(suffix: str) -> Optional[str]:
+    if suffix not in settings.ALLOWED_EXTENSIONS:
+        return None
+    return "pdf" if suffix == ".pdf" else "markdown" if suffix == ".md" else "text"
+
+
+@router.post("/upload", response_model=UploadResponse, status_code=202)
 async def upload_txt(
     mode: str = "fast",
     file: UploadFile = File(...),
-    rag_service=Depends(get_rag_service),
+    ingest_service=Depends(get_ingest_service),
 ):
-    if not file.filename.lower().endswith(".txt"):
-        raise HTTPException(status_code=400, detail="Only .txt files are supported.")
+    suffix = os.path.splitext(file.filename.lower())[1]
+    if suffix not in settings.ALLOWED_EXTENSIONS:
+        allowed = ", ".join(settings.ALLOWED_EXTENSIONS)
+        raise HTTPException(status_code=400, detail=f"Only {allowed} files are supported.")
+
+    if mode not in ["fast", "long"]:
+        raise HTTPException(status_code=422, detail="mode must be 'fast' or 'long'.")
+
+    max_bytes = settings.MAX_FILE_SIZE_MB * 1024 * 1024
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File exceeds {settings.MAX_FILE_SIZE_MB} MB.")
 
-    raw = await file.read()
+    # Upload bloklar halinde geçici dosyaya yazılır (metinde UTF-8 doğrulanarak);
+    # dosyanın tamamı bellekte tek parça olarak tutulmaz
+    is_pdf = suffix == ".pdf"
+    fd, path = tempfile.mkstemp(prefix="upload-", suffix=suffix)
     try:
-        text = raw.decode("utf-8")
-    except Exception:
+        with os.fdopen(fd, "wb") as dest:
+            if is_pdf:
+                # Metin uzunluğu sayfalar çıkarılınca (worker'da) belli olur
+                await asyncio.to_thread(spool_upload, file.file, dest, max_bytes)
+                chars = 0
+            else:
+                chars = await asyncio.to_thread(
+                    spool_text_upload, file.file, dest, max_bytes, _file_kind(suffix) == "markdown"
+                )
+
+        if not is_pdf and chars == 0:
+            raise HTTPException(status_code=422, detail="File is empty.")
+        if mode == "fast" and chars > FAST_MODE_MAX_CHARS:
+            raise HTTPException(status_code=422, detail=f"FAST mode max {FAST_MODE_MAX_CHARS} characters.")
+    except UnicodeDecodeError:
+        os.unlink(path)
         raise HTTPException(status_code=400, detail="File must be UTF-8 encoded.")
+    except FileTooLarge:
+        os.unlink(path)
+        raise HTTPException(status_code=413, detail=f"File exceeds {settings.MAX_FILE_SIZE_MB} MB.")
+    except BaseException:
+        os.unlink(path)
+        raise
+
+    # İndeksleme arka planda yapılır; durum /documents/{doc_id}/status ile izlenir
+    try:
+        job = ingest_service.submit_file(path, mode=mode, chars=chars, kind=_file_kind(suffix))
+    except IngestQueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Ingest queue is full, retry later.",
+            headers={"Retry-After": "5"},
+        )
+
+    return UploadResponse(
+        doc_id=job.doc_id,
+        mode=mode,
+        chars=job.chars,
+        status=job.status,
+    )
+
+
+def _spool_bulk(uploads: List[UploadFile], tmp_dir: str) -> List[BulkFile]:
+    """
+    Upload'ları (zip'lerin içindeki dosyalar dahil) tmp_dir'e yazar.
+    Dosya başına MAX_FILE_SIZE_MB aşılırsa o dosya hatalı sayılır; toplam
+    BULK_MAX_MB aşılırsa FileTooLarge fırlatılır.
+    """
+    max_file = settings.MAX_FILE_SIZE_MB * 1024 * 1024
+    max_total = settings.BULK_MAX_MB * 1024 * 1024
+    files: List[BulkFile] = []
+    total = 0
+
+    def add(name: str, src: BinaryIO) -> None:
+        nonlocal total
+        if len(files) >= settings.BULK_MAX_FILES:
+            raise HTTPException(status_code=422, detail=f"At most {settings.BULK_MAX_FILES} files per bulk upload.")
+        suffix = os.path.splitext(name.lower())[1]
+        kind = _file_kind(suffix)
+        if kind is None:
+            files.append(BulkFile(filename=name, kind=None))
+            return
 
-    text = text.strip()
-    if not text:
-        raise HTTPException(status_code=422, detail="File is empty.")
+        path = os.path.join(tmp_dir, f"{len(files)}{suffix}")
+        try:
+            with open(path, "wb") as dest:
+                total += spool_upload(src, dest, max_file)
+        except FileTooLarge:
+            os.unlink(path)
+            files.append(BulkFile(filename=name, kind=kind, error=f"File exceeds {settings.MAX_FILE_SIZE_MB} MB."))
+            return
+        files.append(BulkFile(filename=name, kind=kind, path=path))
+        if total > max_total:
+            raise FileTooLarge(f"Toplu upload {max_total} byte sınırını aşıyor")
 
+    for upload in uploads:
+        if not upload.filename.lower().endswith(".zip"):
+            add(upload.filename, upload.file)
+            continue
+        try:
+            with zipfile.ZipFile(upload.file) as archive:
+                for info in archive.infolist():
+                    parts = info.filename.split("/")
+                    # Klasörler, macOS metadata'sı ve gizli dosyalar atlanır
+                    if info.is_dir() or "__MACOSX" in parts or any(p.startswith(".") for p in parts):
+                        continue
+                    with archive.open(info) as member:
+                        add(f"{upload.filename}/{info.filename}", member)
+        except zipfile.BadZipFile:
+            files.append(BulkFile(filename=upload.filename, kind=None, error="Invalid zip archive."))
+    return files
+
+
+@router.post("/upload/bulk", response_model=BulkUploadResponse)
+async def upload_bulk(
+    mode: str = "fast",
+    files: List[UploadFile] = File(...),
+    ingest_service=Depends(get_ingest_service),
+):
+    """
+    Birden çok dosya ve/veya zip arşivi: tüm dosyaların chunk'ları birlikte,
+    uzunluğa göre sıralı büyük batch'lerde embed edilir. İndeksleme bitince
+    doc_id'ler ve throughput (chunks/sec) döner.
+    """
     if mode not in ["fast", "long"]:
         raise HTTPException(status_code=422, detail="mode must be 'fast' or 'long'.")
 
-    if mode == "fast" and len(text) > 3200:
-        raise HTTPException(status_code=422, detail="FAST mode max 3200 characters.")
-    if mode == "long" and len(text) > 50000:
-        raise HTTPException(status_code=422, detail="LONG mode max 50000 characters.")
+    tmp_dir = tempfile.mkdtemp(prefix="bulk-")
+    try:
+        bulk_files = await asyncio.to_thread(_spool_bulk, files, tmp_dir)
+        if not bulk_files:
+            raise HTTPException(status_code=422, detail="No files to index.")
+        try:
+            future = ingest_service.submit_bulk(bulk_files, mode=mode)
+        except IngestQueueFull:
+            raise HTTPException(
+                status_code=503,
+                detail="Ingest queue is full, retry later.",
+                headers={"Retry-After": "5"},
+            )
+        results, stats = await asyncio.wrap_future(future)
+    except FileTooLarge:
+        raise HTTPException(status_code=413, detail=f"Bulk upload exceeds {settings.BULK_MAX_MB} MB.")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return BulkUploadResponse(
+        mode=mode,
+        doc_ids=[r["doc_id"] for r in results if r["doc_id"] is not None],
+        documents=results,
+        stats=stats,
+    )
 
+
+@router.get("/documents/{doc_id}/status", response_model=IngestStatusResponse)
+async def document_status(
+    doc_id: str,
+    ingest_service=Depends(get_ingest_service),
+):
+    job = ingest_service.get(doc_id)
+    if job is not None:
+        status = job.status
+        if status == "ready" and doc_id not in BUDDY_DB:
+            status = "evicted"
+        return IngestStatusResponse(
+            doc_id=doc_id,
+            status=status,
+            mode=job.mode,
+            chars=job.chars,
+            chunks=job.chunks,
+            progress=round(job.processed_chars / job.chars, 3) if job.chars else None,
+            error=job.error,
+        )
+
+    # Job kaydı silinmiş olabilir; doküman store'daysa hazırdır
+    if doc_id in BUDDY_DB:
+        doc = BUDDY_DB[doc_id]
+        return IngestStatusResponse(
+            doc_id=doc_id,
+            status="ready",
+            mode=doc.mode,
+            chars=len(doc.text),
+            chunks=len(doc),
+            progress=1.0,
+        )
+
+    raise HTTPException(status_code=404, detail="doc_id not found.")
+
+
+@router.get("/documents/{doc_id}", response_model=DocumentInfoResponse)
+async def document_info(
+    doc_id: str,
+    ingest_service=Depends(get_ingest_service),
+):
+    """Doküman boyutu ve bellek maliyeti (kapasite planlaması için)"""
+    ensure_doc_ready(doc_id, ingest_service)
     try:
-        doc_id = rag_service.build_index_for_text(text=text, mode=mode)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        info = BUDDY_DB.describe(doc_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="doc_id not found.")
+    return DocumentInfoResponse(doc_id=doc_id, **info)
 
-    doc = BUDDY_DB[doc_id]
 
-    return UploadResponse(
-        doc_id=doc_id,
-        mode=mode,
-        chars=len(text),
-        chunks=len(doc.chunks),
+@router.delete("/documents/{doc_id}", status_code=204)
+async def delete_document(
+    doc_id: str,
+    rag_service=Depends(get_rag_service),
+    ingest_service=Depends(get_ingest_service),
+):
+    if doc_id not in BUDDY_DB:
+        raise HTTPException(status_code=404, detail="doc_id not found.")
+    await asyncio.to_thread(rag_service.delete_document, doc_id)
+    # Silinen doküman "evicted" görünmesin
+    ingest_service.forget(doc_id)
+
+
+def admission_rejected(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=f"LLM is overloaded, retry later. ({e})",
+        headers={"Retry-After": str(e.retry_after)},
     )
 
 
 @router.post("/ask", response_model=AskResponse)
 async def ask(
     req: AskRequest,
+    request: Request,
     rag_service=Depends(get_rag_service),
+    ingest_service=Depends(get_ingest_service),
+    request_timeout: Optional[float] = Header(default=None, alias="X-Request-Timeout", gt=0),
 ):
-    if req.doc_id not in BUDDY_DB:
-        raise HTTPException(status_code=404, detail="doc_id not found. Upload a txt first.")
+    """
+    X-Request-Timeout: istemcinin bekleyeceği süre (sn); LLM kuyruğu bunu aşacaksa hemen 503.
+    İstemci cevabı beklemeden ayrılırsa üretim iptal edilir.
+    """
+    try:
+        if req.doc_id is None:
+            if rag_service.global_index is None:
+                raise HTTPException(status_code=422, detail="doc_id is required (global index is disabled).")
+            return await cancel_on_disconnect(request, rag_service.ask_global(
+                question=req.question,
+                top_k=req.top_k,
+                doc_ids=req.doc_ids,
+                deadline=request_timeout,
+            ))
+
+        ensure_doc_ready(req.doc_id, ingest_service)
+
+        result = await cancel_on_disconnect(request, rag_service.ask_in_doc(
+            doc_id=req.doc_id,
+            question=req.question,
+            top_k=req.top_k,
+            deadline=request_timeout,
+        ))
+        return result
+    except AdmissionRejected as e:
+        raise admission_rejected(e)
+    except ClientDisconnected:
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+
+
+@router.post("/ask/batch", response_model=AskBatchResponse)
+async def ask_batch(
+    req: AskBatchRequest,
+    request: Request,
+    rag_service=Depends(get_rag_service),
+    ingest_service=Depends(get_ingest_service),
+    request_timeout: Optional[float] = Header(default=None, alias="X-Request-Timeout", gt=0),
+):
+    """Aynı dokümana birden çok soru: tek embedding + tek FAISS araması"""
+    if len(req.questions) > settings.ASK_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {settings.ASK_BATCH_MAX_QUESTIONS} questions per batch.",
+        )
+    ensure_doc_ready(req.doc_id, ingest_service)
+
+    try:
+        return await cancel_on_disconnect(request, rag_service.ask_batch_in_doc(
+            doc_id=req.doc_id,
+            questions=req.questions,
+            top_k=req.top_k,
+            deadline=request_timeout,
+        ))
+    except AdmissionRejected as e:
+        raise admission_rejected(e)
+    except ClientDisconnected:
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+
+
+@router.post("/ask/stream")
+async def ask_stream(
+    req: AskRequest,
+    rag_service=Depends(get_rag_service),
+    ingest_service=Depends(get_ingest_service),
+    request_timeout: Optional[float] = Header(default=None, alias="X-Request-Timeout", gt=0),
+):
+    """
+    /ask'ın streaming versiyonu (NDJSON: her satır bir JSON olay).
+    Önce "sources", ardından "token" olayları, en sonda "done" gelir.
+    """
+    if req.doc_id is None:
+        raise HTTPException(status_code=422, detail="doc_id is required for streaming.")
+    ensure_doc_ready(req.doc_id, ingest_service)
+
+    # Header'lar gitmeden: kuyruk zaten deadline'ı aşacaksa 503 (sonraki red "error" olayı olur)
+    try:
+        priority = BUDDY_DB[req.doc_id].mode
+        rag_service.admission.check(priority, request_timeout or settings.ADMISSION_DEADLINE_SEC)
+    except AdmissionRejected as e:
+        raise admission_rejected(e)
+
+    async def event_lines():
+        try:
+            async for event in rag_service.ask_in_doc_stream(
+                doc_id=req.doc_id,
+                question=req.question,
+                top_k=req.top_k,
+                deadline=request_timeout,
+            ):
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+        except RuntimeError as e:
+            # Header'lar gönderildi; hatayı son satır olarak iletiyoruz
+            yield json.dumps({"type": "error", "detail": str(e)}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(event_lines(), media_type="application/x-ndjson")
 
-    result = rag_service.ask_in_doc(
-        doc_id=req.doc_id,
-        question=req.question,
-        top_k=req.top_k
+
+@router.get("/stats", response_model=StatsResponse)
+async def stats(
+    rag_service=Depends(get_rag_service),
+    ingest_service=Depends(get_ingest_service),
+):
+    return StatsResponse(
+        indexed_documents=len(BUDDY_DB),
+        total_chunks=BUDDY_DB.total_chunks(),
+        embedding_model=settings.EMBEDDING_MODEL,
+        embedding_batcher=rag_service.embedding_batcher.stats(),
+        ingest=ingest_service.stats(),
+        store=BUDDY_DB.stats(),
+        answer_cache=rag_service.answer_cache.stats() if rag_service.answer_cache else None,
+        single_flight=rag_service.single_flight.stats(),
+        admission=rag_service.admission.stats(),
+        global_index=rag_service.global_index.stats() if rag_service.global_index else None,
+        llm=rag_service.llm_service.stats(),
+    )
+
+
+def _health(request: Request) -> HealthResponse:
+    # Sadece artımlı tutulan sayaçlar okunur: doküman taranmaz, lock beklenmez
+    rag_service = getattr(request.app.state, "rag_service", None)
+    ingest_service = getattr(request.app.state, "ingest_service", None)
+    ingest = ingest_service.stats() if ingest_service is not None else {"running": 0, "queued": 0}
+    return HealthResponse(
+        status="healthy",
+        service=settings.APP_NAME,
+        version=settings.APP_VERSION,
+        rag_ready=rag_service is not None,
+        llm_ready=rag_service is not None and rag_service.llm_service.warmed,
+        **BUDDY_DB.counters(),
+        embedding_queue=rag_service.embedding_batcher.queue_depth() if rag_service is not None else 0,
+        llm_in_flight=rag_service.llm_service.in_flight if rag_service is not None else 0,
+        ingest_running=ingest["running"],
+        ingest_queued=ingest["queued"],
     )
-    return result
+
+
+@router.get("/health", response_model=HealthResponse)
+async def health(request: Request):
+    """Liveness: process ayaktaysa her zaman 200 (model yüklenirken de)"""
+    return _health(request)
+
+
+@router.get("/ready", response_model=HealthResponse)
+async def ready(request: Request):
+    """Readiness: embedding modeli yüklenip servisler hazır olana kadar 503"""
+    data = _health(request)
+    if not data.rag_ready:
+        raise HTTPException(status_code=503, detail="Service is not ready yet.", headers={"Retry-After": "5"})
+    return data
@@ -18,19 +18,43 @@ class Settings(BaseSettings):
     API_HOST: str = "0.0.0.0"
     API_PORT: int = 8000
     API_PREFIX: str = "/api/v1"
+    API_WORKERS: int = 1  # uvicorn worker process sayısı (>1 için PERSIST_DOCUMENTS gerekli)
     
     # Ollama
     OLLAMA_BASE_URL: str = "http://localhost:11434"
+    OLLAMA_BASE_URLS: str = ""  # Virgülle ayrılmış Ollama backend'leri (boşsa sadece OLLAMA_BASE_URL)
+    OLLAMA_EJECT_FAILURES: int = 3  # Art arda bu kadar hata veren backend havuzdan çıkarılır
+    OLLAMA_EJECT_SEC: float = 30.0  # Çıkarılan backend'in tekrar denenmeden önce beklediği süre
     OLLAMA_MODEL: str = "llama3"  # veya mistral, phi3, vb.
     OLLAMA_TIMEOUT: int = 120
+    OLLAMA_POOL_SIZE: int = 10  # Her Ollama backend'ine aynı anda açık tutulacak en fazla bağlantı
+    OLLAMA_KEEPALIVE_SEC: float = 30.0  # Boştaki bağlantının havuzda kalma süresi
+    OLLAMA_KEEP_ALIVE: str = "30m"  # Modelin Ollama'da bellekte kalma süresi ("-1": süresiz)
+    OLLAMA_NUM_CTX: int = 4096  # Context penceresi (prompt + cevap token'ı)
+    OLLAMA_WARMUP_INTERVAL_SEC: int = 300  # Periyodik warm-up aralığı (0: sadece açılışta, <0: kapalı)
     
     # Embedding
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBED_BATCH_MAX_SIZE: int = 64  # Tek encode çağrısında toplanacak en fazla sorgu
+    EMBED_BATCH_MAX_WAIT_MS: float = 5.0  # İlk sorgudan sonra batch için beklenecek süre
 
 
     # Vektör Veritabanı
-    VECTOR_DB_TYPE: str = "faiss"
+    VECTOR_DB_TYPE: str = "faiss"  # faiss (otomatik) | flat | hnsw | ivfpq
+    VECTOR_METRIC: str = "cosine"  # cosine (normalize + inner product) | l2
+    HNSW_MIN_VECTORS: int = 5000  # Otomatik seçimde bu sayıdan itibaren HNSW
+    IVFPQ_MIN_VECTORS: int = 200000  # Otomatik seçimde bu sayıdan itibaren IVF-PQ
+    HNSW_M: int = 32
+    HNSW_EF_CONSTRUCTION: int = 80
+    HNSW_EF_SEARCH: int = 64  # Sorgu zamanı: yüksek = daha iyi recall, daha yavaş
+    IVF_NLIST: int = 0  # 0: vektör sayısına göre otomatik (~4·√n)
+    IVF_NPROBE: int = 16  # Sorgu zamanı: taranacak küme sayısı
+    PQ_M: int = 16  # PQ alt-vektör sayısı (boyutu tam bölmeli)
+    VECTOR_QUANTIZATION: str = "none"  # none (float32) | fp16 | int8 — flat / hnsw vektör depolaması
     VECTOR_DB_PATH: str = "./data/vectordb"
+    PERSIST_DOCUMENTS: bool = True  # Dokümanlar VECTOR_DB_PATH altına yazılır, restart'ta korunur
+    STORE_MAX_MB: int = 1024  # Bellekte tutulan dokümanlar için bütçe (0: sınırsız)
+    STORE_IDLE_TTL_SEC: int = 3600  # Bu süre sorgulanmayan doküman bellekten atılır (0: süresiz)
     
     # Doküman İşleme
     DOCUMENTS_PATH: str = "./data/documents"
@@ -38,13 +62,40 @@ class Settings(BaseSettings):
     CHUNK_OVERLAP: int = 50
     MAX_FILE_SIZE_MB: int = 10
     ALLOWED_EXTENSIONS: list = [".txt", ".pdf", ".md"]
+    BULK_MAX_FILES: int = 500  # Toplu upload'da (zip içeriği dahil) en fazla dosya sayısı
+    BULK_MAX_MB: int = 100  # Toplu upload'ın toplam boyut sınırı
+
+    # Arka plan indeksleme (upload -> kuyruk -> worker)
+    INGEST_WORKERS: int = 2  # Aynı anda embed edilen doküman sayısı
+    INGEST_QUEUE_SIZE: int = 16  # Worker'lar doluyken bekleyebilecek upload sayısı
+    INGEST_JOB_TTL_SEC: int = 3600  # Biten job durumunun tutulma süresi
+    INGEST_EMBED_BATCH_SIZE: int = 256  # İndekslemede tek encode çağrısındaki chunk sayısı
+    INGEST_INDEX_BUFFER: int = 4096  # Index tipi seçilip eğitilmeden önce biriktirilen vektör sayısı
+    PDF_WORKERS: int = 0  # PDF sayfa extraction process sayısı (0: CPU sayısı)
+    PDF_PAGES_PER_TASK: int = 8  # Bir process görevinde çıkarılan sayfa sayısı
     
     # RAG
     TOP_K_RESULTS: int = 3  # Kaç doküman parçası döndürülecek
-    MIN_RELEVANCE_SCORE: float = 0.5
+    MIN_RELEVANCE_SCORE: float = 0.5  # Altındaki chunk'lar bağlama girmez (en iyi sonuç her zaman girer)
+    CONTEXT_MAX_TOKENS: int = 1500  # Prompt bağlamının tahmini token bütçesi (~4 karakter/token)
+    GLOBAL_INDEX_ENABLED: bool = False  # Tüm dokümanlarda arama (/ask doc_id olmadan)
+    ASK_BATCH_MAX_QUESTIONS: int = 50  # /ask/batch isteğindeki en fazla soru
+    ASK_BATCH_CONCURRENCY: int = 4  # /ask/batch içinde aynı anda LLM'e giden soru sayısı
+
+    # LLM admission control (yük atma)
+    ADMISSION_MAX_CONCURRENT: int = 4  # Ollama'ya aynı anda giden üretim sayısı
+    ADMISSION_MAX_QUEUE: int = 32  # Slot bekleyebilecek en fazla istek
+    ADMISSION_DEADLINE_SEC: float = 170.0  # İstemci X-Request-Timeout göndermezse bekleme sınırı
+    ADMISSION_INITIAL_SERVICE_SEC: float = 10.0  # Ölçüm gelene kadar varsayılan LLM süresi (bekleme tahmini)
+
+    # Cevap cache'i (doc_id + soru)
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIMILARITY: float = 0.95  # Yakın soru sayılması için cosine benzerlik eşiği
+    ANSWER_CACHE_MAX_PER_DOC: int = 256
+    ANSWER_CACHE_MAX_DOCS: int = 1024
     
     # LLM
-    MAX_TOKENS: int = 512
+    MAX_TOKENS: int = 512  # Cevapta üretilecek en fazla token (Ollama num_predict)
     TEMPERATURE: float = 0.7
     
     class Config:
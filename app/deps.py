@@ -1,5 +1,6 @@
 from fastapi import Request, HTTPException, status
 from app.services.rag_service import RAGService
+from app.services.ingest_service import IngestService
 
 def get_rag_service(request: Request) -> RAGService:
     rag_service = getattr(request.app.state, "rag_service", None)
@@ -11,3 +12,15 @@ def get_rag_service(request: Request) -> RAGService:
         )
 
     return rag_service
+
+
+def get_ingest_service(request: Request) -> IngestService:
+    ingest_service = getattr(request.app.state, "ingest_service", None)
+
+    if ingest_service is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Ingest servisi henüz hazır değil"
+        )
+
+    return ingest_service
@@ -2,18 +2,24 @@
 FastAPI Ana Uygulama
 """
 
+import asyncio
 import logging
+import time
 import traceback
 from contextlib import asynccontextmanager
 
 from fastapi import HTTPException, status
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from sentence_transformers import SentenceTransformer
 
 from app.config import settings
 from app.api.routes import router
 from app.services.rag_service import RAGService
+from app.services.ingest_service import IngestService
+from app.services.buddy_store import BUDDY_DB, JOBS_DIR
+from app.services import metrics
 
 # Logging ayarları
 logging.basicConfig(
@@ -23,14 +29,37 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """Uygulama başlangıç ve kapanış olayları"""
-    logger.info("🚀 Uygulama başlatılıyor...")
-
+async def evict_idle_documents(interval_sec: float = 60.0):
+    """Trafik olmasa da TTL'i dolan dokümanlar bellekten atılsın"""
+    while True:
+        await asyncio.sleep(interval_sec)
+        await asyncio.to_thread(BUDDY_DB.evict_expired)
+
+
+async def keep_model_warm(llm_service, interval_sec: float):
+    """
+    Açılışta modeli Ollama'da yükler; interval_sec > 0 ise keep_alive dolmadan
+    periyodik olarak yeniler. İlk soru model yükleme süresini beklemesin.
+    """
+    while True:
+        try:
+            warmup_ms = await llm_service.warm_up()
+            logger.info("🔥 LLM warm-up tamam (%.0f ms)", warmup_ms)
+        except Exception:
+            logger.warning("LLM warm-up başarısız", exc_info=True)
+        if interval_sec <= 0:
+            return
+        await asyncio.sleep(interval_sec)
+
+
+async def load_services(app: FastAPI) -> None:
+    """
+    Embedding modeli ve servisler arka planda yüklenir; bu sürede uygulama
+    istek kabul eder, /health cevap verir ve /ready 503 döner.
+    """
     try:
         logger.info("🧠 Embedding modeli yükleniyor...")
-        embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
+        embedding_model = await asyncio.to_thread(SentenceTransformer, settings.EMBEDDING_MODEL)
 
         logger.info("📚 RAG servisi oluşturuluyor...")
         rag_service = RAGService(
@@ -40,17 +69,56 @@ async def lifespan(app: FastAPI):
 
         # Not: Index'i burada build etmiyoruz.
         # Çünkü senin akışın: upload -> build_index_for_text()
+        # Global index açıksa sadece kayıtlı dokümanların vektörleri eklenir.
+        if rag_service.global_index is not None:
+            await asyncio.to_thread(rag_service.global_index.rebuild, BUDDY_DB)
+        # Doküman kataloğu bir kez keşfedilsin; /health sayaçları bundan sonra O(1)
+        await asyncio.to_thread(BUDDY_DB.counters)
+
+        app.state.ingest_service = IngestService(
+            rag_service,
+            max_workers=settings.INGEST_WORKERS,
+            max_queue=settings.INGEST_QUEUE_SIZE,
+            job_ttl_sec=settings.INGEST_JOB_TTL_SEC,
+            pdf_workers=settings.PDF_WORKERS,
+            pdf_pages_per_task=settings.PDF_PAGES_PER_TASK,
+            # Worker process'leri job durumlarını store klasöründen paylaşır
+            jobs_dir=str(BUDDY_DB.path / JOBS_DIR) if BUDDY_DB.path is not None else None,
+        )
         app.state.rag_service = rag_service
         logger.info("✅ RAG servisi hazır!")
     except Exception:
         logger.error("RAG servisi başlatılamadı!")
         logger.error(traceback.format_exc())
         app.state.rag_service = None
+        app.state.ingest_service = None
         logger.warning(" Uygulama RAG olmadan çalışacak")
+        return
+
+    if settings.OLLAMA_WARMUP_INTERVAL_SEC >= 0:
+        await keep_model_warm(rag_service.llm_service, settings.OLLAMA_WARMUP_INTERVAL_SEC)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Uygulama başlangıç ve kapanış olayları"""
+    logger.info("🚀 Uygulama başlatılıyor...")
+    app.state.rag_service = None
+    app.state.ingest_service = None
+
+    loader_task = asyncio.create_task(load_services(app))
+    eviction_task = asyncio.create_task(evict_idle_documents())
 
     yield
     logger.info(" Uygulama kapatılıyor...")
 
+    loader_task.cancel()
+    eviction_task.cancel()
+    if app.state.ingest_service is not None:
+        app.state.ingest_service.shutdown()
+    if app.state.rag_service is not None:
+        await app.state.rag_service.aclose()
+
 
 app = FastAPI(
     title=settings.APP_NAME,
@@ -71,10 +139,67 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+def _route_label(request: Request) -> str:
+    # Path parametreleri şablona geri çevrilir (/documents/{doc_id}): label sayısı sınırlı kalsın
+    if request.scope.get("route") is None:
+        return "unmatched"
+    path = request.url.path
+    for name, value in request.path_params.items():
+        path = path.replace(f"/{value}", f"/{{{name}}}", 1)
+    return path
+
+
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """
+    İstek süresini histograma yazar; aşama süreleri (embed, search, llm...)
+    Server-Timing header'ında döner. Streaming cevaplarda header gövdeden
+    önce gittiği için sadece o ana kadarki aşamaları içerir.
+    """
+    start = time.perf_counter()
+    timings, token = metrics.start_request()
+    try:
+        response = await call_next(request)
+    finally:
+        metrics.end_request(token)
+
+    elapsed = time.perf_counter() - start
+    metrics.REQUEST_SECONDS.observe(elapsed, request.method, _route_label(request), str(response.status_code))
+    response.headers["Server-Timing"] = metrics.server_timing(timings, elapsed * 1000)
+    return response
+
+
 # Routes
 app.include_router(router, prefix=settings.API_PREFIX, tags=["QA"])
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics(request: Request):
+    """Prometheus text formatında aşama histogramları ve store / kuyruk gauge'ları"""
+    gauges, counters = {}, {}
+    store = await asyncio.to_thread(BUDDY_DB.stats)
+    gauges["docqa_store_documents"] = ("Kayıtlı doküman sayısı", store["documents"])
+    gauges["docqa_store_resident_documents"] = ("Bellekteki doküman sayısı", store["resident_documents"])
+    gauges["docqa_store_resident_bytes"] = ("Bellekteki dokümanların tahmini boyutu", store["resident_bytes"])
+
+    ingest_service = getattr(request.app.state, "ingest_service", None)
+    if ingest_service is not None:
+        ingest = ingest_service.stats()
+        gauges["docqa_ingest_running"] = ("Çalışan indeksleme job'ları", ingest["running"])
+        gauges["docqa_ingest_queued"] = ("Kuyrukta bekleyen indeksleme job'ları", ingest["queued"])
+
+    rag_service = getattr(request.app.state, "rag_service", None)
+    if rag_service is not None:
+        batcher = rag_service.embedding_batcher.stats()
+        gauges["docqa_embedding_queue_depth"] = ("Embedding batcher kuyruğu", batcher["queue_depth"])
+        llm = rag_service.llm_service.stats()
+        counters["docqa_llm_cancelled_total"] = ("İstemci ayrıldığı için iptal edilen üretimler", llm.get("cancelled", 0))
+        counters["docqa_llm_tokens_saved_total"] = ("İptal edilen üretimlerde harcanmayan tahmini token", llm.get("tokens_saved", 0))
+
+    return PlainTextResponse(metrics.render(gauges, counters), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/")
 async def root():
     return {
@@ -1,9 +1,11 @@
 from pydantic import BaseModel, Field
-from typing import Literal, Optional, List, Dict
+from typing import Annotated, Literal, Optional, List, Dict
 from pydantic import BaseModel
 from typing import List, Optional
 
 Mode = Literal["fast", "long"]
+# evicted: indekslenmişti ama kalıcı store yokken bellekten atıldı
+IngestStatus = Literal["pending", "running", "ready", "failed", "evicted"]
 
 
 class SourceInfo(BaseModel):
@@ -19,29 +21,105 @@ class ErrorResponse(BaseModel):
 
 
 class UploadResponse(BaseModel):
+    doc_id: str
+    mode: Mode
+    chars: int
+    chunks: Optional[int] = None  # indeksleme bitene kadar bilinmez
+    status: IngestStatus = "pending"
+
+class BulkDocument(BaseModel):
+    filename: str
+    doc_id: Optional[str] = None  # dosya indekslenemediyse yok (bkz. error)
+    chars: int = 0
+    chunks: Optional[int] = None
+    error: Optional[str] = None
+
+class BulkUploadResponse(BaseModel):
+    mode: Mode
+    doc_ids: List[str]  # indekslenen dokümanlar (documents sırasıyla)
+    documents: List[BulkDocument]
+    stats: Dict[str, float]  # files, failed, chunks, read/embed/index/total_ms, chunks_per_sec
+
+class IngestStatusResponse(BaseModel):
+    doc_id: str
+    status: IngestStatus
+    mode: Optional[Mode] = None
+    chars: Optional[int] = None
+    chunks: Optional[int] = None  # indeksleme sürerken o ana kadar işlenen chunk sayısı
+    progress: Optional[float] = None  # 0..1, işlenen karakter oranı
+    error: Optional[str] = None
+
+class DocumentInfoResponse(BaseModel):
     doc_id: str
     mode: Mode
     chars: int
     chunks: int
+    index_type: str  # flat | hnsw | ivfpq
+    quantization: str  # none | fp16 | int8 | pq
+    vector_bytes: Optional[int] = None  # index'in vektör + graf belleği
+    resident: bool  # şu an bellekte mi
+    resident_bytes: Optional[int] = None  # bellekteyse toplam tahmini maliyet
 
 class AskRequest(BaseModel):
-    doc_id: str
+    doc_id: Optional[str] = None  # yoksa global index'te (tüm dokümanlarda) aranır
     question: str = Field(min_length=3, max_length=500)
     top_k: Optional[int] = Field(default=None, ge=1, le=10)
+    doc_ids: Optional[List[str]] = None  # doc_id yokken aramayı bu dokümanlarla sınırlar
+
+Question = Annotated[str, Field(min_length=3, max_length=500)]
+
+class AskBatchRequest(BaseModel):
+    doc_id: str
+    questions: List[Question] = Field(min_length=1)
+    top_k: Optional[int] = Field(default=None, ge=1, le=10)
 
 class SourceItem(BaseModel):
     file: str
     chunk: str
     relevance: float
+    page: Optional[int] = None  # PDF'lerde chunk'ın başladığı sayfa
 
 class AskResponse(BaseModel):
     question: str
     answer: str
     sources: List[SourceItem]
     confidence: str
+    cached: bool = False  # cevap cache'ten mi geldi
+    context: Optional[Dict[str, int]] = None  # prompt boyutu, atılan / birleştirilen hit'ler, tahmini kazanılan token
+
+class AskBatchItem(AskResponse):
+    timings: Dict[str, float]  # queue_ms, llm_ms, total_ms
+
+class AskBatchResponse(BaseModel):
+    doc_id: str
+    answers: List[AskBatchItem]
+    timings: Dict[str, float]  # embed_ms, search_ms, total_ms
+
+class StatsResponse(BaseModel):
+    indexed_documents: int
+    total_chunks: int
+    embedding_model: str
+    embedding_batcher: Dict
+    ingest: Dict
+    store: Dict
+    answer_cache: Optional[Dict] = None
+    single_flight: Dict
+    admission: Optional[Dict] = None  # LLM slotları, öncelik kuyrukları, red sayıları
+    global_index: Optional[Dict] = None
+    llm: Optional[Dict] = None  # cold / warm çağrı süreleri, warm-up sayısı
 
 class HealthResponse(BaseModel):
     status: str
-    rag_ready: bool
+    service: str
+    version: str
+    rag_ready: bool  # embedding modeli yüklendi, servisler hazır
+    llm_ready: bool  # model Ollama'da en az bir kez yüklendi (warm-up)
     documents: int
     chunks: int
+    resident_documents: int
+    resident_bytes: int  # bellekteki dokümanların tahmini toplam boyutu
+    resident_vector_bytes: int  # bunun vektör (FAISS) kısmı
+    embedding_queue: int  # embed edilmeyi bekleyen sorgu istekleri
+    llm_in_flight: int  # cevabı beklenen Ollama istekleri
+    ingest_running: int
+    ingest_queued: int
@@ -0,0 +1,121 @@
+"""
+LLM aşaması için admission control (yük atma).
+
+Ollama'ya aynı anda en fazla max_concurrent üretim gider; fazlası sınırlı bir
+kuyrukta bekler. İstek, tahmini bekleme süresi istemcinin deadline'ını
+aşıyorsa hiç beklemeden reddedilir (503 + Retry-After): kimsenin okumayacağı
+cevaba iş harcanmaz. Bekleyen istek deadline dolunca kuyruktan çıkar.
+
+Öncelik sınıfları: boşalan slot önce "fast" kuyruğuna verilir; uzun
+long-mode promptları kısa fast-mode sorularını bekletmez.
+"""
+import asyncio
+import math
+from collections import deque
+from typing import Deque, Dict, Optional
+
+# Öncelik sırası: öndeki sınıf önce servis edilir
+PRIORITIES = ("fast", "long")
+
+
+class AdmissionRejected(RuntimeError):
+    """İstek kabul edilmedi; retry_after saniye sonra tekrar denenebilir"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent: int = 4, max_queue: int = 32, initial_service_sec: float = 10.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+
+        self._active = 0
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {p: deque() for p in PRIORITIES}
+        # LLM süresinin üstel ortalaması (bekleme tahmini için)
+        self._service_sec = initial_service_sec
+
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _ahead(self, priority: str) -> int:
+        # Bu istekten önce servis edilecek bekleyenler (aynı ve daha yüksek öncelik)
+        rank = PRIORITIES.index(priority)
+        return sum(len(self._waiters[p]) for p in PRIORITIES[:rank + 1])
+
+    def _queued(self) -> int:
+        return sum(len(q) for q in self._waiters.values())
+
+    def estimate_wait(self, priority: str) -> float:
+        """Şu an gelen bir isteğin slot için tahmini bekleme süresi (sn)"""
+        ahead = self._ahead(priority)
+        if self._active < self.max_concurrent and ahead == 0:
+            return 0.0
+        # Her "tur"da max_concurrent istek biter
+        return (ahead // self.max_concurrent + 1) * self._service_sec
+
+    def check(self, priority: str, deadline_sec: float) -> None:
+        """Kabul edilemeyecek isteği hemen reddeder (AdmissionRejected)"""
+        wait = self.estimate_wait(priority)
+        if wait > 0 and self._queued() >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected("LLM kuyruğu dolu", retry_after=wait)
+        if wait > deadline_sec:
+            self.rejected += 1
+            raise AdmissionRejected(
+                f"Tahmini bekleme ({wait:.0f} sn) istek süresini ({deadline_sec:.0f} sn) aşıyor",
+                retry_after=wait,
+            )
+
+    async def acquire(self, priority: str, deadline_sec: float) -> None:
+        self.check(priority, deadline_sec)
+        if self.estimate_wait(priority) == 0:
+            self._active += 1
+            self.admitted += 1
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append(fut)
+        try:
+            await asyncio.wait_for(fut, timeout=deadline_sec)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if fut.done() and not fut.cancelled():
+                # Slot tam bu sırada verilmiş: sıradakine devret
+                self._release()
+            elif fut in self._waiters[priority]:
+                self._waiters[priority].remove(fut)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timed_out += 1
+                raise AdmissionRejected("LLM kuyruğunda deadline doldu", retry_after=self._service_sec) from e
+            raise
+        self.admitted += 1
+
+    def _release(self) -> None:
+        # Slot boşaltılmadan, en öncelikli bekleyene devredilir
+        for priority in PRIORITIES:
+            queue = self._waiters[priority]
+            while queue:
+                fut = queue.popleft()
+                if not fut.done():
+                    fut.set_result(None)
+                    return
+        self._active -= 1
+
+    def release(self, service_sec: Optional[float]) -> None:
+        """service_sec: None ise (hata, iptal) bekleme tahmini güncellenmez"""
+        if service_sec is not None:
+            self._service_sec = 0.8 * self._service_sec + 0.2 * service_sec
+        self._release()
+
+    def stats(self) -> Dict:
+        return {
+            "active": self._active,
+            "max_concurrent": self.max_concurrent,
+            **{f"queued_{p}": len(q) for p, q in self._waiters.items()},
+            "avg_service_sec": round(self._service_sec, 2),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
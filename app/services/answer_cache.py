@@ -0,0 +1,116 @@
+"""
+Semantik cevap cache'i.
+
+Aynı dokümana aynı (veya neredeyse aynı) soru tekrar sorulduğunda LLM'e
+gitmeden önceki cevabı döndürür:
+- Birebir eşleşme: normalize edilmiş soru metni
+- Yakın eşleşme: soru embedding'leri arasındaki cosine benzerliği eşiği geçerse
+Cache doc_id bazında tutulur, LRU ile sınırlanır ve doküman değişince silinir.
+"""
+import copy
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def normalize_question(question: str) -> str:
+    """Büyük/küçük harf, noktalama ve boşluk farklarını yok sayar"""
+    return _NON_WORD.sub(" ", question.casefold()).strip()
+
+
+@dataclass
+class _Entry:
+    k: int
+    embedding: np.ndarray  # L2-normalize edilmiş soru vektörü
+    response: Dict
+
+
+class AnswerCache:
+    def __init__(self, similarity_threshold: float = 0.95, max_entries_per_doc: int = 256, max_docs: int = 1024):
+        self.similarity_threshold = similarity_threshold
+        self.max_entries_per_doc = max_entries_per_doc
+        self.max_docs = max_docs
+
+        # doc_id -> (k, normalize soru) -> _Entry; iki seviye de LRU sıralı
+        self._docs: "OrderedDict[str, OrderedDict[Tuple[int, str], _Entry]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _unit(embedding: np.ndarray) -> np.ndarray:
+        vec = np.asarray(embedding, dtype="float32").reshape(-1)
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm > 0 else vec
+
+    def get(self, doc_id: str, question: str, k: int, embedding: np.ndarray) -> Optional[Dict]:
+        key = (k, normalize_question(question))
+        with self._lock:
+            entries = self._docs.get(doc_id)
+            if not entries:
+                self.misses += 1
+                return None
+
+            entry = entries.get(key)
+            if entry is not None:
+                self.exact_hits += 1
+            else:
+                entry_key = self._nearest(entries, k, self._unit(embedding))
+                if entry_key is None:
+                    self.misses += 1
+                    return None
+                self.semantic_hits += 1
+                key, entry = entry_key, entries[entry_key]
+
+            entries.move_to_end(key)
+            self._docs.move_to_end(doc_id)
+            return copy.deepcopy(entry.response)
+
+    def _nearest(self, entries, k: int, query: np.ndarray) -> Optional[Tuple[int, str]]:
+        candidates = [(key, e) for key, e in entries.items() if e.k == k]
+        if not candidates:
+            return None
+        matrix = np.stack([e.embedding for _, e in candidates])
+        sims = matrix @ query
+        best = int(np.argmax(sims))
+        if sims[best] < self.similarity_threshold:
+            return None
+        return candidates[best][0]
+
+    def put(self, doc_id: str, question: str, k: int, embedding: np.ndarray, response: Dict) -> None:
+        key = (k, normalize_question(question))
+        with self._lock:
+            entries = self._docs.setdefault(doc_id, OrderedDict())
+            entries[key] = _Entry(k=k, embedding=self._unit(embedding), response=copy.deepcopy(response))
+            entries.move_to_end(key)
+            self._docs.move_to_end(doc_id)
+
+            while len(entries) > self.max_entries_per_doc:
+                entries.popitem(last=False)
+            while len(self._docs) > self.max_docs:
+                self._docs.popitem(last=False)
+
+    def invalidate(self, doc_id: str) -> None:
+        with self._lock:
+            if self._docs.pop(doc_id, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "documents": len(self._docs),
+                "entries": sum(len(e) for e in self._docs.values()),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
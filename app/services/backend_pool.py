@@ -0,0 +1,106 @@
+"""
+Ollama backend havuzu (istemci tarafı yük dengeleme).
+
+Her üretim, o an en az bekleyen isteği (outstanding) olan sağlıklı backend'e
+gider: uzun üretim süren bir instance'a yeni iş yığılmaz. Eşitlikte sıra
+döner (round-robin).
+
+Sağlık pasif olarak izlenir: art arda failure_threshold hata veren backend
+eject_sec boyunca havuzdan çıkarılır; süre dolunca tekrar denenir, ilk başarılı
+cevapta sayaç sıfırlanır. Hepsi çıkarılmışsa en erken dönecek olan kullanılır
+(servis tamamen durmaz).
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Backend:
+    url: str
+    outstanding: int = 0
+    failures: int = 0  # art arda hata sayısı
+    ejected_until: float = 0.0  # monotonic; 0: havuzda
+    requests: int = 0
+    errors: int = 0
+    ejections: int = 0
+
+    def healthy(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+
+class BackendPool:
+    def __init__(self, urls: List[str], failure_threshold: int = 3, eject_sec: float = 30.0):
+        if not urls:
+            raise ValueError("En az bir backend URL'i gerekli")
+        self.backends = [Backend(url.rstrip("/")) for url in urls]
+        self.failure_threshold = failure_threshold
+        self.eject_sec = eject_sec
+        self._lock = threading.Lock()
+        self._next = 0  # eşitlikte round-robin başlangıcı
+
+    def acquire(self, exclude: frozenset = frozenset()) -> Optional[Backend]:
+        """
+        En az outstanding isteği olan sağlıklı backend'i seçer ve sayacını artırır.
+        exclude: bu istek için denenmiş URL'ler. Denenecek backend kalmadıysa None.
+        """
+        now = time.monotonic()
+        with self._lock:
+            n = len(self.backends)
+            order = [self.backends[(self._next + i) % n] for i in range(n)]
+            candidates = [b for b in order if b.url not in exclude]
+            if not candidates:
+                return None
+            healthy = [b for b in candidates if b.healthy(now)]
+            if healthy:
+                backend = min(healthy, key=lambda b: b.outstanding)
+            else:
+                backend = min(candidates, key=lambda b: b.ejected_until)
+            self._next = (self._next + 1) % n
+            backend.outstanding += 1
+            backend.requests += 1
+            return backend
+
+    def release(self, backend: Backend, ok: Optional[bool]) -> None:
+        """ok: None ise (iptal vb.) sadece sayaç düşer, sağlık durumu değişmez"""
+        with self._lock:
+            backend.outstanding -= 1
+        if ok is not None:
+            self.report(backend, ok)
+
+    def report(self, backend: Backend, ok: bool) -> None:
+        """Backend'e giden bir isteğin sonucu (pasif sağlık takibi)"""
+        with self._lock:
+            if ok:
+                backend.failures = 0
+                backend.ejected_until = 0.0
+                return
+            backend.failures += 1
+            backend.errors += 1
+            if backend.failures < self.failure_threshold or not backend.healthy(time.monotonic()):
+                return
+            backend.ejected_until = time.monotonic() + self.eject_sec
+            backend.ejections += 1
+        logger.warning(
+            "Ollama backend havuzdan çıkarıldı: %s (%d art arda hata, %.0f sn)",
+            backend.url, backend.failures, self.eject_sec,
+        )
+
+    def stats(self) -> List[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "url": b.url,
+                    "healthy": b.healthy(now),
+                    "outstanding": b.outstanding,
+                    "requests": b.requests,
+                    "errors": b.errors,
+                    "ejections": b.ejections,
+                }
+                for b in self.backends
+            ]
@@ -1,16 +1,514 @@
-from dataclasses import dataclass
-from typing import Dict, List
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
 import faiss
 import numpy as np
 
-@dataclass
+from app.config import settings
+from app.services import index_factory
+
+logger = logging.getLogger(__name__)
+
 class DocIndex:
-    mode: str
-    text: str
-    chunks: List[str]
-    meta: List[dict]
-    index: faiss.IndexFlatL2
+    """
+    Bellekteki doküman kaydı.
 
-BUDDY_DB: Dict[str, DocIndex] = {}
-#Session Store
+    Metin tek bir str olarak tutulur; chunk'lar sadece (start, end) offset
+    dizileridir. Overlap'li chunk string'leri ve chunk başına meta dict'leri
+    saklanmaz, chunk metni sadece sonuç döndürülürken chunk(i) ile üretilir.
+    PDF'lerde page_starts her sayfanın metindeki başlangıç offset'idir.
+    """
+
+    __slots__ = ("mode", "text", "index", "starts", "ends", "source", "page_starts")
+
+    def __init__(
+        self,
+        mode: str,
+        text: str,
+        index: faiss.Index,
+        offsets,
+        source: str = "user_upload",
+        page_starts: Optional[np.ndarray] = None,
+    ):
+        # Diskten yüklenen offset'ler memory-mapped gelir; kopyalanmadan view tutulur
+        offsets = np.asarray(offsets, dtype=np.int64).reshape(-1, 2)
+        self.mode = mode
+        self.text = text
+        self.index = index
+        self.starts = offsets[:, 0]
+        self.ends = offsets[:, 1]
+        self.source = source
+        self.page_starts = None if page_starts is None else np.asarray(page_starts, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def chunk(self, i: int) -> str:
+        return self.text[self.starts[i]:self.ends[i]]
+
+    def page(self, i: int) -> Optional[int]:
+        """Chunk'ın başladığı sayfa (1'den başlar); sayfa bilgisi yoksa None"""
+        if self.page_starts is None:
+            return None
+        return int(np.searchsorted(self.page_starts, self.starts[i], side="right"))
+
+    @property
+    def offsets(self) -> np.ndarray:
+        """(n_chunks, 2) int64: text[start:end] == chunk"""
+        return np.column_stack((self.starts, self.ends))
+
+
+# doc_id path'e dönüştüğü için sadece güvenli karakterlere izin veriyoruz
+_SAFE_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+INDEX_FILE = "index.faiss"
+OFFSETS_FILE = "offsets.npy"
+PAGES_FILE = "pages.npy"
+TEXT_FILE = "text.txt"
+META_FILE = "doc.json"
+# Append-only katalog günlüğü: "+<doc_id> <pid>" / "-<doc_id> <pid>" satırları
+CATALOG_LOG = "catalog.log"
+# Ingest job durum dosyaları (worker process'ler arasında paylaşılır)
+JOBS_DIR = ".jobs"
+
+
+def estimate_doc_bytes(doc: DocIndex) -> int:
+    """DocIndex'in yaklaşık bellek maliyeti: metin + chunk offset'leri + vektörler"""
+    size = sys.getsizeof(doc.text) + doc.starts.nbytes + doc.ends.nbytes
+    if doc.page_starts is not None:
+        size += doc.page_starts.nbytes
+    return size + index_factory.index_bytes(doc.index)
+
+
+class DocStore(MutableMapping):
+    """
+    doc_id -> DocIndex store'u. dict gibi kullanılır.
+
+    path verilirse her doküman VECTOR_DB_PATH/<doc_id>/ altına yazılır
+    (FAISS index, chunk offset'leri, metin ve küçük bir doc.json).
+    Restart sonrası dokümanlar açılışta yüklenmez; sadece doc.json'lar taranır
+    ve index ilk sorgulandığında dosyası map'lenerek açılır (IO_FLAG_MMAP_IFC:
+    vektör kodları kopyalanmaz). Böylece binlerce dokümanlık bir node saniyeler
+    içinde ayağa kalkar ve sadece aramanın dokunduğu sayfalar belleğe alınır.
+
+    Aynı path'i kullanan birden fazla worker process'i aynı store'u paylaşır:
+    index'ler ve chunk offset'leri map'lendiğinden sayfaları OS page cache'inde
+    ortaktır (metin her process'te ayrıca okunur). Her ekleme / silme catalog.log'a tek satır olarak
+    eklenir; diğer process'ler her erişimde günlüğün boyutuna bakar (tek stat)
+    ve sadece yeni satırları kataloglarına uygular.
+
+    Bellekteki dokümanlar max_bytes bütçesi ve idle_ttl_sec ile sınırlanır;
+    aşılınca en uzun süredir kullanılmayan (LRU) doküman bellekten atılır.
+    Kalıcı store varsa doküman diskte kalır ve sonraki sorguda tekrar yüklenir,
+    yoksa tamamen silinir.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_bytes: int = 0, idle_ttl_sec: float = 0):
+        self.path = Path(path) if path else None
+        self.max_bytes = max_bytes  # 0: sınırsız
+        self.idle_ttl_sec = idle_ttl_sec  # 0: süresiz
+
+        # LRU sırası: en eski erişim başta
+        self._docs: "OrderedDict[str, DocIndex]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._vector_sizes: Dict[str, int] = {}
+        self._last_access: Dict[str, float] = {}
+        self._resident_bytes = 0
+        self._resident_vector_bytes = 0
+        self._catalog: Optional[Dict[str, dict]] = None  # doc_id -> doc.json (tüm dokümanlar)
+        self._chunk_count = 0  # katalogdaki chunk toplamı; katalog değiştikçe güncellenir
+        self._log_pos = 0  # catalog.log'un kataloğa uygulanmış kısmı (byte)
+        self._lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.spills = 0
+
+    # --- Disk katmanı ---
+
+    def _doc_dir(self, doc_id: str) -> Path:
+        return self.path / doc_id
+
+    def _scan(self) -> Dict[str, dict]:
+        """Diskteki dokümanları ilk ihtiyaçta keşfeder (index'leri okumadan)"""
+        with self._lock:
+            if self._catalog is not None:
+                return self._catalog
+
+            catalog: Dict[str, dict] = {}
+            # Taramadan önce: tarama sırasında eklenen satırlar sonra tekrar uygulanır
+            self._log_pos = self.log_position()
+            if self.path is not None and self.path.is_dir():
+                for entry in self.path.iterdir():
+                    meta_file = entry / META_FILE
+                    if not _SAFE_ID.fullmatch(entry.name) or not meta_file.is_file():
+                        continue
+                    try:
+                        catalog[entry.name] = json.loads(meta_file.read_text(encoding="utf-8"))
+                    except (OSError, ValueError):
+                        logger.warning("Bozuk doküman kaydı atlandı: %s", entry, exc_info=True)
+
+            self._catalog = catalog
+            self._chunk_count = sum(meta["chunks"] for meta in catalog.values())
+            return catalog
+
+    def _catalog_put(self, doc_id: str, meta: dict) -> None:
+        old = self._scan().get(doc_id)
+        if old is not None:
+            self._chunk_count -= old["chunks"]
+        self._catalog[doc_id] = meta
+        self._chunk_count += meta["chunks"]
+
+    def _catalog_pop(self, doc_id: str) -> None:
+        meta = self._scan().pop(doc_id, None)
+        if meta is not None:
+            self._chunk_count -= meta["chunks"]
+
+    def log_position(self) -> int:
+        """catalog.log'un şu anki boyutu; changes_since için başlangıç noktası"""
+        if self.path is None:
+            return 0
+        try:
+            return os.stat(self.path / CATALOG_LOG).st_size
+        except FileNotFoundError:
+            return 0
+
+    def _append_log(self, op: str, doc_id: str) -> None:
+        if self.path is None:
+            return
+        # O_APPEND + tek write: satırlar process'ler arasında karışmaz
+        fd = os.open(self.path / CATALOG_LOG, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, f"{op}{doc_id} {os.getpid()}\n".encode("ascii"))
+        finally:
+            os.close(fd)
+
+    def changes_since(self, pos: int) -> Tuple[int, List[Tuple[str, str]]]:
+        """
+        Başka process'lerin pos'tan sonra yaptığı değişiklikler.
+        Döner: (yeni pos, [("+" | "-", doc_id)]); yarım yazılmış son satır sonraya kalır.
+        """
+        size = self.log_position()
+        if size <= pos:
+            return pos, []
+        with open(self.path / CATALOG_LOG, "rb") as f:
+            f.seek(pos)
+            data = f.read(size - pos)
+        end = data.rfind(b"\n") + 1
+
+        own = str(os.getpid())
+        changes = []
+        for line in data[:end].decode("ascii", errors="replace").splitlines():
+            entry, _, writer = line.partition(" ")
+            if writer != own and entry[:1] in ("+", "-") and _SAFE_ID.fullmatch(entry[1:]):
+                changes.append((entry[0], entry[1:]))
+        return pos + end, changes
+
+    def sync(self) -> None:
+        """Diğer worker process'lerin eklediği / sildiği dokümanları kataloğa yansıtır"""
+        if self.path is None:
+            return
+        if self._catalog is None:
+            self._scan()
+        if self.log_position() == self._log_pos:
+            return
+
+        with self._lock:
+            self._log_pos, changes = self.changes_since(self._log_pos)
+            for op, doc_id in changes:
+                # Bellekteki kopya eskidi (silindi veya yeniden yazıldı)
+                self._drop_resident(doc_id)
+                if op == "-":
+                    self._catalog_pop(doc_id)
+                    continue
+                try:
+                    meta = json.loads((self._doc_dir(doc_id) / META_FILE).read_text(encoding="utf-8"))
+                except (OSError, ValueError):
+                    # Bu arada silinmiş; "-" satırı da gelecek
+                    self._catalog_pop(doc_id)
+                    continue
+                self._catalog_put(doc_id, meta)
+
+    def _lookup_disk(self, doc_id: str) -> Optional[dict]:
+        catalog = self._scan()
+        if doc_id in catalog:
+            return catalog[doc_id]
 
+        # Tarama sonrasında (ör. başka bir process tarafından) yazılmış olabilir
+        if self.path is None or not _SAFE_ID.fullmatch(doc_id):
+            return None
+        meta_file = self._doc_dir(doc_id) / META_FILE
+        if not meta_file.is_file():
+            return None
+        with self._lock:
+            self._catalog_put(doc_id, json.loads(meta_file.read_text(encoding="utf-8")))
+        return catalog[doc_id]
+
+    def _persist(self, doc_id: str, doc: DocIndex) -> dict:
+        meta = {
+            "mode": doc.mode,
+            "source": doc.source,
+            "chars": len(doc.text),
+            "chunks": len(doc),
+            "index_type": index_factory.index_type_of(doc.index),
+            "quantization": index_factory.quantization_of(doc.index),
+            "vector_bytes": index_factory.index_bytes(doc.index),
+        }
+        if self.path is None:
+            return meta
+
+        # Önce geçici klasöre yaz, sonra atomik rename: yarım kayıt görünmesin
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp_dir = self.path / f".tmp-{doc_id}-{uuid.uuid4().hex[:8]}"
+        tmp_dir.mkdir()
+        try:
+            faiss.write_index(doc.index, str(tmp_dir / INDEX_FILE))
+            np.save(tmp_dir / OFFSETS_FILE, doc.offsets)
+            if doc.page_starts is not None:
+                np.save(tmp_dir / PAGES_FILE, doc.page_starts)
+            with open(tmp_dir / TEXT_FILE, "w", encoding="utf-8", newline="") as f:
+                f.write(doc.text)
+            (tmp_dir / META_FILE).write_text(json.dumps(meta), encoding="utf-8")
+
+            final_dir = self._doc_dir(doc_id)
+            if final_dir.exists():
+                shutil.rmtree(final_dir)
+            os.replace(tmp_dir, final_dir)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        return meta
+
+    def _read_index(self, doc_id: str) -> faiss.Index:
+        index_path = str(self._doc_dir(doc_id) / INDEX_FILE)
+        try:
+            # Vektör kodları dosyadan doğrudan kullanılır (kopya yok, salt okunur);
+            # IO_FLAG_MMAP ise flat / SQ / HNSW kodlarını belleğe kopyalar
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP_IFC)
+        except RuntimeError:
+            # Bu index tipi map'lenemiyorsa normal okumaya düş
+            index = faiss.read_index(index_path)
+        return index_factory.tune_for_search(index)
+
+    def _load(self, doc_id: str, meta: dict) -> DocIndex:
+        doc_dir = self._doc_dir(doc_id)
+        index = self._read_index(doc_id)
+
+        # Offset'ler kopyalanmaz; process'ler aynı sayfaları paylaşır
+        offsets = np.load(doc_dir / OFFSETS_FILE, mmap_mode="r")
+        pages_file = doc_dir / PAGES_FILE
+        page_starts = np.load(pages_file, mmap_mode="r") if pages_file.is_file() else None
+        with open(doc_dir / TEXT_FILE, "r", encoding="utf-8", newline="") as f:
+            text = f.read()
+
+        return DocIndex(
+            mode=meta["mode"],
+            text=text,
+            index=index,
+            offsets=offsets,
+            source=meta.get("source", "user_upload"),
+            page_starts=page_starts,
+        )
+
+    def load_vectors(self, doc_id: str) -> np.ndarray:
+        """Dokümanın chunk vektörleri; diskteki doküman bellekte tutulmak üzere yüklenmez"""
+        self.sync()
+        with self._lock:
+            doc = self._docs.get(doc_id)
+        if doc is not None:
+            index = doc.index
+        elif self._lookup_disk(doc_id) is not None and self.path is not None:
+            index = self._read_index(doc_id)
+        else:
+            raise KeyError(doc_id)
+
+        return index_factory.reconstruct_all(index)
+
+    # --- Bellek bütçesi (LRU / TTL) ---
+
+    def _touch(self, doc_id: str) -> None:
+        self._docs.move_to_end(doc_id)
+        self._last_access[doc_id] = time.monotonic()
+
+    def _add_resident(self, doc_id: str, doc: DocIndex) -> None:
+        self._drop_resident(doc_id)
+        self._docs[doc_id] = doc
+        self._sizes[doc_id] = estimate_doc_bytes(doc)
+        self._vector_sizes[doc_id] = index_factory.index_bytes(doc.index)
+        self._resident_bytes += self._sizes[doc_id]
+        self._resident_vector_bytes += self._vector_sizes[doc_id]
+        self._touch(doc_id)
+
+    def _drop_resident(self, doc_id: str) -> None:
+        if self._docs.pop(doc_id, None) is not None:
+            self._resident_bytes -= self._sizes.pop(doc_id)
+            self._resident_vector_bytes -= self._vector_sizes.pop(doc_id)
+            self._last_access.pop(doc_id, None)
+
+    def _evict(self, doc_id: str) -> None:
+        self._drop_resident(doc_id)
+        self.evictions += 1
+        if self.path is not None:
+            # Kayıt zaten diskte (write-through); sadece bellekten çıkıyor
+            self.spills += 1
+        else:
+            # Yedek yok: doküman tamamen unutulur
+            self._catalog_pop(doc_id)
+
+    def _enforce_limits(self, keep: Optional[str] = None) -> None:
+        """TTL'i dolan ve bütçeyi aşan dokümanları LRU sırasıyla bellekten atar"""
+        if self.idle_ttl_sec:
+            cutoff = time.monotonic() - self.idle_ttl_sec
+            while self._docs:
+                oldest = next(iter(self._docs))
+                if oldest == keep or self._last_access[oldest] >= cutoff:
+                    break
+                self._evict(oldest)
+
+        if self.max_bytes:
+            for doc_id in list(self._docs):
+                if self._resident_bytes <= self.max_bytes:
+                    break
+                if doc_id != keep:
+                    self._evict(doc_id)
+
+    def evict_expired(self) -> None:
+        with self._lock:
+            self._enforce_limits()
+
+    def describe(self, doc_id: str) -> dict:
+        """
+        Dokümanın boyut / bellek bilgisi; diskteki doküman bunun için yüklenmez.
+        resident_bytes sadece doküman bellekteyse dolu gelir.
+        """
+        self.sync()
+        with self._lock:
+            meta = self._lookup_disk(doc_id) if isinstance(doc_id, str) else None
+            if meta is None:
+                raise KeyError(doc_id)
+            return {
+                "mode": meta["mode"],
+                "chars": meta["chars"],
+                "chunks": meta["chunks"],
+                "index_type": meta.get("index_type", "flat"),
+                "quantization": meta.get("quantization", "none"),
+                "vector_bytes": meta.get("vector_bytes"),
+                "resident": doc_id in self._docs,
+                "resident_bytes": self._sizes.get(doc_id),
+            }
+
+    def stats(self) -> Dict:
+        self.sync()
+        with self._lock:
+            return {
+                "documents": len(self._scan()),
+                "resident_documents": len(self._docs),
+                "resident_bytes": self._resident_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "spills": self.spills,
+            }
+
+    def counters(self) -> Dict[str, int]:
+        """
+        Health probe'ları için O(1) sayaçlar: katalog ve bellek değiştikçe güncellenir,
+        dokümanlar taranmaz. Lock sadece başka bir worker katalogu değiştirdiyse
+        beklenir (ilk çağrıda katalog bir kez keşfedilir).
+        """
+        if self._catalog is None:
+            self._scan()
+        self.sync()
+        return {
+            "documents": len(self._catalog),
+            "chunks": self._chunk_count,
+            "resident_documents": len(self._docs),
+            "resident_bytes": self._resident_bytes,
+            "resident_vector_bytes": self._resident_vector_bytes,
+        }
+
+    # --- MutableMapping arayüzü ---
+
+    def __contains__(self, doc_id) -> bool:
+        self.sync()
+        if doc_id in self._docs:
+            return True
+        return isinstance(doc_id, str) and self._lookup_disk(doc_id) is not None
+
+    def __getitem__(self, doc_id: str) -> DocIndex:
+        self.sync()
+        with self._lock:
+            doc = self._docs.get(doc_id)
+            if doc is not None:
+                self.hits += 1
+                self._touch(doc_id)
+                # İstenen doküman tek başına bütçeyi aşsa da bu erişimde atılmaz
+                self._enforce_limits(keep=doc_id)
+                return doc
+
+            self.misses += 1
+            meta = self._lookup_disk(doc_id) if isinstance(doc_id, str) else None
+            if meta is None:
+                raise KeyError(doc_id)
+
+            doc = self._load(doc_id, meta)
+            self._add_resident(doc_id, doc)
+            self._enforce_limits(keep=doc_id)
+            return doc
+
+    def __setitem__(self, doc_id: str, doc: DocIndex) -> None:
+        if self.path is not None and not _SAFE_ID.fullmatch(doc_id):
+            raise ValueError(f"Geçersiz doc_id: {doc_id!r}")
+
+        meta = self._persist(doc_id, doc)
+        with self._lock:
+            self._catalog_put(doc_id, meta)
+            self._add_resident(doc_id, doc)
+            self._enforce_limits(keep=doc_id)
+        self._append_log("+", doc_id)
+
+    def __delitem__(self, doc_id: str) -> None:
+        if doc_id not in self:
+            raise KeyError(doc_id)
+        with self._lock:
+            self._drop_resident(doc_id)
+            self._catalog_pop(doc_id)
+            if self.path is not None:
+                shutil.rmtree(self._doc_dir(doc_id), ignore_errors=True)
+        self._append_log("-", doc_id)
+
+    # Katalog her dokümanı içerir (bellekte olsun olmasın); iterasyon index yüklemez
+
+    def __iter__(self) -> Iterator[str]:
+        self.sync()
+        return iter(list(self._scan().keys()))
+
+    def __len__(self) -> int:
+        self.sync()
+        return len(self._scan())
+
+    def total_chunks(self) -> int:
+        """Toplam chunk sayısı; diskteki dokümanlar yüklenmeden doc.json'dan okunur"""
+        self._scan()
+        self.sync()
+        return self._chunk_count
+
+
+#Session Store
+BUDDY_DB: DocStore = DocStore(
+    settings.VECTOR_DB_PATH if settings.PERSIST_DOCUMENTS else None,
+    max_bytes=settings.STORE_MAX_MB * 1024 * 1024,
+    idle_ttl_sec=settings.STORE_IDLE_TTL_SEC,
+)
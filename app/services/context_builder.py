@@ -0,0 +1,93 @@
+"""
+Prompt bağlamının (context) hazırlanması.
+
+Retrieval sonuçlarından:
+- MIN_RELEVANCE_SCORE altındakiler atılır (en iyi sonuç her zaman kalır)
+- aynı dokümanda örtüşen / bitişik chunk'lar offset'lerine göre tek blokta
+  birleştirilir; overlap metni prompt'a bir kez girer
+- bloklar alaka sırasıyla token bütçesine sığdırılır
+
+Token sayısı tokenizer'sız, karakter sayısından tahmin edilir (~4 karakter/token).
+"""
+from typing import Dict, List, Tuple
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def relevance(distance: float) -> float:
+    # Kaynaklarda gösterilen skorla aynı normalize
+    return 1.0 / (1.0 + distance)
+
+
+def _merge_hits(hits: List[Dict]) -> List[Dict]:
+    # Aynı dokümanın hit'leri: start'a göre sıralayıp örtüşenleri birleştir
+    groups: Dict[int, List[Dict]] = {}
+    for hit in hits:
+        groups.setdefault(id(hit["doc"]), []).append(hit)
+
+    blocks = []
+    for group in groups.values():
+        group.sort(key=lambda h: h["start"])
+        current = None
+        for hit in group:
+            if current is not None and hit["start"] <= current["end"]:
+                current["end"] = max(current["end"], hit["end"])
+                current["rank"] = min(current["rank"], hit["rank"])
+                current["hits"].append(hit)
+                continue
+            current = {
+                "doc": hit["doc"],
+                "start": hit["start"],
+                "end": hit["end"],
+                "page": hit.get("page"),
+                "rank": hit["rank"],
+                "hits": [hit],
+            }
+            blocks.append(current)
+
+    blocks.sort(key=lambda b: b["rank"])
+    return blocks
+
+
+def build_context(
+    results: List[Dict], max_tokens: int, min_relevance: float = 0.0
+) -> Tuple[List[Dict], List[Dict], Dict[str, int]]:
+    """
+    results: _hits_to_results / search_global çıktısı (rank sıralı; doc, start, end içerir).
+    Döner: (prompt blokları [{"chunk", "page"}], bağlama giren hit'ler, istatistik).
+    """
+    kept = [r for r in results if relevance(r["distance"]) >= min_relevance]
+    if not kept and results:
+        kept = results[:1]
+
+    blocks = []
+    used: List[Dict] = []
+    budget = max_tokens * CHARS_PER_TOKEN
+    truncated = False
+    for block in _merge_hits(kept):
+        if budget <= 0:
+            truncated = True
+            break
+        text = block["doc"].text[block["start"]:block["end"]]
+        if len(text) > budget:
+            text = text[:budget]
+            truncated = True
+        budget -= len(text)
+        blocks.append({"chunk": text, "page": block["page"]})
+        used.extend(block["hits"])
+    used.sort(key=lambda r: r["rank"])
+
+    naive_tokens = sum(estimate_tokens(r["chunk"]) for r in results)
+    context_tokens = sum(estimate_tokens(b["chunk"]) for b in blocks)
+    return blocks, used, {
+        "hits": len(results),
+        "dropped": len(results) - len(kept),
+        "merged": len(used) - len(blocks),
+        "truncated": int(truncated),
+        "context_tokens": context_tokens,
+        "tokens_saved": naive_tokens - context_tokens,
+    }
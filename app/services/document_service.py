@@ -1,5 +1,189 @@
+import codecs
+import re
+from concurrent.futures import Executor
 from pathlib import Path
-from typing import List
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Upload / dosya okuma blok boyutu: işlenen metin bu kadar parçalar halinde gelir
+READ_BLOCK_SIZE = 256 * 1024
+
+
+class FileTooLarge(ValueError):
+    """Dosya MAX_FILE_SIZE_MB sınırını aşıyor"""
+
+
+def read_blocks(stream: BinaryIO, block_size: int = READ_BLOCK_SIZE) -> Iterator[bytes]:
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            return
+        yield block
+
+
+def decode_blocks(blocks: Iterable[bytes], encoding: str = "utf-8") -> Iterator[str]:
+    """Byte bloklarını artımlı decode eder (blok sınırında bölünen çok byte'lı karakterler dahil)"""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for block in blocks:
+        piece = decoder.decode(block)
+        if piece:
+            yield piece
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def strip_stream(pieces: Iterable[str]) -> Iterator[str]:
+    """"".join(pieces).strip() ile aynı metni, birleştirmeden parça parça verir"""
+    started = False
+    pending = ""  # devamında boşluk olmayan bir parça gelirse yazılacak boşluklar
+    for piece in pieces:
+        if not started:
+            piece = piece.lstrip()
+            if not piece:
+                continue
+            started = True
+
+        body = piece.rstrip()
+        if not body:
+            pending += piece
+            continue
+        if pending:
+            yield pending
+        yield body
+        pending = piece[len(body):]
+
+
+def _copy_blocks(src: BinaryIO, dest: BinaryIO, max_bytes: int = 0) -> Iterator[bytes]:
+    size = 0
+    for block in read_blocks(src):
+        size += len(block)
+        if max_bytes and size > max_bytes:
+            raise FileTooLarge(f"Dosya {max_bytes} byte sınırını aşıyor")
+        dest.write(block)
+        yield block
+
+
+def spool_upload(src: BinaryIO, dest: BinaryIO, max_bytes: int = 0) -> int:
+    """Upload'ı bloklar halinde dest'e kopyalar, byte sayısını döndürür (FileTooLarge fırlatabilir)"""
+    return sum(len(block) for block in _copy_blocks(src, dest, max_bytes))
+
+
+def spool_text_upload(src: BinaryIO, dest: BinaryIO, max_bytes: int = 0, markdown: bool = False) -> int:
+    """
+    Upload'ı bloklar halinde dest'e kopyalar; bu sırada UTF-8'i doğrular ve
+    strip edilmiş metnin karakter sayısını döndürür. Metnin tamamı bellekte tutulmaz.
+    markdown: sayım, indekslenecek düz metin (iter_markdown_text) üzerinden yapılır.
+    UnicodeDecodeError veya FileTooLarge fırlatabilir.
+    """
+    pieces = decode_blocks(_copy_blocks(src, dest, max_bytes))
+    if markdown:
+        pieces = iter_markdown_text(pieces)
+    return sum(len(piece) for piece in strip_stream(pieces))
+
+
+# --- Markdown ---
+
+_MD_FENCE = re.compile(r"^\s{0,3}(```|~~~)")
+_MD_HEADING = re.compile(r"^\s{0,3}#{1,6}\s+")
+_MD_IMAGE = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+_MD_LINK = re.compile(r"\[([^\]]+)\]\([^)]*\)")
+_MD_STRONG = re.compile(r"(\*\*|__)(\S.*?)\1")
+_MD_CODE = re.compile(r"`([^`]*)`")
+_MD_HTML = re.compile(r"<[^>\n]+>")
+
+
+def _markdown_line(line: str) -> str:
+    line = _MD_HEADING.sub("", line)
+    line = _MD_IMAGE.sub(r"\1", line)
+    line = _MD_LINK.sub(r"\1", line)
+    line = _MD_STRONG.sub(r"\2", line)
+    line = _MD_CODE.sub(r"\1", line)
+    return _MD_HTML.sub("", line)
+
+
+def iter_markdown_text(pieces: Iterable[str]) -> Iterator[str]:
+    """
+    Markdown'ı satır satır düz metne çevirir (başlık işaretleri, link URL'leri,
+    vurgu ve HTML etiketleri atılır). ``` / ~~~ kod bloklarının içi olduğu gibi
+    korunur; sadece fence satırları boşaltılır.
+    """
+    fence = None  # açık kod bloğunun işareti (``` veya ~~~)
+
+    def convert(line: str) -> str:
+        nonlocal fence
+        m = _MD_FENCE.match(line)
+        if fence is None:
+            if m:
+                fence = m.group(1)
+                return ""
+            return _markdown_line(line)
+        if m and m.group(1) == fence:
+            fence = None
+            return ""
+        return line
+
+    rest = ""
+    for piece in pieces:
+        lines = (rest + piece).split("\n")
+        rest = lines.pop()  # yarım kalan satır bir sonraki parçayla tamamlanır
+        if not lines:
+            continue
+        yield "\n".join(convert(line) for line in lines) + "\n"
+    if rest:
+        yield convert(rest)
+
+
+# --- PDF ---
+
+PDF_PAGE_SEPARATOR = "\n\n"
+
+
+def _extract_page_range(path: str, start: int, stop: int) -> List[str]:
+    """Process pool worker'ı: [start, stop) sayfalarının metni"""
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def extract_pdf_pages(path: str, executor: Optional[Executor] = None, pages_per_task: int = 8) -> List[str]:
+    """
+    PDF'in sayfa metinleri (sıralı). executor (ProcessPoolExecutor) verilirse
+    sayfa grupları ayrı process'lerde paralel çıkarılır; CPU-yoğun extraction
+    API process'inde GIL tutmaz.
+    """
+    from pypdf import PdfReader
+
+    page_count = len(PdfReader(path).pages)
+    ranges = [(s, min(s + pages_per_task, page_count)) for s in range(0, page_count, pages_per_task)]
+    if executor is None:
+        parts = [_extract_page_range(path, s, e) for s, e in ranges]
+    else:
+        futures = [executor.submit(_extract_page_range, path, s, e) for s, e in ranges]
+        parts = [f.result() for f in futures]
+    return [page for part in parts for page in part]
+
+
+def join_pages(pages: List[str]) -> Tuple[str, np.ndarray]:
+    """
+    Sayfaları tek metinde birleştirir. page_starts[i]: i. sayfanın (1'den değil
+    0'dan sayılan) metindeki başlangıç offset'i; boş sayfalar bir sonrakiyle aynı
+    offset'i alır, böylece page_of doğru sayfayı verir.
+    """
+    parts: List[str] = []
+    starts = np.zeros(len(pages), dtype=np.int64)
+    offset = 0
+    for i, page in enumerate(pages):
+        page = page.strip()
+        sep = len(PDF_PAGE_SEPARATOR) if parts else 0
+        starts[i] = offset + sep
+        if page:
+            parts.append(page)
+            offset += sep + len(page)
+    return PDF_PAGE_SEPARATOR.join(parts), starts
+
 
 class SimpleTextSplitter:
     def __init__(self, chunk_size=500, chunk_overlap=50):
@@ -7,20 +191,62 @@ class SimpleTextSplitter:
         self.chunk_overlap = chunk_overlap
 
     def split_text(self, text: str) -> List[str]:
-        chunks = []
-        start = 0
-        text_len = len(text)
+        return [text[start:end] for start, end in self.split_spans(text)]
+
+    def split_spans(self, text: str) -> List[Tuple[int, int]]:
+        """
+        split_text ile aynı chunk'ları (start, end) offset'leri olarak döndürür.
+        Offset'ler strip edilmiş chunk'ı gösterir: text[start:end] == chunk
+        """
+        return list(self.iter_spans(text))
+
+    def iter_spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        """split_spans'in lazy versiyonu: span'ler üretildikçe tüketilebilir"""
+        return self.iter_spans_stream([text])
 
+    def iter_spans_stream(self, pieces: Iterable[str]) -> Iterator[Tuple[int, int]]:
+        """
+        Parça parça gelen metin (ör. dosyadan okunan bloklar) üzerinde span üretir.
+        Offset'ler parçaların birleşimine göredir ve sonuç
+        split_spans("".join(pieces)) ile birebir aynıdır. Bellekte en fazla
+        yaklaşık bir chunk boyu + son parça tutulur.
+        """
+        for start, end, _, _ in self._iter_windows(pieces):
+            yield start, end
 
+    def iter_chunks_stream(self, pieces: Iterable[str]) -> Iterator[Tuple[int, int, str]]:
+        """iter_spans_stream gibi, ama chunk metnini de verir: (start, end, chunk)"""
+        for start, end, buf, base in self._iter_windows(pieces):
+            yield start, end, buf[start - base:end - base]
+
+    def _iter_windows(self, pieces: Iterable[str]) -> Iterator[Tuple[int, int, str, int]]:
+        # (start, end, buf, base): buf == text[base:base + len(buf)] ve span'i kapsar
         if self.chunk_overlap >= self.chunk_size:
             raise ValueError("chunk_overlap, chunk_size'dan küçük olmalı")
 
+        step = self.chunk_size - self.chunk_overlap
+        buf, base, start = "", 0, 0
+
+        for piece in pieces:
+            if start > base:
+                # start'tan öncesi bir daha okunmaz
+                buf, base = buf[start - base:], start
+            buf += piece
+
+            # Pencere tamamen geldiyse metnin devamından bağımsızdır
+            while start + self.chunk_size <= base + len(buf):
+                span = self._strip_span(buf, base, start, start + self.chunk_size)
+                if span is not None:
+                    yield span[0], span[1], buf, base
+                start += step
+
+        # Metnin sonu: orijinal döngünün kalanı
+        text_len = base + len(buf)
         while start < text_len:
             end = min(start + self.chunk_size, text_len)
-            chunk = text[start:end].strip()
-
-            if chunk:
-                chunks.append(chunk)
+            span = self._strip_span(buf, base, start, end)
+            if span is not None:
+                yield span[0], span[1], buf, base
 
             #  start ilerlemek zorunda
             next_start = end - self.chunk_overlap
@@ -29,7 +255,15 @@ class SimpleTextSplitter:
 
             start = next_start
 
-        return chunks
+    @staticmethod
+    def _strip_span(buf: str, base: int, start: int, end: int) -> Optional[Tuple[int, int]]:
+        # str.strip() ile aynı sonuç, ama kopya üretmeden
+        s, e = start - base, end - base
+        while s < e and buf[s].isspace():
+            s += 1
+        while e > s and buf[e - 1].isspace():
+            e -= 1
+        return (s + base, e + base) if s < e else None
 
 
 class DocumentService:
@@ -40,6 +274,18 @@ class DocumentService:
     def split_text(self, text: str):
         return self.text_splitter.split_text(text)
 
+    def split_spans(self, text: str):
+        return self.text_splitter.split_spans(text)
+
+    def iter_spans(self, text: str):
+        return self.text_splitter.iter_spans(text)
+
+    def iter_spans_stream(self, pieces):
+        return self.text_splitter.iter_spans_stream(pieces)
+
+    def iter_chunks_stream(self, pieces):
+        return self.text_splitter.iter_chunks_stream(pieces)
+
 
 
     def read_text_file(self, file_path: str) -> str:
@@ -66,8 +312,13 @@ class DocumentService:
         if not file_path.exists():
             raise FileNotFoundError(f"Dosya bulunamadı: {file_path}")
 
-        if file_path.suffix.lower() == ".txt":
+        suffix = file_path.suffix.lower()
+        if suffix == ".txt":
             return self.read_text_file(str(file_path))
+        if suffix == ".md":
+            return "".join(iter_markdown_text([self.read_text_file(str(file_path))]))
+        if suffix == ".pdf":
+            return join_pages(extract_pdf_pages(str(file_path)))[0]
 
         raise ValueError(f"Desteklenmeyen dosya türü: {file_path.suffix}")
 
@@ -78,4 +329,7 @@ class DocumentService:
     def list_documents(self):
         if not self.documents_path.exists():
             return []
-        return [str(p) for p in self.documents_path.glob("*.txt")]
+        return [
+            str(p) for p in self.documents_path.iterdir()
+            if p.suffix.lower() in (".txt", ".md", ".pdf")
+        ]
@@ -0,0 +1,162 @@
+"""
+Embedding micro-batcher.
+
+Her /ask tek bir soru embed eder; SentenceTransformer.encode'u tek tek
+çağırmak, çağrı başına sabit maliyeti her istekte tekrar öder. Bu katman
+eşzamanlı encode isteklerini en fazla birkaç milisaniye (veya N metin)
+biriktirir, tek bir batch olarak encode eder ve her çağırana kendi
+satırlarını geri verir.
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Batch boyutu dağılımı için üst sınırlar (2'nin kuvvetleri)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+@dataclass
+class _EncodeRequest:
+    texts: List[str]
+    future: Future = field(default_factory=Future)
+
+
+class EmbeddingBatcher:
+    def __init__(self, embedding_model, max_batch_size: int = 64, max_wait_ms: float = 5.0):
+        self.embedding_model = embedding_model
+        self.max_batch_size = max_batch_size
+        self.max_wait_sec = max_wait_ms / 1000.0
+
+        self._queue: "queue.Queue[_EncodeRequest | None]" = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+        # Metrikler
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._batches = 0
+        self._items = 0
+        self._size_hist = {b: 0 for b in BATCH_SIZE_BUCKETS}
+        self._size_hist_overflow = 0
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._loop, name="embedding-batcher", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, texts: List[str]) -> Future:
+        """Metinleri bir sonraki batch'e ekler; sonuç (len(texts), dim) float32 array"""
+        self._ensure_started()
+        request = _EncodeRequest(texts=list(texts))
+        self._queue.put(request)
+        return request.future
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.submit(texts).result()
+
+    async def aencode(self, texts: List[str]) -> np.ndarray:
+        return await asyncio.wrap_future(self.submit(texts))
+
+    def _loop(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            batch = [first]
+            size = len(first.texts)
+            deadline = time.monotonic() + self.max_wait_sec
+            stop = False
+
+            # İlk istekten sonra max_wait kadar (veya batch dolana kadar) topla
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                batch.append(request)
+                size += len(request.texts)
+
+            self._run_batch(batch)
+            if stop:
+                return
+
+    def _run_batch(self, batch: List[_EncodeRequest]) -> None:
+        # Beklerken iptal edilen istekleri (ör. client koptu) encode etmeyiz
+        batch = [r for r in batch if r.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        texts = [t for r in batch for t in r.texts]
+        try:
+            emb = self.embedding_model.encode(
+                texts, batch_size=max(len(texts), 1), show_progress_bar=False
+            )
+            emb = np.asarray(emb, dtype="float32")
+        except Exception as e:
+            logger.error("Embedding batch'i başarısız", exc_info=True)
+            for r in batch:
+                r.future.set_exception(e)
+            return
+
+        offset = 0
+        for r in batch:
+            r.future.set_result(emb[offset:offset + len(r.texts)])
+            offset += len(r.texts)
+
+        self._record(len(batch), len(texts))
+
+    def _record(self, requests: int, items: int) -> None:
+        with self._stats_lock:
+            self._requests += requests
+            self._batches += 1
+            self._items += items
+            for bucket in BATCH_SIZE_BUCKETS:
+                if items <= bucket:
+                    self._size_hist[bucket] += 1
+                    break
+            else:
+                self._size_hist_overflow += 1
+
+    def queue_depth(self) -> int:
+        """Embed edilmeyi bekleyen istek sayısı (lock almadan)"""
+        return self._queue.qsize()
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            hist = {f"<={b}": n for b, n in self._size_hist.items()}
+            hist[f">{BATCH_SIZE_BUCKETS[-1]}"] = self._size_hist_overflow
+            return {
+                "requests": self._requests,
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "batch_size_histogram": hist,
+                "queue_depth": self.queue_depth(),
+            }
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
@@ -0,0 +1,133 @@
+"""
+Tüm dokümanları kapsayan global vektör index'i.
+
+Her DocIndex kendi index'ini tutar; bu index ise tüm dokümanların
+vektörlerini kararlı integer id'lerle tek bir FAISS index'inde toplar.
+id -> (doc_id, chunk_no) eşlemesi sayesinde:
+- doküman eklemek sadece onun vektörlerini ekler,
+- doküman silmek sadece onun id'lerini kaldırır (yeniden build yok),
+- sorgu tüm korpusta veya seçili doc_id'lerde tek search çağrısıyla yapılır.
+
+Birden fazla worker process'i varsa her biri kendi global index'ini tutar;
+diğer worker'ların eklediği / sildiği dokümanlar sync() ile store'un katalog
+günlüğünden uygulanır.
+"""
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from app.services import index_factory
+
+logger = logging.getLogger(__name__)
+
+Hit = Tuple[str, int, float]  # (doc_id, chunk_no, distance)
+
+
+class GlobalIndex:
+    def __init__(self):
+        self._index: Optional[faiss.IndexIDMap2] = None  # boyut ilk eklemede belli olur
+        self._next_id = 0
+        self._id_to_chunk: Dict[int, Tuple[str, int]] = {}
+        self._doc_ids: Dict[str, np.ndarray] = {}
+        self._log_pos = 0  # store katalog günlüğünde uygulanan son konum
+        self._lock = threading.RLock()
+
+    def _ensure_index(self, dim: int) -> faiss.IndexIDMap2:
+        if self._index is None:
+            # Silme (remove_ids) desteklemesi için exact arama; metrik dokümanlarla aynı.
+            # Quantization açıksa eğitim gerektirmeyen fp16 kullanılır (int8 min-max ister)
+            quantization = "fp16" if index_factory.quantization_enabled() else "none"
+            self._index = faiss.IndexIDMap2(index_factory.make_storage(dim, quantization))
+        return self._index
+
+    def add_document(self, doc_id: str, embeddings: np.ndarray) -> None:
+        embeddings = index_factory.prepare_vectors(embeddings)
+        with self._lock:
+            if doc_id in self._doc_ids:
+                self.remove_document(doc_id)
+            if len(embeddings) == 0:
+                return
+
+            index = self._ensure_index(embeddings.shape[1])
+            ids = np.arange(self._next_id, self._next_id + len(embeddings), dtype="int64")
+            self._next_id += len(embeddings)
+
+            index.add_with_ids(embeddings, ids)
+            self._doc_ids[doc_id] = ids
+            for chunk_no, vid in enumerate(ids.tolist()):
+                self._id_to_chunk[vid] = (doc_id, chunk_no)
+
+    def remove_document(self, doc_id: str) -> None:
+        with self._lock:
+            ids = self._doc_ids.pop(doc_id, None)
+            if ids is None:
+                return
+            self._index.remove_ids(faiss.IDSelectorBatch(ids))
+            for vid in ids.tolist():
+                del self._id_to_chunk[vid]
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_ids
+
+    def search(self, query_embs: np.ndarray, k: int, doc_ids: Optional[Iterable[str]] = None) -> List[List[Hit]]:
+        """
+        Her sorgu için en yakın k chunk'ı (doc_id, chunk_no, distance) olarak döndürür.
+        doc_ids verilirse arama sadece o dokümanların vektörleriyle sınırlanır.
+        """
+        with self._lock:
+            if self._index is None or self._index.ntotal == 0:
+                return [[] for _ in range(len(query_embs))]
+
+            params = None
+            if doc_ids is not None:
+                selected = [self._doc_ids[d] for d in doc_ids if d in self._doc_ids]
+                if not selected:
+                    return [[] for _ in range(len(query_embs))]
+                params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(np.concatenate(selected)))
+
+            distances, ids = index_factory.search(self._index, query_embs, k, params=params)
+
+            return [
+                [
+                    (*self._id_to_chunk[vid], float(dist))
+                    for vid, dist in zip(row_ids.tolist(), row_dist.tolist())
+                    if vid >= 0
+                ]
+                for row_ids, row_dist in zip(ids, distances)
+            ]
+
+    def rebuild(self, store) -> None:
+        """Açılışta store'daki tüm dokümanların vektörlerini yükler"""
+        self._log_pos = store.log_position()
+        for doc_id in store:
+            try:
+                self.add_document(doc_id, store.load_vectors(doc_id))
+            except Exception:
+                logger.warning("Global index'e eklenemedi (doc_id=%s)", doc_id, exc_info=True)
+
+    def sync(self, store) -> List[str]:
+        """Diğer process'lerin store'da yaptığı değişiklikleri uygular; değişen doc_id'leri döndürür"""
+        if store.log_position() == self._log_pos:
+            return []
+        with self._lock:
+            self._log_pos, changes = store.changes_since(self._log_pos)
+        for op, doc_id in changes:
+            if op == "-":
+                self.remove_document(doc_id)
+                continue
+            try:
+                self.add_document(doc_id, store.load_vectors(doc_id))
+            except KeyError:
+                # Bu arada silinmiş
+                self.remove_document(doc_id)
+        return [doc_id for _, doc_id in changes]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "documents": len(self._doc_ids),
+                "vectors": self._index.ntotal if self._index is not None else 0,
+            }
@@ -0,0 +1,259 @@
+"""
+FAISS index factory.
+
+VECTOR_DB_TYPE ile index tipi seçilir:
+- "flat":  brute-force, kesin sonuç (küçük dokümanlar için en iyisi)
+- "hnsw":  graf tabanlı ANN, büyük index'lerde düşük gecikme
+- "ivfpq": kümeleme + product quantization, çok büyük korpuslarda düşük bellek
+- "faiss" / "auto": vektör sayısına göre otomatik (HNSW_MIN_VECTORS, IVFPQ_MIN_VECTORS)
+
+VECTOR_QUANTIZATION flat / hnsw index'lerinde vektörlerin nasıl saklanacağını
+belirler: "fp16" (2 byte/boyut) veya "int8" (1 byte/boyut, scalar quantization).
+IVF-PQ zaten sıkıştırılmış kod saklar.
+
+VECTOR_METRIC="cosine" iken embedding'ler normalize edilip inner-product ile
+aranır. Skorlar API'ye L2 eşdeğeri mesafe olarak döner (normalize vektörlerde
+||a-b||² = 2 - 2·cos), böylece relevance hesabı index tipinden bağımsız kalır.
+"""
+import logging
+import math
+from typing import List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+
+QUANTIZATIONS = {
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+    "int8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+# IVF-PQ eğitimi için gereken en az vektör (PQ kod kitabı 2^8 merkez ister)
+IVFPQ_MIN_TRAIN = 1024
+
+
+def _metric() -> int:
+    return faiss.METRIC_INNER_PRODUCT if settings.VECTOR_METRIC == "cosine" else faiss.METRIC_L2
+
+
+def choose_index_type(n_vectors: int, index_type: Optional[str] = None) -> str:
+    index_type = (index_type or settings.VECTOR_DB_TYPE).lower()
+    if index_type in INDEX_TYPES:
+        if index_type == "ivfpq" and n_vectors < IVFPQ_MIN_TRAIN:
+            logger.info("IVF-PQ için vektör sayısı yetersiz (%d), flat kullanılıyor", n_vectors)
+            return "flat"
+        return index_type
+
+    # "faiss" / "auto": boyuta göre seç
+    if n_vectors >= settings.IVFPQ_MIN_VECTORS:
+        return "ivfpq"
+    if n_vectors >= settings.HNSW_MIN_VECTORS:
+        return "hnsw"
+    return "flat"
+
+
+def prepare_vectors(vectors: np.ndarray, copy: bool = True) -> np.ndarray:
+    """
+    Index'e eklenecek / sorgulanacak vektörler (cosine için L2-normalize).
+    copy=False iken float32 C-contiguous girdi yerinde normalize edilir.
+    """
+    if copy:
+        vectors = np.array(vectors, dtype="float32", copy=True, order="C")
+    else:
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+    if settings.VECTOR_METRIC == "cosine":
+        faiss.normalize_L2(vectors)
+    return vectors
+
+
+def make_flat(dim: int) -> faiss.Index:
+    return faiss.IndexFlatIP(dim) if _metric() == faiss.METRIC_INNER_PRODUCT else faiss.IndexFlatL2(dim)
+
+
+def _quantization(quantization: Optional[str]) -> Optional[int]:
+    quantization = (quantization or settings.VECTOR_QUANTIZATION).lower()
+    if quantization in ("", "none", "fp32"):
+        return None
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Bilinmeyen VECTOR_QUANTIZATION: {quantization!r}")
+    return QUANTIZATIONS[quantization]
+
+
+def quantization_enabled() -> bool:
+    return _quantization(None) is not None
+
+
+def make_storage(dim: int, quantization: Optional[str] = None) -> faiss.Index:
+    """Kesin (brute-force) arama yapan index; vektörler istenirse fp16 / int8 saklanır"""
+    qtype = _quantization(quantization)
+    if qtype is None:
+        return make_flat(dim)
+    return faiss.IndexScalarQuantizer(dim, qtype, _metric())
+
+
+def _pq_subquantizers(dim: int) -> int:
+    # PQ alt-vektör sayısı boyutu tam bölmeli
+    m = min(settings.PQ_M, dim)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def build_index(
+    embeddings: np.ndarray,
+    index_type: Optional[str] = None,
+    quantization: Optional[str] = None,
+    copy: bool = True,
+    n_total: Optional[int] = None,
+) -> faiss.Index:
+    """
+    Embedding'lerden seçilen tipte (veya otomatik) bir FAISS index'i kurar.
+    copy=False: embeddings yerinde normalize edilir, ek bir float32 kopya tutulmaz.
+    n_total: sonradan eklenecekler dahil beklenen vektör sayısı (tip ve nlist seçimi için)
+    """
+    vectors = prepare_vectors(embeddings, copy=copy)
+    n, dim = vectors.shape
+    n_total = max(n_total or 0, n)
+    kind = choose_index_type(n_total, index_type)
+    metric = _metric()
+
+    if kind == "hnsw":
+        qtype = _quantization(quantization)
+        if qtype is None:
+            index = faiss.IndexHNSWFlat(dim, settings.HNSW_M, metric)
+        else:
+            index = faiss.IndexHNSWSQ(dim, qtype, settings.HNSW_M, metric)
+        index.hnsw.efConstruction = settings.HNSW_EF_CONSTRUCTION
+    elif kind == "ivfpq":
+        nlist = settings.IVF_NLIST or int(4 * math.sqrt(n_total))
+        nlist = max(1, min(nlist, n // 39))  # küme başına ~39 eğitim örneği
+        index = faiss.IndexIVFPQ(make_flat(dim), dim, nlist, _pq_subquantizers(dim), 8, metric)
+    else:
+        index = make_storage(dim, quantization)
+
+    if not index.is_trained:
+        # IVF-PQ kod kitapları / int8 için boyut başına min-max aralığı
+        index.train(vectors)
+    index.add(vectors)
+    tune_for_search(index)
+    return index
+
+
+class IndexBuilder:
+    """
+    Vektörleri batch batch alıp index'e ekler (streaming ingest).
+
+    İlk buffer_size vektör biriktirilir; doküman bundan kısaysa sonuç
+    build_index ile birebir aynıdır. Daha uzunsa index tipi expected_vectors
+    tahminiyle seçilir, gerekiyorsa biriken vektörlerle eğitilir ve sonraki
+    batch'ler doğrudan index'e eklenir. Tüm embedding'ler bellekte tutulmaz.
+    """
+
+    def __init__(
+        self,
+        expected_vectors: int = 0,
+        index_type: Optional[str] = None,
+        quantization: Optional[str] = None,
+        buffer_size: Optional[int] = None,
+    ):
+        self.expected_vectors = expected_vectors
+        self.index_type = index_type
+        self.quantization = quantization
+        self.buffer_size = buffer_size or settings.INGEST_INDEX_BUFFER
+        self._pending: List[np.ndarray] = []
+        self._pending_n = 0
+        self._index: Optional[faiss.Index] = None
+
+    def add(self, embeddings: np.ndarray) -> None:
+        """embeddings yerinde normalize edilebilir"""
+        if self._index is not None:
+            self._index.add(prepare_vectors(embeddings, copy=False))
+            return
+
+        self._pending.append(embeddings)
+        self._pending_n += len(embeddings)
+        if self._pending_n >= self.buffer_size:
+            self._flush(max(self.expected_vectors, self._pending_n))
+
+    def _flush(self, n_total: int) -> None:
+        vectors = np.concatenate(self._pending) if len(self._pending) > 1 else self._pending[0]
+        self._pending = []
+        self._index = build_index(
+            vectors, self.index_type, self.quantization, copy=False, n_total=n_total
+        )
+
+    def finish(self) -> faiss.Index:
+        if self._index is None:
+            if not self._pending:
+                raise ValueError("İndekslenecek vektör yok")
+            # Hepsi buffer'da: gerçek sayıyla seç (build_index ile aynı sonuç)
+            self._flush(self._pending_n)
+        return self._index
+
+
+def reconstruct_all(index: faiss.Index) -> np.ndarray:
+    """Index'teki tüm vektörler (quantize index'lerde yaklaşık değerler)"""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()  # IVF index'lerinde reconstruct için gerekli
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def tune_for_search(index: faiss.Index) -> faiss.Index:
+    """Sorgu zamanı ayarları (efSearch / nprobe); yüklenen index'lere de uygulanır"""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = settings.HNSW_EF_SEARCH
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = settings.IVF_NPROBE
+    return index
+
+
+def index_type_of(index: faiss.Index) -> str:
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if faiss.try_extract_index_ivf(index) is not None:
+        return "ivfpq"
+    return "flat"
+
+
+def quantization_of(index: faiss.Index) -> str:
+    """Index'te vektörlerin saklanma biçimi: none | fp16 | int8 | pq"""
+    if faiss.try_extract_index_ivf(index) is not None:
+        return "pq"
+    storage = faiss.downcast_index(index.storage) if isinstance(index, faiss.IndexHNSW) else index
+    if isinstance(storage, faiss.IndexScalarQuantizer):
+        for name, qtype in QUANTIZATIONS.items():
+            if storage.sq.qtype == qtype:
+                return name
+    return "none"
+
+
+def index_bytes(index: faiss.Index) -> int:
+    """Index'in yaklaşık bellek maliyeti (byte): vektör kodları + HNSW graf bağlantıları"""
+    if isinstance(index, faiss.IndexHNSW):
+        storage = faiss.downcast_index(index.storage)
+        return index_bytes(storage) + index.hnsw.neighbors.size() * 4
+    try:
+        return index.ntotal * index.sa_code_size()
+    except RuntimeError:
+        return index.ntotal * index.d * 4
+
+
+def search(index: faiss.Index, queries: np.ndarray, k: int, params=None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    index.search sarmalayıcısı: sorguları metriğe göre hazırlar ve skorları
+    L2 eşdeğeri mesafeye çevirir (küçük = daha yakın).
+    """
+    if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+        queries = np.array(queries, dtype="float32", copy=True, order="C")
+        faiss.normalize_L2(queries)
+        scores, ids = index.search(queries, k, params=params)
+        # Boş sonuçlarda (id=-1) skor -FLT_MAX gelir; cos aralığına kırp
+        return 2.0 - 2.0 * np.clip(scores, -1.0, 1.0), ids
+    return index.search(np.ascontiguousarray(queries, dtype="float32"), k, params=params)
@@ -0,0 +1,363 @@
+"""
+Arka plan doküman indeksleme (ingestion) kuyruğu.
+
+Upload isteği metni (veya diske yazılmış upload dosyasını) kuyruğa bırakıp
+hemen doc_id döner; split + embedding + FAISS index işi sınırlı sayıda worker
+thread'de yapılır. Böylece büyük bir long-mode dokümanı embed edilirken event
+loop diğer istekleri bekletmez. Dosyadan indekslemede metin bloklar halinde
+okunur ve ilerleme job üzerinden raporlanır.
+
+PDF sayfalarının metni ayrı bir process pool'da (sayfa grupları paralel)
+çıkarılır; CPU-yoğun extraction API process'inde GIL tutmaz.
+
+Toplu upload'da (submit_bulk) dosyalar tek job olarak işlenir: tüm dosyaların
+chunk'ları birlikte, büyük batch'ler halinde embed edilir.
+
+jobs_dir verilirse job durumu (pending / running / ready / failed) diske de
+yazılır; birden fazla worker process'inde upload'ı alan worker dışındakiler de
+job'un durumunu görür.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.document_service import (
+    decode_blocks, extract_pdf_pages, iter_markdown_text, join_pages, read_blocks, strip_stream
+)
+
+logger = logging.getLogger(__name__)
+
+
+# Fast mod kısa dokümanlar içindir
+FAST_MODE_MAX_CHARS = 3200
+
+# Job kaynağı: (metin parçaları, PDF sayfa offset'leri)
+Loader = Callable[["IngestJob"], Tuple[Iterable[str], Optional[np.ndarray]]]
+
+
+# doc_id marker dosya adına dönüştüğü için
+_SAFE_JOB_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+class IngestQueueFull(Exception):
+    """Worker'lar ve bekleme kuyruğu dolu; istek reddedilmeli"""
+
+
+@dataclass
+class IngestJob:
+    doc_id: str
+    mode: str
+    chars: int
+    status: str = "pending"  # pending -> running -> ready | failed
+    chunks: Optional[int] = None  # indeksleme sürerken o ana kadar embed edilen chunk sayısı
+    processed_chars: int = 0
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+
+@dataclass
+class BulkFile:
+    filename: str
+    kind: Optional[str]  # "text" | "markdown" | "pdf"; None: desteklenmeyen dosya
+    path: Optional[str] = None  # diske yazılmış içerik (iş bitince silinir)
+    error: Optional[str] = None  # okunurken oluşan hata (ör. boyut sınırı)
+
+
+class IngestService:
+    def __init__(
+        self,
+        rag_service,
+        max_workers: int = 2,
+        max_queue: int = 16,
+        job_ttl_sec: int = 3600,
+        pdf_workers: int = 0,
+        pdf_pages_per_task: int = 8,
+        jobs_dir: Optional[str] = None,
+    ):
+        self.rag_service = rag_service
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.job_ttl_sec = job_ttl_sec
+        self.pdf_workers = pdf_workers or os.cpu_count() or 1
+        self.pdf_pages_per_task = pdf_pages_per_task
+        self.jobs_dir = Path(jobs_dir) if jobs_dir else None
+        if self.jobs_dir is not None:
+            self.jobs_dir.mkdir(parents=True, exist_ok=True)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._pdf_pool: Optional[ProcessPoolExecutor] = None  # ilk PDF'te başlatılır
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, IngestJob] = {}
+        self._inflight = 0  # kuyrukta bekleyen + çalışan job sayısı
+        self._running = 0
+
+    def submit_file(self, path: str, mode: str, chars: int = 0, kind: str = "text") -> IngestJob:
+        """
+        Diske yazılmış upload'ı kuyruğa ekler; dosya iş bitince silinir.
+        kind: "text" / "markdown" (UTF-8, bloklar halinde okunur) veya "pdf".
+        chars: strip edilmiş metin uzunluğu (PDF'te extraction sonrası belli olur).
+        """
+        try:
+            job = self._new_job(mode=mode, chars=chars)
+        except IngestQueueFull:
+            os.unlink(path)
+            raise
+
+        if kind == "pdf":
+            loader = lambda job: self._load_pdf(job, path)
+        else:
+            loader = lambda job: (self._read_text(path, markdown=kind == "markdown"), None)
+        future = self._executor.submit(self._run, job, loader)
+        future.add_done_callback(lambda f: self._unlink_if_cancelled(f, [path]))
+        return job
+
+    def submit_bulk(self, files: List[BulkFile], mode: str) -> Future:
+        """
+        Çok sayıda dosyayı tek job olarak kuyruğa ekler. Future sonucu:
+        (dosya başına sonuçlar, stats). Dosyaların hatası (boş, fast limiti,
+        encoding...) o dosyanın sonucuna yazılır, diğerleri yine indekslenir.
+        Kapasite doluysa IngestQueueFull fırlatır.
+        """
+        try:
+            self._reserve()
+        except IngestQueueFull:
+            self._unlink_all(files)
+            raise
+        future = self._executor.submit(self._run_bulk, files, mode)
+        future.add_done_callback(lambda f: self._unlink_if_cancelled(f, [bf.path for bf in files]))
+        return future
+
+    @staticmethod
+    def _read_text(path: str, markdown: bool = False) -> Iterable[str]:
+        try:
+            with open(path, "rb") as f:
+                pieces = decode_blocks(read_blocks(f))
+                if markdown:
+                    pieces = iter_markdown_text(pieces)
+                yield from strip_stream(pieces)
+        finally:
+            os.unlink(path)
+
+    def _extract_pdf(self, path: str) -> Tuple[str, np.ndarray]:
+        try:
+            pages = extract_pdf_pages(path, self._get_pdf_pool(), self.pdf_pages_per_task)
+        finally:
+            os.unlink(path)
+        return join_pages(pages)
+
+    def _load_pdf(self, job: "IngestJob", path: str) -> Tuple[Iterable[str], np.ndarray]:
+        text, page_starts = self._extract_pdf(path)
+        job.chars = len(text)
+        if job.mode == "fast" and job.chars > FAST_MODE_MAX_CHARS:
+            raise ValueError(f"FAST mode max {FAST_MODE_MAX_CHARS} characters.")
+        return [text], page_starts
+
+    def _get_pdf_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pdf_pool is None:
+                # spawn: torch / FAISS thread'leri olan process'i fork etmek güvenli değil
+                self._pdf_pool = ProcessPoolExecutor(
+                    max_workers=self.pdf_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pdf_pool
+
+    def _reserve(self) -> None:
+        # Kuyrukta / çalışan job sayısını artırır (kapasite doluysa IngestQueueFull)
+        with self._lock:
+            if self._inflight >= self.max_workers + self.max_queue:
+                raise IngestQueueFull("Ingest kuyruğu dolu")
+            self._inflight += 1
+
+    def _new_job(self, mode: str, chars: int) -> IngestJob:
+        self._reserve()
+        with self._lock:
+            self._prune_finished()
+            job = IngestJob(doc_id=str(uuid.uuid4()), mode=mode, chars=chars)
+            self._jobs[job.doc_id] = job
+        self._write_marker(job)
+        return job
+
+    def _add_finished_job(self, doc_id: str, mode: str, chars: int, chunks: int) -> None:
+        # Toplu upload'da indekslenen doküman: durum sorgusu ve eviction (410) tekli upload gibi çalışsın
+        job = IngestJob(
+            doc_id=doc_id, mode=mode, chars=chars, status="ready", chunks=chunks,
+            processed_chars=chars, finished_at=time.time(),
+        )
+        with self._lock:
+            self._prune_finished()
+            self._jobs[doc_id] = job
+        self._write_marker(job)
+
+    def _write_marker(self, job: IngestJob) -> None:
+        # Durum değişince yazılır (ilerleme sadece bu process'te güncel)
+        if self.jobs_dir is None:
+            return
+        tmp = self.jobs_dir / f".{job.doc_id}.{uuid.uuid4().hex[:8]}"
+        try:
+            tmp.write_text(json.dumps(asdict(job)), encoding="utf-8")
+            os.replace(tmp, self.jobs_dir / f"{job.doc_id}.json")
+        except OSError:
+            logger.warning("Job durumu diske yazılamadı (doc_id=%s)", job.doc_id, exc_info=True)
+            tmp.unlink(missing_ok=True)
+
+    def _read_marker(self, doc_id: str) -> Optional[IngestJob]:
+        if self.jobs_dir is None:
+            return None
+        try:
+            data = json.loads((self.jobs_dir / f"{doc_id}.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        return IngestJob(**data)
+
+    def _run(self, job: IngestJob, loader: Loader) -> None:
+        with self._lock:
+            self._running += 1
+        job.status = "running"
+        self._write_marker(job)
+
+        def progress(chunks: int, chars: int) -> None:
+            job.chunks = chunks
+            job.processed_chars = chars
+
+        try:
+            pieces, page_starts = loader(job)
+            _, job.chunks = self.rag_service.build_index_from_stream(
+                pieces,
+                mode=job.mode,
+                doc_id=job.doc_id,
+                expected_chars=job.chars,
+                progress=progress,
+                page_starts=page_starts,
+            )
+            job.processed_chars = job.chars
+            job.status = "ready"
+        except Exception as e:
+            logger.error("Doküman indekslenemedi (doc_id=%s)", job.doc_id, exc_info=True)
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            self._write_marker(job)
+            with self._lock:
+                self._running -= 1
+                self._inflight -= 1
+
+    def _run_bulk(self, files: List[BulkFile], mode: str) -> Tuple[List[Dict[str, Any]], Dict[str, float]]:
+        with self._lock:
+            self._running += 1
+
+        try:
+            t0 = time.perf_counter()
+            results: List[Dict[str, Any]] = []
+            documents = []  # (sonuç, metin, page_starts)
+            for f in files:
+                item = {"filename": f.filename, "doc_id": None, "chars": 0, "chunks": None, "error": f.error}
+                results.append(item)
+                if item["error"] is not None:
+                    continue
+                if f.kind is None:
+                    item["error"] = "Unsupported file type."
+                    continue
+                try:
+                    if f.kind == "pdf":
+                        text, page_starts = self._extract_pdf(f.path)
+                    else:
+                        text, page_starts = "".join(self._read_text(f.path, markdown=f.kind == "markdown")), None
+                except UnicodeDecodeError:
+                    item["error"] = "File must be UTF-8 encoded."
+                    continue
+                except Exception as e:
+                    logger.warning("Dosya okunamadı (%s): %s", f.filename, e)
+                    item["error"] = str(e)
+                    continue
+
+                item["chars"] = len(text)
+                if not text:
+                    item["error"] = "File is empty."
+                elif mode == "fast" and len(text) > FAST_MODE_MAX_CHARS:
+                    item["error"] = f"FAST mode max {FAST_MODE_MAX_CHARS} characters."
+                else:
+                    documents.append((item, text, page_starts))
+            read_ms = (time.perf_counter() - t0) * 1000
+
+            indexed, stats = self.rag_service.build_index_bulk(
+                [(text, page_starts) for _, text, page_starts in documents], mode=mode
+            )
+            for (item, _, _), (doc_id, chunks) in zip(documents, indexed):
+                item["doc_id"] = doc_id
+                item["chunks"] = chunks
+                self._add_finished_job(doc_id, mode, item["chars"], chunks)
+            stats = {"files": len(files), "failed": len(files) - len(documents), "read_ms": round(read_ms, 1), **stats}
+            return results, stats
+        finally:
+            self._unlink_all(files)
+            with self._lock:
+                self._running -= 1
+                self._inflight -= 1
+
+    @staticmethod
+    def _unlink_if_cancelled(future: Future, paths: List[Optional[str]]) -> None:
+        # shutdown kuyruktaki işi loader çalışmadan düşürür; geçici dosyayı başka silen olmaz
+        if not future.cancelled():
+            return
+        for path in paths:
+            if path is not None and os.path.exists(path):
+                os.unlink(path)
+
+    @staticmethod
+    def _unlink_all(files: List[BulkFile]) -> None:
+        for f in files:
+            if f.path is not None and os.path.exists(f.path):
+                os.unlink(f.path)
+
+    def _prune_finished(self) -> None:
+        # Biten job'ları bir süre sonra unut; hazır dokümanlar zaten BUDDY_DB'de
+        cutoff = time.time() - self.job_ttl_sec
+        expired = [
+            doc_id for doc_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for doc_id in expired:
+            del self._jobs[doc_id]
+            if self.jobs_dir is not None:
+                (self.jobs_dir / f"{doc_id}.json").unlink(missing_ok=True)
+
+    def forget(self, doc_id: str) -> None:
+        """Doküman silindi: job kaydı (ve diskteki durumu) da kaldırılır"""
+        with self._lock:
+            self._jobs.pop(doc_id, None)
+        if self.jobs_dir is not None and _SAFE_JOB_ID.fullmatch(doc_id):
+            (self.jobs_dir / f"{doc_id}.json").unlink(missing_ok=True)
+
+    def get(self, doc_id: str) -> Optional[IngestJob]:
+        """Bu process'in job'u; yoksa (başka worker'a yüklendiyse) diskteki durumu"""
+        job = self._jobs.get(doc_id)
+        if job is None and isinstance(doc_id, str) and _SAFE_JOB_ID.fullmatch(doc_id):
+            job = self._read_marker(doc_id)
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "running": self._running,
+                "queued": self._inflight - self._running,
+                "capacity": self.max_workers + self.max_queue,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._pdf_pool is not None:
+            self._pdf_pool.shutdown(wait=False, cancel_futures=True)
@@ -1,40 +1,321 @@
 """LLM Service - Ollama """
+import asyncio
+import json
 import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List
+
+import httpx
 import requests
 from app.config import settings
+from app.services import metrics
+from app.services.backend_pool import BackendPool
 
 logger = logging.getLogger(__name__)
 
+# Ollama'nın raporladığı model yükleme süresi bunu aşarsa çağrı "cold" sayılır
+COLD_LOAD_MS = 500.0
+
+# İstek Ollama'ya hiç ulaşmadı: başka backend'de tekrar denemek güvenli
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+
+def backend_urls() -> List[str]:
+    """OLLAMA_BASE_URLS (virgülle ayrılmış) veya tek OLLAMA_BASE_URL"""
+    urls = [u.strip() for u in settings.OLLAMA_BASE_URLS.split(",") if u.strip()]
+    return urls or [settings.OLLAMA_BASE_URL]
+
 
 class LLMService:
-    def __init__(self, model: str | None = None, base_url: str | None = None):
-        self.base_url = (base_url or settings.OLLAMA_BASE_URL).rstrip("/")
+    def __init__(self, model: str | None = None, base_url: str | None = None, base_urls: List[str] | None = None):
+        urls = base_urls or ([base_url] if base_url else backend_urls())
+        self.pool = BackendPool(urls, settings.OLLAMA_EJECT_FAILURES, settings.OLLAMA_EJECT_SEC)
+        self.base_url = self.pool.backends[0].url
         self.model = model or settings.OLLAMA_MODEL
 
+        # Senkron yol için de bağlantılar tekrar kullanılsın (keep-alive)
+        self._session = requests.Session()
+        # Async client ilk ihtiyaçta, çalışan event loop içinde oluşturulur
+        self._client: httpx.AsyncClient | None = None
+
+        # cold (model yüklenerek) / warm çağrı süreleri
+        self._lock = threading.Lock()
+        self._calls = {"cold": [0, 0.0, 0.0], "warm": [0, 0.0, 0.0]}  # count, toplam ms, toplam load ms
+        self._warmups = 0
+        self._in_flight = 0  # cevabı beklenen Ollama istekleri
+        # İstemci ayrıldığı için yarıda kesilen üretimler
+        self._completed_tokens = 0  # tamamlanan üretimlerin eval_count toplamı
+        self._completed = 0
+        self._cancelled = 0
+        self._tokens_saved = 0
+        self._warmup_failures = 0
+        self._last_warmup_ms: float | None = None
+
+    def _build_payload(self, message: str, stream: bool = False) -> dict:
+        return {
+            "model": self.model,
+            "prompt": message,
+            "stream": stream,
+            # Cevap uzunluğu ve context penceresi sınırlı; model keep_alive süresince bellekte kalır
+            "options": {
+                "num_predict": settings.MAX_TOKENS,
+                "num_ctx": settings.OLLAMA_NUM_CTX,
+                "temperature": settings.TEMPERATURE,
+            },
+            "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+        }
+
+    def _record(self, result: dict, elapsed_ms: float) -> None:
+        # Ollama süreleri nanosaniye cinsinden döner
+        load_ms = result.get("load_duration", 0) / 1e6
+        kind = "cold" if load_ms >= COLD_LOAD_MS else "warm"
+        metrics.STAGE_SECONDS.observe(elapsed_ms / 1000, "ollama", kind)
+        with self._lock:
+            entry = self._calls[kind]
+            entry[0] += 1
+            entry[1] += elapsed_ms
+            entry[2] += load_ms
+            if "eval_count" in result:
+                self._completed += 1
+                self._completed_tokens += result["eval_count"]
+
+    def _record_cancel(self, produced: int) -> None:
+        """
+        Yarıda kesilen üretim: kazanılan token, tamamlanan cevapların ortalama
+        uzunluğundan (yoksa MAX_TOKENS) o ana kadar üretilen kadar azı olarak tahmin edilir.
+        """
+        with self._lock:
+            expected = self._completed_tokens / self._completed if self._completed else settings.MAX_TOKENS
+            self._cancelled += 1
+            self._tokens_saved += max(int(expected) - produced, 0)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def warmed(self) -> bool:
+        """Model en az bir kez Ollama'da yüklendi mi (warm-up)"""
+        return self._warmups > 0
+
+    def _enter(self) -> None:
+        with self._lock:
+            self._in_flight += 1
+
+    def _exit(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            calls = {
+                kind: {
+                    "count": count,
+                    "avg_ms": round(total / count, 1) if count else None,
+                    "avg_load_ms": round(load / count, 1) if count else None,
+                }
+                for kind, (count, total, load) in self._calls.items()
+            }
+            return {
+                "model": self.model,
+                "in_flight": self._in_flight,
+                **calls,
+                "warmups": self._warmups,
+                "warmup_failures": self._warmup_failures,
+                "last_warmup_ms": self._last_warmup_ms,
+                "cancelled": self._cancelled,
+                "tokens_saved": self._tokens_saved,
+                "backends": self.pool.stats(),
+            }
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Ollama için paylaşılan, bağlantı havuzlu async HTTP client.
+        - Keep-alive bağlantılar istekler arasında tekrar kullanılır
+        - Havuz boyutu backend başına OLLAMA_POOL_SIZE ile sınırlanır
+        """
+        if self._client is None or self._client.is_closed:
+            size = settings.OLLAMA_POOL_SIZE * len(self.pool.backends)
+            limits = httpx.Limits(
+                max_connections=size,
+                max_keepalive_connections=size,
+                keepalive_expiry=settings.OLLAMA_KEEPALIVE_SEC,
+            )
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=limits,
+                timeout=httpx.Timeout(settings.OLLAMA_TIMEOUT),
+            )
+        return self._client
+
+    @asynccontextmanager
+    async def _generate(self, payload: dict, stream: bool = False) -> AsyncIterator[httpx.Response]:
+        """
+        /api/generate isteğini en az bekleyen isteği olan backend'e gönderir.
+        Bağlantı kurulamazsa sıradaki backend denenir; cevap okunurken çıkan
+        HTTP hataları backend'in hatası sayılır (pasif sağlık takibi).
+        """
+        client = self._get_client()
+        tried = set()
+        while True:
+            backend = self.pool.acquire(frozenset(tried))
+            try:
+                request = client.build_request("POST", f"{backend.url}/api/generate", json=payload)
+                response = await client.send(request, stream=stream)
+                break
+            except CONNECT_ERRORS:
+                self.pool.release(backend, ok=False)
+                tried.add(backend.url)
+                if len(tried) == len(self.pool.backends):
+                    raise
+                logger.warning("Ollama backend'ine bağlanılamadı, başka backend deneniyor: %s", backend.url)
+            except httpx.HTTPError:
+                self.pool.release(backend, ok=False)
+                raise
+            except BaseException:
+                self.pool.release(backend, ok=None)
+                raise
+
+        ok = None  # iptal / model hatası backend'in sağlığını etkilemez
+        try:
+            response.raise_for_status()
+            yield response
+            ok = True
+        except httpx.HTTPError:
+            ok = False
+            raise
+        finally:
+            await response.aclose()
+            self.pool.release(backend, ok)
+
     def chat(self, message: str) -> str:
         """
         Ollama LLM'e prompt gönderir ve yanıt döndürür.
         - Bu servis sadece LLM iletişiminden sorumludur.
         - Hata durumlarında exception fırlatır
         """
-        url = f"{self.base_url}/api/generate"
-
-        payload = {
-            "model": self.model,
-            "prompt": message,
-            "stream": False
-        }
-
+        self._enter()
+        backend = self.pool.acquire()
+        ok = False
         try:
-            response = requests.post(
-                url,
-                json=payload,
+            start = time.perf_counter()
+            response = self._session.post(
+                f"{backend.url}/api/generate",
+                json=self._build_payload(message),
                 timeout=settings.OLLAMA_TIMEOUT
             )
             response.raise_for_status()
             result = response.json()
+            ok = True
+            self._record(result, (time.perf_counter() - start) * 1000)
             return result.get("response", "Cevap alınamadı")
 
         except requests.exceptions.RequestException as e:
             logger.error("Ollama LLM çağrısı başarısız", exc_info=True)
             raise RuntimeError("LLM servisi ile iletişim kurulamadı") from e
+        finally:
+            self.pool.release(backend, ok)
+            self._exit()
+
+    async def achat(self, message: str) -> str:
+        """
+        chat() ile aynı sözleşme, ama event loop'u bloklamaz.
+        Eşzamanlı sorular havuzdaki ayrı bağlantılar üzerinden paralel ilerler.
+        """
+        self._enter()
+        try:
+            start = time.perf_counter()
+            async with self._generate(self._build_payload(message)) as response:
+                result = response.json()
+            self._record(result, (time.perf_counter() - start) * 1000)
+            return result.get("response", "Cevap alınamadı")
+
+        except asyncio.CancelledError:
+            # İstemci ayrıldı: bağlantı kapanır, Ollama üretimi bırakır
+            self._record_cancel(produced=0)
+            raise
+        except httpx.HTTPError as e:
+            logger.error("Ollama LLM çağrısı başarısız", exc_info=True)
+            raise RuntimeError("LLM servisi ile iletişim kurulamadı") from e
+        finally:
+            self._exit()
+
+    async def astream(self, message: str) -> AsyncIterator[str]:
+        """
+        Ollama'dan stream=True ile yanıt alır, token parçalarını geldikçe döndürür.
+        Ollama her satırda bir JSON nesnesi (NDJSON) gönderir; "done" ile biter.
+        """
+        self._enter()
+        produced = 0
+        finished = False
+        try:
+            start = time.perf_counter()
+            async with self._generate(self._build_payload(message, stream=True), stream=True) as response:
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if data.get("error"):
+                        raise RuntimeError(f"LLM hatası: {data['error']}")
+                    token = data.get("response")
+                    if token:
+                        produced += 1  # Ollama her satırda bir token gönderir
+                        yield token
+                    if data.get("done"):
+                        # Son satır süre bilgilerini taşır
+                        finished = True
+                        self._record(data, (time.perf_counter() - start) * 1000)
+                        break
+
+        except (asyncio.CancelledError, GeneratorExit):
+            # Dinleyen kalmadı (istemci ayrıldı): stream kapanınca Ollama üretimi bırakır
+            if not finished:
+                self._record_cancel(produced)
+            raise
+        except httpx.HTTPError as e:
+            logger.error("Ollama LLM stream çağrısı başarısız", exc_info=True)
+            raise RuntimeError("LLM servisi ile iletişim kurulamadı") from e
+        finally:
+            self._exit()
+
+    async def warm_up(self) -> float:
+        """
+        Modeli her Ollama backend'inde belleğe yükler (boş prompt cevap üretmez) ve
+        keep_alive süresini yeniler. En uzun warm-up çağrısının süresini (ms) döndürür;
+        Ollama sadece yükleme yapan cevapta load_duration göndermediği için süre burada ölçülür.
+        En az bir backend yüklediyse başarılı sayılır.
+        """
+        results = await asyncio.gather(
+            *[self._warm_up_backend(backend) for backend in self.pool.backends], return_exceptions=True
+        )
+        loaded = [r for r in results if isinstance(r, float)]
+        with self._lock:
+            self._warmup_failures += len(results) - len(loaded)
+            if not loaded:
+                raise RuntimeError("LLM servisi ile iletişim kurulamadı") from results[0]
+            self._warmups += 1
+            self._last_warmup_ms = round(max(loaded), 1)
+        return max(loaded)
+
+    async def _warm_up_backend(self, backend) -> float:
+        # options gerçek isteklerle aynı olmalı: num_ctx farklıysa Ollama modeli yeniden yükler
+        payload = self._build_payload("")
+        start = time.perf_counter()
+        try:
+            response = await self._get_client().post(f"{backend.url}/api/generate", json=payload)
+            response.raise_for_status()
+        except httpx.HTTPError:
+            self.pool.report(backend, ok=False)
+            logger.warning("Ollama warm-up başarısız: %s", backend.url)
+            raise
+        self.pool.report(backend, ok=True)
+        return (time.perf_counter() - start) * 1000
+
+    async def aclose(self) -> None:
+        """Uygulama kapanırken havuzdaki bağlantıları kapatır"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._session.close()
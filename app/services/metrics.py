@@ -0,0 +1,117 @@
+"""
+Bağımlılıksız metrikler: aşama süreleri için histogram ve Prometheus text formatı.
+
+Hot path'teki her aşama (embed, search, context, llm, split, index...) stage()
+ile ölçülür. Süre hem process genelindeki histograma yazılır hem de o anki
+isteğin Server-Timing listesine eklenir (contextvar; to_thread ve task'lar
+context'i kopyaladığı için aynı isteğe yazılır).
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Saniye; embedding (ms) ile Ollama (saniyeler) arasını kapsar
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # label değerleri -> [bucket sayaçları..., toplam, adet]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[i] += 1  # i == len(buckets): sadece +Inf
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, *labels: str) -> int:
+        with self._lock:
+            series = self._series.get(labels)
+            return int(series[-1]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            base = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.label_names, labels))
+            sep = "," if base else ""
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {int(series[-1])}')
+            lines.append(f"{self.name}_sum{{{base}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{base}}} {int(series[-1])}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+STAGE_SECONDS = Histogram(
+    "docqa_stage_duration_seconds", "Hot path aşama süreleri", ("operation", "stage")
+)
+REQUEST_SECONDS = Histogram(
+    "docqa_http_request_duration_seconds", "HTTP istek süreleri", ("method", "route", "status")
+)
+
+# O anki isteğin aşama süreleri (ms); istek dışında (ör. ingest worker'ı) None
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+def observe(operation: str, stage_name: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, operation, stage_name)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage_name] = timings.get(stage_name, 0.0) + seconds * 1000
+
+
+@contextmanager
+def stage(operation: str, stage_name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(operation, stage_name, time.perf_counter() - start)
+
+
+def start_request():
+    """İstek başında çağrılır; (timings, token) döner. token ile end_request çağrılmalı"""
+    timings: Dict[str, float] = {}
+    return timings, _request_timings.set(timings)
+
+
+def end_request(token) -> None:
+    _request_timings.reset(token)
+
+
+def server_timing(timings: Dict[str, float], total_ms: float) -> str:
+    parts = [f"{name};dur={ms:.1f}" for name, ms in timings.items()]
+    parts.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(parts)
+
+
+def render(
+    gauges: Dict[str, Tuple[str, float]], counters: Optional[Dict[str, Tuple[str, float]]] = None
+) -> str:
+    """Prometheus text formatı. gauges / counters: isim -> (açıklama, değer)"""
+    lines = STAGE_SECONDS.render() + REQUEST_SECONDS.render()
+    for kind, series in (("gauge", gauges), ("counter", counters or {})):
+        for name, (help_text, value) in series.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
@@ -1,10 +1,21 @@
+import asyncio
+import time
 import uuid
+from contextlib import asynccontextmanager
 import numpy as np
-import faiss
-from typing import List, Dict
+from typing import AsyncIterator, Callable, Iterable, Iterator, List, Dict, Optional, Tuple
+from app.config import settings
+from app.services.admission import AdmissionController
+from app.services.answer_cache import AnswerCache
 from app.services.document_service import DocumentService
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.global_index import GlobalIndex
+from app.services import index_factory, metrics
 from app.services.llm_service import LLMService
+from app.services.single_flight import SingleFlight
 from app.services.buddy_store import BUDDY_DB, DocIndex
+from app.services.context_builder import build_context, estimate_tokens
+from app.utils.iterators import batched, prefetch
 
 class RAGService:
     def __init__(self, embedding_model, top_k=3):
@@ -12,6 +23,33 @@ class RAGService:
         self.embedding_model = embedding_model
         self.llm_service = LLMService()
 
+        # Sorgu embedding'leri istekler arası tek batch'te toplanır
+        self.embedding_batcher = EmbeddingBatcher(
+            embedding_model,
+            max_batch_size=settings.EMBED_BATCH_MAX_SIZE,
+            max_wait_ms=settings.EMBED_BATCH_MAX_WAIT_MS,
+        )
+
+        # Aynı/benzer soruların cevapları doc_id bazında saklanır
+        self.answer_cache = AnswerCache(
+            similarity_threshold=settings.ANSWER_CACHE_SIMILARITY,
+            max_entries_per_doc=settings.ANSWER_CACHE_MAX_PER_DOC,
+            max_docs=settings.ANSWER_CACHE_MAX_DOCS,
+        ) if settings.ANSWER_CACHE_ENABLED else None
+
+        # Aynı anda gelen aynı (doc_id, soru, k) istekleri tek üretimde birleşir
+        self.single_flight = SingleFlight()
+
+        # LLM aşamasına giriş: eşzamanlılık + kuyruk sınırı, deadline'a göre erken red
+        self.admission = AdmissionController(
+            max_concurrent=settings.ADMISSION_MAX_CONCURRENT,
+            max_queue=settings.ADMISSION_MAX_QUEUE,
+            initial_service_sec=settings.ADMISSION_INITIAL_SERVICE_SEC,
+        )
+
+        # Opsiyonel: tüm dokümanlarda tek aramayla soru sormak için
+        self.global_index = GlobalIndex() if settings.GLOBAL_INDEX_ENABLED else None
+
         # - fast: daha küçük chunk + daha düşük top_k -> daha hızlı, daha ucuz, ama bağlam kaçırabilir
         # - long: daha büyük chunk + daha yüksek top_k -> daha doğru/bağlamlı, ama daha yavaş ve prompt daha uzun
 
@@ -19,59 +57,248 @@ class RAGService:
         emb = self.embedding_model.encode(texts, show_progress_bar=False)
         return np.array(emb).astype("float32")
 
-    def build_index_for_text(self, text: str, mode: str) -> str:
+    @staticmethod
+    def _chunk_config(mode: str) -> Tuple[int, int]:
         # Mode config
         # fast/long seçimi retrieval kalitesi ve latency arasında kontrollü bir denge kurar.
         if mode == "fast":
-            chunk_size, overlap, top_k = 400, 50, 3
-        else:
-            chunk_size, overlap, top_k = 600, 80, 5
+            return 400, 50
+        return 600, 80
 
+    def build_index_for_text(self, text: str, mode: str, doc_id: str = None) -> str:
+        doc_id, _ = self.build_index_from_stream([text], mode=mode, doc_id=doc_id, expected_chars=len(text))
+        return doc_id
+
+    def build_index_from_stream(
+        self,
+        pieces: Iterable[str],
+        mode: str,
+        doc_id: str = None,
+        expected_chars: int = 0,
+        progress: Optional[Callable[[int, int], None]] = None,
+        page_starts: Optional[np.ndarray] = None,
+    ) -> Tuple[str, int]:
+        """
+        Parça parça gelen metni (ör. diskteki büyük bir upload) indeksler.
+        Split, embedding ve index'e ekleme veri geldikçe batch'ler halinde yapılır;
+        progress(chunks, chars) her batch'ten sonra çağrılır.
+        page_starts: PDF sayfalarının metindeki başlangıç offset'leri (kaynaklarda sayfa için)
+        Döner: (doc_id, chunk sayısı); doküman store'dan geri okunmaz (bellekten atılmış olabilir).
+        """
+        chunk_size, overlap = self._chunk_config(mode)
         doc_service = DocumentService(chunk_size=chunk_size, chunk_overlap=overlap)
-        chunks = doc_service.split_text(text)
+        builder = index_factory.IndexBuilder(expected_vectors=expected_chars // (chunk_size - overlap) + 1)
 
-        meta = [{"source": "user_upload", "text": c} for c in chunks]
-        embeddings = self.create_embeddings(chunks)
-        dim = embeddings.shape[1]
+        received: List[str] = []  # DocIndex metni
+        elapsed = {"split": 0.0, "embed": 0.0, "index": 0.0}  # aşama süreleri (sn)
 
-        index = faiss.IndexFlatL2(dim)
-        index.add(embeddings)
+        def keep(stream: Iterable[str]) -> Iterator[str]:
+            for piece in stream:
+                received.append(piece)
+                yield piece
 
-        doc_id = str(uuid.uuid4())
-        BUDDY_DB[doc_id] = DocIndex(
-            mode=mode, text=text, chunks=chunks, meta=meta, index=index
-        )
-        return doc_id
+        def timed_batches() -> Iterator[List[Tuple[int, int, str]]]:
+            # Okuma + split süresi (prefetch thread'inde)
+            batches = batched(doc_service.iter_chunks_stream(keep(pieces)), settings.INGEST_EMBED_BATCH_SIZE)
+            while True:
+                t = time.perf_counter()
+                batch = next(batches, None)
+                elapsed["split"] += time.perf_counter() - t
+                if batch is None:
+                    return
+                yield batch
+
+        # Okuma + split arka planda sürerken hazır batch'ler embed edilip index'e eklenir.
+        # Chunk string'leri sadece embedding için geçicidir; DocIndex metni ve offset'leri saklar
+        spans: List[Tuple[int, int]] = []
+        for batch in prefetch(timed_batches()):
+            spans.extend((start, end) for start, end, _ in batch)
+            t = time.perf_counter()
+            vectors = self.create_embeddings([chunk for _, _, chunk in batch])
+            t_embed = time.perf_counter()
+            builder.add(vectors)
+            elapsed["embed"] += t_embed - t
+            elapsed["index"] += time.perf_counter() - t_embed
+            if progress is not None:
+                progress(len(spans), spans[-1][1])
+        if not spans:
+            raise ValueError("Dokümanda indekslenecek metin yok")
+
+        t = time.perf_counter()
+        # Index tipi VECTOR_DB_TYPE ve chunk sayısına göre seçilir
+        index = builder.finish()
+        text = "".join(received)
+        received.clear()
+
+        # doc_id ingest kuyruğunda önceden verilmiş olabilir
+        doc_id = doc_id or str(uuid.uuid4())
+        BUDDY_DB[doc_id] = DocIndex(mode=mode, text=text, index=index, offsets=spans, page_starts=page_starts)
+        if self.global_index is not None:
+            self.global_index.add_document(doc_id, index_factory.reconstruct_all(index))
+        # Doküman değişti: eski cevaplar artık geçerli değil
+        self._invalidate_answers(doc_id)
+        elapsed["index"] += time.perf_counter() - t
+
+        for stage_name, seconds in elapsed.items():
+            metrics.observe("ingest", stage_name, seconds)
+        return doc_id, len(spans)
+
+    def build_index_bulk(
+        self, documents: List[Tuple[str, Optional[np.ndarray]]], mode: str
+    ) -> Tuple[List[Tuple[str, int]], Dict[str, float]]:
+        """
+        Çok sayıda (küçük) dokümanı birlikte indeksler. documents: (metin, page_starts).
+
+        Tüm dokümanların chunk'ları uzunluğa göre sıralanıp büyük batch'ler halinde
+        tek seferde embed edilir (benzer uzunluklar aynı batch'te: daha az padding),
+        sonra vektörler dokümanlara geri dağıtılıp her biri için kendi index'i kurulur.
+        Döner: [(doc_id, chunk sayısı)] (documents sırasıyla) ve süre / throughput bilgisi.
+        """
+        t0 = time.perf_counter()
+        chunk_size, overlap = self._chunk_config(mode)
+        doc_service = DocumentService(chunk_size=chunk_size, chunk_overlap=overlap)
+
+        all_spans = [doc_service.split_spans(text) for text, _ in documents]
+        t_split = time.perf_counter()
+        for (text, _), spans in zip(documents, all_spans):
+            if not spans:
+                raise ValueError("Dokümanda indekslenecek metin yok")
 
-    def search_in_doc(self, doc_id: str, query: str, k: int) -> List[Dict]:
+        # (doküman no, chunk no) çiftleri, chunk uzunluğuna göre azalan sırada
+        refs = [(end - start, d, c) for d, spans in enumerate(all_spans) for c, (start, end) in enumerate(spans)]
+        refs.sort(reverse=True)
+
+        embeddings: List[Optional[np.ndarray]] = [None] * len(documents)
+        batches = 0
+        for batch in batched(refs, settings.INGEST_EMBED_BATCH_SIZE):
+            chunks = []
+            for _, d, c in batch:
+                start, end = all_spans[d][c]
+                chunks.append(documents[d][0][start:end])
+            vectors = self.create_embeddings(chunks)
+            batches += 1
+            for (_, d, c), vec in zip(batch, vectors):
+                if embeddings[d] is None:
+                    embeddings[d] = np.empty((len(all_spans[d]), vectors.shape[1]), dtype="float32")
+                embeddings[d][c] = vec
+        t_embed = time.perf_counter()
+
+        results = []
+        for (text, page_starts), spans, emb in zip(documents, all_spans, embeddings):
+            index = index_factory.build_index(emb, copy=False)
+            doc_id = str(uuid.uuid4())
+            BUDDY_DB[doc_id] = DocIndex(mode=mode, text=text, index=index, offsets=spans, page_starts=page_starts)
+            if self.global_index is not None:
+                self.global_index.add_document(doc_id, emb)
+            results.append((doc_id, len(spans)))
+        t_end = time.perf_counter()
+        metrics.observe("bulk_ingest", "split", t_split - t0)
+        metrics.observe("bulk_ingest", "embed", t_embed - t_split)
+        metrics.observe("bulk_ingest", "index", t_end - t_embed)
+
+        total_sec = t_end - t0
+        return results, {
+            "documents": len(documents),
+            "chunks": len(refs),
+            "embed_batches": batches,
+            "embed_ms": round((t_embed - t0) * 1000, 1),
+            "index_ms": round((t_end - t_embed) * 1000, 1),
+            "total_ms": round(total_sec * 1000, 1),
+            "chunks_per_sec": round(len(refs) / total_sec, 1) if total_sec > 0 else 0.0,
+        }
+
+    def delete_document(self, doc_id: str) -> None:
+        del BUDDY_DB[doc_id]
+        if self.global_index is not None:
+            self.global_index.remove_document(doc_id)
+        self._invalidate_answers(doc_id)
+
+    def _invalidate_answers(self, doc_id: str) -> None:
+        if self.answer_cache is not None:
+            self.answer_cache.invalidate(doc_id)
+
+    def search_with_embedding(self, doc_id: str, query_emb: np.ndarray, k: int) -> List[Dict]:
         doc = BUDDY_DB[doc_id]
-        query_emb = self.create_embeddings([query])
-        distances, indices = doc.index.search(query_emb, k)
+        distances, indices = index_factory.search(doc.index, query_emb, k)
+        return self._hits_to_results(doc, distances[0], indices[0])
 
+    def _hits_to_results(self, doc: DocIndex, distances: np.ndarray, indices: np.ndarray) -> List[Dict]:
         results = []
-        for i, idx in enumerate(indices[0]):
+        for i, idx in enumerate(indices):
+            if idx < 0:  # k, chunk sayısından büyükse FAISS -1 döndürür
+                continue
             results.append({
-                "chunk": doc.chunks[idx],
-                "source": doc.meta[idx]["source"],
-                "distance": float(distances[0][i]),
+                "chunk": doc.chunk(idx),
+                "source": doc.source,
+                "page": doc.page(idx),
+                "distance": float(distances[i]),
                 "rank": i + 1,
+                # bağlam birleştirme için (kaynaklarda gösterilmez)
+                "doc": doc,
+                "start": int(doc.starts[idx]),
+                "end": int(doc.ends[idx]),
             })
         return results
 
-    def ask_in_doc(self, doc_id: str, question: str, top_k: int = None) -> Dict:
-        doc = BUDDY_DB[doc_id]
+    async def _search(self, doc_id: str, query_emb: np.ndarray, k: int) -> List[Dict]:
+        # FAISS araması GIL'i bırakır; büyük index'lerde event loop'u bekletmesin
+        return await asyncio.to_thread(self.search_with_embedding, doc_id, query_emb, k)
+
+    def _cached_answer(self, doc_id: str, question: str, k: int, query_emb: np.ndarray):
+        if self.answer_cache is None:
+            return None
+        cached = self.answer_cache.get(doc_id, question, k, query_emb[0])
+        if cached is not None:
+            cached["question"] = question
+            cached["cached"] = True
+        return cached
 
+    def _store_answer(self, doc_id: str, question: str, k: int, query_emb: np.ndarray, response: Dict) -> None:
+        if self.answer_cache is not None:
+            self.answer_cache.put(doc_id, question, k, query_emb[0], response)
+
+    def _default_k(self, doc: DocIndex, top_k: int = None) -> int:
         # top_k override yoksa mode'a göre default seçiyoruz.
         #  "fast" modunda prompt şişmez, "long" modunda daha geniş bağlam taranır
-        k = top_k or (3 if doc.mode == "fast" else 5)
+        return top_k or (3 if doc.mode == "fast" else 5)
 
-        search_results = self.search_in_doc(doc_id, question, k)
+    @asynccontextmanager
+    async def _llm_slot(self, operation: str, priority: str, deadline: Optional[float]):
+        """LLM çağrısını admission control'den geçirir (AdmissionRejected fırlatabilir)"""
+        with metrics.stage(operation, "queue"):
+            await self.admission.acquire(priority, deadline or settings.ADMISSION_DEADLINE_SEC)
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            # Hızlı hatalar ve istemci iptalleri LLM süresi tahminini düşürmemeli
+            self.admission.release(None)
+            raise
+        self.admission.release(time.perf_counter() - start)
 
-        context = "\n\n".join(
-            [f"[Doc {i+1}]\n{r['chunk']}" for i, r in enumerate(search_results)]
+    def _prepare_prompt(self, question: str, search_results: List[Dict]) -> Tuple[str, List[Dict], Dict[str, int]]:
+        """
+        Eşik altı hit'leri atar, örtüşen chunk'ları birleştirir ve bağlamı
+        CONTEXT_MAX_TOKENS'a sığdırır. Döner: (prompt, bağlama giren hit'ler, context bilgisi)
+        """
+        blocks, used, info = build_context(
+            search_results,
+            max_tokens=settings.CONTEXT_MAX_TOKENS,
+            min_relevance=settings.MIN_RELEVANCE_SCORE,
         )
+        prompt = self._build_prompt(question, blocks)
+        info["prompt_chars"] = len(prompt)
+        info["prompt_tokens"] = estimate_tokens(prompt)
+        return prompt, used, info
+
+    def _build_prompt(self, question: str, search_results: List[Dict]) -> str:
+        blocks = []
+        for i, r in enumerate(search_results):
+            page = f", page {r['page']}" if r.get("page") else ""
+            blocks.append(f"[Doc {i+1}{page}]\n{r['chunk']}")
+        context = "\n\n".join(blocks)
 
-        prompt = f"""You are a helpful assistant.
+        return f"""You are a helpful assistant.
 Answer using ONLY the context.
 
 Context:
@@ -82,18 +309,290 @@ Question: {question}
 If the answer is not in the context, say: "I don't have enough information."
 """
 
-        answer = self.llm_service.chat(prompt)
+    def _format_sources(self, search_results: List[Dict]) -> List[Dict]:
+        return [{
+            "file": "user_upload",
+            "chunk": r["chunk"],
+            "relevance": 1.0 / (1.0 + r["distance"]),  #  normalize
+            "page": r.get("page"),
+        } for r in search_results]
 
+    def _confidence(self, search_results: List[Dict]) -> str:
         # basit confidence heuristiği
-        confidence = "high" if len(search_results) >= 3 else "medium"
+        return "high" if len(search_results) >= 3 else "medium"
+
+    async def ask_in_doc(
+        self, doc_id: str, question: str, top_k: int = None, deadline: Optional[float] = None
+    ) -> Dict:
+        """deadline: istemcinin bekleyeceği süre (sn); LLM kuyruğunda bu aşılacaksa istek reddedilir"""
+        doc = BUDDY_DB[doc_id]
+        k = self._default_k(doc, top_k)
+        return await self.single_flight.do(
+            ("ask", doc_id, question, k),
+            lambda: self._ask_in_doc(doc_id, question, k, doc.mode, deadline),
+        )
+
+    async def _ask_in_doc(
+        self, doc_id: str, question: str, k: int, priority: str = "fast", deadline: Optional[float] = None
+    ) -> Dict:
+        with metrics.stage("ask", "embed"):
+            query_emb = await self.embedding_batcher.aencode([question])
+        cached = self._cached_answer(doc_id, question, k, query_emb)
+        if cached is not None:
+            return cached
+
+        with metrics.stage("ask", "search"):
+            search_results = await self._search(doc_id, query_emb, k)
+        with metrics.stage("ask", "context"):
+            prompt, search_results, context = self._prepare_prompt(question, search_results)
+
+        async with self._llm_slot("ask", priority, deadline):
+            with metrics.stage("ask", "llm"):
+                answer = await self.llm_service.achat(prompt)
+
+        response = {
+            "question": question,
+            "answer": answer,
+            "sources": self._format_sources(search_results),
+            "confidence": self._confidence(search_results),
+            "cached": False,
+            "context": context,
+        }
+        self._store_answer(doc_id, question, k, query_emb, response)
+        return response
+
+    async def ask_batch_in_doc(
+        self, doc_id: str, questions: List[str], top_k: int = None, deadline: Optional[float] = None
+    ) -> Dict:
+        """
+        Aynı dokümana birden çok soru:
+        - tüm sorular tek encode çağrısında embed edilir
+        - tek bir matris FAISS araması yapılır
+        - LLM çağrıları ASK_BATCH_CONCURRENCY ile sınırlı paralellikte gider
+        Cevaplar soruların sırasıyla, soru başına süre bilgisiyle döner.
+        """
+        t0 = time.perf_counter()
+        doc = BUDDY_DB[doc_id]
+        k = self._default_k(doc, top_k)
+
+        query_embs = await self.embedding_batcher.aencode(questions)
+        t_embed = time.perf_counter()
+        distances, indices = await asyncio.to_thread(index_factory.search, doc.index, query_embs, k)
+        t_search = time.perf_counter()
+        metrics.observe("ask_batch", "embed", t_embed - t0)
+        metrics.observe("ask_batch", "search", t_search - t_embed)
+
+        semaphore = asyncio.Semaphore(settings.ASK_BATCH_CONCURRENCY)
+
+        async def answer_one(i: int) -> Dict:
+            q_start = time.perf_counter()
+            question = questions[i]
+            query_emb = query_embs[i:i + 1]
+
+            cached = self._cached_answer(doc_id, question, k, query_emb)
+            if cached is not None:
+                cached["timings"] = {"queue_ms": 0.0, "llm_ms": 0.0, "total_ms": 0.0}
+                return cached
+
+            search_results = self._hits_to_results(doc, distances[i], indices[i])
+            with metrics.stage("ask_batch", "context"):
+                prompt, search_results, context = self._prepare_prompt(question, search_results)
+
+            async with semaphore, self._llm_slot("ask_batch", doc.mode, deadline):
+                t_llm = time.perf_counter()
+                answer = await self.llm_service.achat(prompt)
+            t_end = time.perf_counter()
+            metrics.observe("ask_batch", "llm", t_end - t_llm)
+
+            response = {
+                "question": question,
+                "answer": answer,
+                "sources": self._format_sources(search_results),
+                "confidence": self._confidence(search_results),
+                "cached": False,
+                "context": context,
+            }
+            self._store_answer(doc_id, question, k, query_emb, response)
+            return {**response, "timings": {
+                "queue_ms": round((t_llm - q_start) * 1000, 1),
+                "llm_ms": round((t_end - t_llm) * 1000, 1),
+                "total_ms": round((t_end - q_start) * 1000, 1),
+            }}
+
+        tasks = [asyncio.ensure_future(answer_one(i)) for i in range(len(questions))]
+        try:
+            answers = await asyncio.gather(*tasks)
+        except BaseException:
+            # Bir soru başarısız oldu (ör. AdmissionRejected) veya istek iptal edildi:
+            # cevabı kimse almayacak, kalan üretimler LLM slotlarını tutmasın
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        return {
+            "doc_id": doc_id,
+            "answers": answers,
+            "timings": {
+                "embed_ms": round((t_embed - t0) * 1000, 1),
+                "search_ms": round((t_search - t_embed) * 1000, 1),
+                "total_ms": round((time.perf_counter() - t0) * 1000, 1),
+            },
+        }
+
+    def search_global(self, query_emb: np.ndarray, k: int, doc_ids: Optional[List[str]] = None) -> List[Dict]:
+        # Diğer worker'ların eklediği / sildiği dokümanlar
+        for doc_id in self.global_index.sync(BUDDY_DB):
+            self._invalidate_answers(doc_id)
+        results = []
+        for doc_id, chunk_no, distance in self.global_index.search(query_emb, k, doc_ids)[0]:
+            if doc_id not in BUDDY_DB:
+                # Doküman (yedeksiz store'dan) atılmış; vektörleri de temizle
+                self.global_index.remove_document(doc_id)
+                continue
+            doc = BUDDY_DB[doc_id]
+            results.append({
+                "doc_id": doc_id,
+                "chunk": doc.chunk(chunk_no),
+                "source": doc.source,
+                "page": doc.page(chunk_no),
+                "distance": distance,
+                "rank": len(results) + 1,
+                "doc": doc,
+                "start": int(doc.starts[chunk_no]),
+                "end": int(doc.ends[chunk_no]),
+            })
+        return results
+
+    async def ask_global(
+        self,
+        question: str,
+        top_k: int = None,
+        doc_ids: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
+    ) -> Dict:
+        """
+        doc_id vermeden soru: global index'te tüm korpusta (veya doc_ids ile
+        seçilen dokümanlarda) tek aramayla en yakın chunk'lar bulunur.
+        """
+        k = top_k or self.top_k
+        key = ("global", question, k, tuple(sorted(doc_ids)) if doc_ids else None)
+        return await self.single_flight.do(key, lambda: self._ask_global(question, k, doc_ids, deadline))
+
+    async def _ask_global(
+        self, question: str, k: int, doc_ids: Optional[List[str]], deadline: Optional[float] = None
+    ) -> Dict:
+        with metrics.stage("ask_global", "embed"):
+            query_emb = await self.embedding_batcher.aencode([question])
+        with metrics.stage("ask_global", "search"):
+            search_results = await asyncio.to_thread(self.search_global, query_emb, k, doc_ids)
+        with metrics.stage("ask_global", "context"):
+            prompt, search_results, context = self._prepare_prompt(question, search_results)
+
+        # Tüm korpusta arama: geniş bağlam, long önceliğinde
+        async with self._llm_slot("ask_global", "long", deadline):
+            with metrics.stage("ask_global", "llm"):
+                answer = await self.llm_service.achat(prompt)
+
+        sources = self._format_sources(search_results)
+        for source, r in zip(sources, search_results):
+            source["file"] = r["doc_id"]
 
         return {
             "question": question,
             "answer": answer,
-            "sources": [{
-                "file": "user_upload",
-                "chunk": r["chunk"],
-                "relevance": 1.0 / (1.0 + r["distance"])  #  normalize
-            } for r in search_results],
-            "confidence": confidence
+            "sources": sources,
+            "confidence": self._confidence(search_results),
+            "cached": False,
+            "context": context,
         }
+
+    async def ask_in_doc_stream(
+        self, doc_id: str, question: str, top_k: int = None, deadline: Optional[float] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        ask_in_doc'un streaming versiyonu. Sırasıyla şu olayları üretir:
+        - {"type": "sources", ...}: retrieval biter bitmez, LLM'den önce
+        - {"type": "token", "text": ...}: Ollama ürettikçe
+        - {"type": "done", ...}: confidence, context ve süre bilgileri (ms)
+        Cache'ten gelen cevap tek bir token olayı olarak gönderilir; done olayı aynı alanları taşır.
+        Aynı soruyu eşzamanlı soran herkes aynı token akışını alır.
+        """
+        doc = BUDDY_DB[doc_id]
+        k = self._default_k(doc, top_k)
+        async for event in self.single_flight.stream(
+            ("stream", doc_id, question, k),
+            lambda: self._ask_in_doc_stream(doc_id, question, k, doc.mode, deadline),
+        ):
+            yield event
+
+    async def _ask_in_doc_stream(
+        self, doc_id: str, question: str, k: int, priority: str = "fast", deadline: Optional[float] = None
+    ) -> AsyncIterator[Dict]:
+        t0 = time.perf_counter()
+        with metrics.stage("ask_stream", "embed"):
+            query_emb = await self.embedding_batcher.aencode([question])
+        cached = self._cached_answer(doc_id, question, k, query_emb)
+        if cached is not None:
+            yield {"type": "sources", "question": question, "sources": cached["sources"]}
+            yield {"type": "token", "text": cached["answer"]}
+            elapsed_ms = round((time.perf_counter() - t0) * 1000, 1)
+            yield {
+                "type": "done",
+                "confidence": cached["confidence"],
+                "cached": True,
+                "context": cached["context"],
+                "timings": {"retrieval_ms": elapsed_ms, "first_token_ms": elapsed_ms, "total_ms": elapsed_ms},
+            }
+            return
+
+        with metrics.stage("ask_stream", "search"):
+            search_results = await self._search(doc_id, query_emb, k)
+        with metrics.stage("ask_stream", "context"):
+            prompt, search_results, context = self._prepare_prompt(question, search_results)
+        sources = self._format_sources(search_results)
+        t_retrieval = time.perf_counter()
+
+        yield {
+            "type": "sources",
+            "question": question,
+            "sources": sources,
+        }
+
+        t_first_token = None
+        tokens = []
+        async with self._llm_slot("ask_stream", priority, deadline):
+            async for token in self.llm_service.astream(prompt):
+                if t_first_token is None:
+                    t_first_token = time.perf_counter()
+                tokens.append(token)
+                yield {"type": "token", "text": token}
+
+        confidence = self._confidence(search_results)
+        self._store_answer(doc_id, question, k, query_emb, {
+            "question": question,
+            "answer": "".join(tokens),
+            "sources": sources,
+            "confidence": confidence,
+            "cached": False,
+            "context": context,
+        })
+
+        t_end = time.perf_counter()
+        metrics.observe("ask_stream", "llm_first_token", (t_first_token or t_end) - t_retrieval)
+        metrics.observe("ask_stream", "llm", t_end - t_retrieval)
+        yield {
+            "type": "done",
+            "confidence": confidence,
+            "cached": False,
+            "context": context,
+            "timings": {
+                "retrieval_ms": round((t_retrieval - t0) * 1000, 1),
+                "first_token_ms": round(((t_first_token or t_end) - t0) * 1000, 1),
+                "total_ms": round((t_end - t0) * 1000, 1),
+            },
+        }
+
+    async def aclose(self) -> None:
+        self.embedding_batcher.close()
+        await self.llm_service.aclose()
@@ -0,0 +1,120 @@
+"""
+Single-flight: aynı anahtarla eşzamanlı gelen istekleri tek çalıştırmada birleştirir.
+
+Popüler bir doküman paylaşıldığında aynı soru aynı saniyede onlarca kez
+gelebilir. İlk istek (leader) retrieval + LLM işini başlatır; o iş bitene
+kadar gelen aynı anahtarlı istekler (follower) yeni bir üretim başlatmak
+yerine aynı sonucu bekler. Streaming yolda her bekleyen aynı olay akışını
+baştan itibaren alır.
+
+Paylaşılan iş, onu bekleyen son istemci de ayrılınca iptal edilir.
+"""
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
+
+
+@dataclass
+class _Call:
+    task: asyncio.Task
+    waiters: int = 0
+
+
+@dataclass
+class _Broadcast:
+    events: List[Any] = field(default_factory=list)
+    done: bool = False
+    error: Optional[BaseException] = None
+    changed: asyncio.Event = field(default_factory=asyncio.Event)
+    task: Optional[asyncio.Task] = None
+    subscribers: int = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Aynı key için çalışan bir iş varsa onun sonucunu bekler, yoksa fn()'i başlatır"""
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(task=asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(self._calls, key, call))
+            self.leaders += 1
+        else:
+            self.followers += 1
+
+        call.waiters += 1
+        try:
+            # shield: bir bekleyenin iptali diğerlerinin sonucunu iptal etmesin
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    async def stream(self, key: Hashable, factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """Aynı key için üretilen olay akışını tüm bekleyenlere (baştan itibaren) dağıtır"""
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            broadcast.task = asyncio.ensure_future(self._pump(key, broadcast, factory()))
+            self.leaders += 1
+        else:
+            self.followers += 1
+
+        broadcast.subscribers += 1
+        position = 0
+        try:
+            while True:
+                if position < len(broadcast.events):
+                    event = broadcast.events[position]
+                    position += 1
+                    yield event
+                    continue
+                if broadcast.done:
+                    if broadcast.error is not None:
+                        raise broadcast.error
+                    return
+                broadcast.changed.clear()
+                await broadcast.changed.wait()
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.done:
+                # Dinleyen kalmadı: üretimi (ör. Ollama isteğini) durdur
+                broadcast.task.cancel()
+
+    async def _pump(self, key: Hashable, broadcast: _Broadcast, source: AsyncIterator[Any]) -> None:
+        try:
+            async for event in source:
+                broadcast.events.append(event)
+                broadcast.changed.set()
+        except asyncio.CancelledError:
+            broadcast.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            broadcast.error = e
+        finally:
+            broadcast.done = True
+            broadcast.changed.set()
+            self._forget(self._streams, key, broadcast)
+            await source.aclose()
+
+    @staticmethod
+    def _forget(registry: Dict, key: Hashable, value: Any) -> None:
+        if registry.get(key) is value:
+            del registry[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "in_flight": len(self._calls) + len(self._streams),
+        }
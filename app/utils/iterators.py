@@ -0,0 +1,69 @@
+"""
+Ingest pipeline'ı için iterator yardımcıları.
+
+batched: span'leri embedding boyutunda gruplar.
+prefetch: üretici tarafı (dosya okuma, decode, split) arka plan thread'inde
+çalıştırır; tüketici bir batch'i embed ederken sonraki batch hazırlanır.
+"""
+import queue
+import threading
+from itertools import islice
+from typing import Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+def batched(iterable: Iterable[T], size: int) -> Iterator[List[T]]:
+    """itertools.batched (3.12) muadili; son batch daha kısa olabilir"""
+    if size < 1:
+        raise ValueError("size en az 1 olmalı")
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def prefetch(iterable: Iterable[T], depth: int = 2) -> Iterator[T]:
+    """
+    iterable'ı ayrı bir thread'de en fazla depth eleman önden tüketir.
+    Üreticideki hata tüketiciye aynen fırlatılır; tüketici erken bırakırsa
+    (generator kapatılırsa) üretici de durur.
+    """
+    items: "queue.Queue" = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(entry) -> bool:
+        # Tüketici bıraktıysa dolu kuyrukta sonsuza kadar bekleme
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((_DONE, None))
+        except BaseException as e:
+            put((_DONE, e))
+
+    thread = threading.Thread(target=produce, name="prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
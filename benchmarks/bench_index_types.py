@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Index tipleri için recall / gecikme raporu.
+
+Sentetik (kümelenmiş) embedding'lerle her index tipini ve vektör
+quantization seçeneğini (float32 / fp16 / int8) flat baseline'a karşı ölçer: recall@k, sorgu başına p50/p95 gecikme ve index boyutu.
+
+Kullanım:
+    python -m benchmarks.bench_index_types --vectors 50000 --dim 384 --queries 500
+"""
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from app.services import index_factory
+
+
+def clustered_vectors(n: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.normal(size=(clusters, dim))
+    labels = rng.integers(0, clusters, n)
+    return (centers[labels] + 0.3 * rng.normal(size=(n, dim))).astype("float32")
+
+
+# (index tipi, quantization); ilk satır kesin sonuç veren baseline
+CONFIGS = [
+    ("flat", "none"),
+    ("flat", "fp16"),
+    ("flat", "int8"),
+    ("hnsw", "none"),
+    ("hnsw", "int8"),
+    ("ivfpq", "none"),
+]
+
+
+def measure(index: faiss.Index, queries: np.ndarray, k: int):
+    latencies = []
+    found = []
+    for q in queries:
+        start = time.perf_counter()
+        _, ids = index_factory.search(index, q[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append(ids[0])
+    return np.array(found), np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    clusters = max(8, args.vectors // 500)
+    vectors = clustered_vectors(args.vectors, args.dim, clusters, rng)
+    queries = clustered_vectors(args.queries, args.dim, clusters, rng)
+
+    print(f"{args.vectors} vektör, dim={args.dim}, {args.queries} sorgu, k={args.k}\n")
+    print(f"{'tip':<8}{'quant':<7}{'build_s':>10}{'recall@k':>10}{'p50_ms':>10}{'p95_ms':>10}{'MB':>10}")
+
+    exact = None
+    for kind, quantization in CONFIGS:
+        start = time.perf_counter()
+        index = index_factory.build_index(vectors, kind, quantization=quantization)
+        build_s = time.perf_counter() - start
+
+        found, latencies = measure(index, queries, args.k)
+        if exact is None:
+            exact = found
+        recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(exact, found)])
+
+        print(
+            f"{index_factory.index_type_of(index):<8}{index_factory.quantization_of(index):<7}{build_s:>10.2f}{recall:>10.3f}"
+            f"{np.percentile(latencies, 50):>10.3f}{np.percentile(latencies, 95):>10.3f}"
+            f"{index_factory.index_bytes(index) / (1024 * 1024):>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
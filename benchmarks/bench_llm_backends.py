@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Ollama backend havuzu benchmark'ı (sahte Ollama instance'ları ile).
+
+Her sahte Ollama aynı anda --parallel üretim yapar (OLLAMA_NUM_PARALLEL gibi),
+fazlası instance içinde sıra bekler. Aynı yük şu senaryolarda koşulur:
+- tek backend
+- N eş backend
+- N backend, biri --slow kat yavaş (least-outstanding ona daha az iş verir)
+- N backend, biri kapalı (bağlantı hatası: retry + ejection)
+
+Throughput, p50 / p95 gecikme ve backend başına istek sayısı raporlanır.
+
+Kullanım:
+    python -m benchmarks.bench_llm_backends --backends 3 --requests 120 --concurrency 12
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+from app.services.llm_service import LLMService
+
+
+class FakeOllama:
+    def __init__(self, service_sec: float, parallel: int, slow: dict, down: set):
+        self.service_sec = service_sec
+        self.parallel = parallel
+        self.slow = slow
+        self.down = down
+        self._slots = {}
+
+    async def __call__(self, request):
+        host = request.url.host
+        if host in self.down:
+            raise httpx.ConnectError("connection refused", request=request)
+        slots = self._slots.setdefault(host, asyncio.Semaphore(self.parallel))
+        async with slots:
+            await asyncio.sleep(self.service_sec * self.slow.get(host, 1.0))
+        return httpx.Response(200, json={"response": host, "eval_count": 1})
+
+
+async def run_case(urls, args, slow=None, down=()):
+    fake = FakeOllama(args.service_ms / 1000, args.parallel, slow or {}, set(down))
+    llm = LLMService(base_urls=urls)
+    llm._client = httpx.AsyncClient(transport=httpx.MockTransport(fake))
+    gate = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def one():
+        async with gate:
+            start = time.perf_counter()
+            await llm.achat("Hello")
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(args.requests)])
+    elapsed = time.perf_counter() - start
+    backends = llm.stats()["backends"]
+    await llm.aclose()
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    spread = "/".join(str(b["requests"]) for b in backends)
+    return args.requests / elapsed, statistics.median(latencies) * 1000, p95 * 1000, spread
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=120)
+    parser.add_argument("--concurrency", type=int, default=12)
+    parser.add_argument("--parallel", type=int, default=2, help="instance başına eşzamanlı üretim")
+    parser.add_argument("--service-ms", type=float, default=50.0)
+    parser.add_argument("--slow", type=float, default=4.0, help="yavaş backend'in kat sayısı")
+    args = parser.parse_args()
+
+    urls = [f"http://ollama-{i}:11434" for i in range(args.backends)]
+    cases = {
+        "tek": dict(urls=urls[:1]),
+        "eş": dict(urls=urls),
+        "biri_yavaş": dict(urls=urls, slow={"ollama-0": args.slow}),
+        "biri_kapalı": dict(urls=urls, down={"ollama-0"}),
+    }
+    print(f"{args.requests} istek, eşzamanlılık {args.concurrency}, üretim {args.service_ms:.0f} ms\n")
+    print(f"{'senaryo':<14}{'istek/s':>10}{'p50_ms':>10}{'p95_ms':>10}  backend başına")
+    for name, case in cases.items():
+        rps, p50, p95, spread = asyncio.run(run_case(args=args, **case))
+        print(f"{name:<14}{rps:>10.1f}{p50:>10.1f}{p95:>10.1f}  {spread}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Text splitter benchmark'ı (çok MB'lık girdiler).
+
+Karşılaştırılanlar:
+- list:   split_text (tüm chunk string'leri önce listeye)
+- spans:  iter_spans (sadece offset'ler, lazy)
+- stream: iter_spans_stream (metin 64 KB'lık parçalar halinde)
+- pipeline: ilk embedding batch'inin hazır olma süresi, list vs stream
+
+Süre ve tracemalloc ile ölçülen tepe bellek raporlanır.
+
+Kullanım:
+    python -m benchmarks.bench_splitter --mb 8
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from app.services.document_service import SimpleTextSplitter
+from app.utils.iterators import batched
+
+WORDS = "belge soru cevap indeks vektör arama model metin parça teslim tarihi proje".split()
+
+
+def make_text(mb: float, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    target = int(mb * 1024 * 1024)
+    parts, size = [], 0
+    while size < target:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 20))) + ".\n"
+        parts.append(sentence)
+        size += len(sentence)
+    return "".join(parts)
+
+
+def pieces(text: str, size: int = 64 * 1024):
+    for i in range(0, len(text), size):
+        yield text[i:i + size]
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=float, default=8.0)
+    parser.add_argument("--chunk-size", type=int, default=600)
+    parser.add_argument("--overlap", type=int, default=80)
+    parser.add_argument("--batch", type=int, default=256)
+    args = parser.parse_args()
+
+    text = make_text(args.mb)
+    splitter = SimpleTextSplitter(args.chunk_size, args.overlap)
+    print(f"{len(text) / 1e6:.1f}M karakter, chunk_size={args.chunk_size}, overlap={args.overlap}\n")
+    print(f"{'yöntem':<10}{'süre_s':>10}{'tepe_MB':>10}{'chunk':>10}")
+
+    cases = {
+        "list": lambda: len(splitter.split_text(text)),
+        "spans": lambda: sum(1 for _ in splitter.iter_spans(text)),
+        "stream": lambda: sum(1 for _ in splitter.iter_spans_stream(pieces(text))),
+    }
+    for name, fn in cases.items():
+        count, elapsed, peak = measure(fn)
+        print(f"{name:<10}{elapsed:>10.3f}{peak:>10.1f}{count:>10}")
+
+    # İlk batch gecikmesi: embedding bu noktada başlayabilir
+    start = time.perf_counter()
+    splitter.split_text(text)[:args.batch]
+    list_first = time.perf_counter() - start
+
+    start = time.perf_counter()
+    next(batched(splitter.iter_spans_stream(pieces(text)), args.batch))
+    stream_first = time.perf_counter() - start
+
+    print(f"\nilk {args.batch} chunk hazır: list {list_first * 1000:.1f} ms, stream {stream_first * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import json
+import time
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 
 import requests
 import streamlit as st
@@ -20,7 +22,10 @@ API_BASE = st.sidebar.text_input("API Base URL", value=API_BASE)  # debug overri
 
 UPLOAD_URL = f"{API_BASE}/upload"
 ASK_URL = f"{API_BASE}/ask"
+ASK_STREAM_URL = f"{API_BASE}/ask/stream"
+STATUS_URL = f"{API_BASE}/documents/{{doc_id}}/status"
 REQUEST_TIMEOUT_SEC = 180
+STATUS_POLL_SEC = 0.5
 
 
 APP_TITLE = "Document QA Service (Local RAG)"
@@ -62,6 +67,8 @@ def request_json(
             json=json_body,
             files=files,
             timeout=timeout,
+            # Sunucu, LLM kuyruğu bu süreyi aşacaksa beklemeden 503 döner
+            headers={"X-Request-Timeout": str(timeout)},
         )
         resp.raise_for_status()
         return resp.json()
@@ -78,11 +85,44 @@ def post_upload(file_bytes: bytes, filename: str, mode: str) -> Dict[str, Any]:
     return request_json("POST", UPLOAD_URL, params=params, files=files)
 
 
+def wait_until_indexed(doc_id: str) -> Dict[str, Any]:
+    """Upload arka planda indekslenir; ready/failed olana kadar durumu yoklar."""
+    deadline = time.monotonic() + REQUEST_TIMEOUT_SEC
+    while True:
+        status = request_json("GET", STATUS_URL.format(doc_id=doc_id))
+        if status.get("status") == "ready":
+            return status
+        if status.get("status") == "failed":
+            raise RuntimeError(f"Indexing failed: {status.get('error')}")
+        if time.monotonic() > deadline:
+            raise RuntimeError("Indexing timed out.")
+        time.sleep(STATUS_POLL_SEC)
+
+
 def post_ask(doc_id: str, question: str, top_k: int) -> Dict[str, Any]:
     payload = {"doc_id": doc_id, "question": question, "top_k": top_k}
     return request_json("POST", ASK_URL, json_body=payload)
 
 
+def stream_ask(doc_id: str, question: str, top_k: int) -> Iterator[Dict[str, Any]]:
+    """/ask/stream NDJSON olaylarını geldikçe döndürür."""
+    payload = {"doc_id": doc_id, "question": question, "top_k": top_k}
+    try:
+        with requests.post(
+            ASK_STREAM_URL,
+            json=payload,
+            stream=True,
+            timeout=REQUEST_TIMEOUT_SEC,
+            headers={"X-Request-Timeout": str(REQUEST_TIMEOUT_SEC)},
+        ) as resp:
+            resp.raise_for_status()
+            for line in resp.iter_lines(decode_unicode=True):
+                if line:
+                    yield json.loads(line)
+    except requests.RequestException as e:
+        raise RuntimeError(f"Request failed: {e}") from e
+
+
 def render_sources(sources: List[Dict[str, Any]]) -> None:
     st.subheader("📌 Sources (retrieved chunks)")
 
@@ -96,8 +136,9 @@ def render_sources(sources: List[Dict[str, Any]]) -> None:
         file_ = src.get("file", "unknown")
         relevance = float(src.get("relevance", 0.0))
         chunk = src.get("chunk", "")
+        page = f" | page={src['page']}" if src.get("page") else ""
 
-        with st.expander(f"Source #{i} | relevance={relevance:.3f} | file={file_}"):
+        with st.expander(f"Source #{i} | relevance={relevance:.3f} | file={file_}{page}"):
             st.code(chunk, language="markdown")
 
 
@@ -147,7 +188,7 @@ with left:
     )
     st.session_state.mode = mode
 
-    uploaded = st.file_uploader("Select a TXT file", type=["txt"])
+    uploaded = st.file_uploader("Select a TXT, Markdown or PDF file", type=["txt", "md", "pdf"])
 
     upload_clicked = st.button(
         "📤 Upload & Index",
@@ -157,11 +198,13 @@ with left:
 
     if upload_clicked and uploaded is not None:
         try:
-            resp = post_upload(
-                file_bytes=uploaded.getvalue(),
-                filename=uploaded.name,
-                mode=mode,
-            )
+            with st.spinner("Indexing..."):
+                resp = post_upload(
+                    file_bytes=uploaded.getvalue(),
+                    filename=uploaded.name,
+                    mode=mode,
+                )
+                resp = wait_until_indexed(resp["doc_id"])
             st.session_state.doc_id = resp.get("doc_id")
             st.session_state.upload_info = resp
             st.success("✅ Uploaded & indexed successfully!")
@@ -172,6 +215,7 @@ with left:
 
     st.header("2) Settings")
     top_k = st.slider("Top-K (how many chunks to retrieve?)", 1, 8, 3)
+    stream_answer = st.toggle("Stream answer tokens", value=True)
 
     if st.session_state.upload_info:
         st.subheader("📄 Upload Info")
@@ -204,12 +248,34 @@ with right:
 
         if ask_clicked:
             try:
-                with st.spinner("Thinking..."):
-                    resp = post_ask(
-                        doc_id=st.session_state.doc_id,
-                        question=question.strip(),
-                        top_k=top_k,
-                    )
+                if stream_answer:
+                    resp = {"question": question, "answer": "", "sources": []}
+                    placeholder = st.empty()
+                    with st.spinner("Thinking..."):
+                        for event in stream_ask(
+                            doc_id=st.session_state.doc_id,
+                            question=question.strip(),
+                            top_k=top_k,
+                        ):
+                            kind = event.get("type")
+                            if kind == "sources":
+                                resp["sources"] = event.get("sources", [])
+                            elif kind == "token":
+                                resp["answer"] += event.get("text", "")
+                                placeholder.success(resp["answer"])
+                            elif kind == "done":
+                                resp["confidence"] = event.get("confidence", "unknown")
+                                resp["cached"] = event.get("cached", False)
+                            elif kind == "error":
+                                raise RuntimeError(event.get("detail", "stream error"))
+                    placeholder.empty()
+                else:
+                    with st.spinner("Thinking..."):
+                        resp = post_ask(
+                            doc_id=st.session_state.doc_id,
+                            question=question.strip(),
+                            top_k=top_k,
+                        )
 
                 st.session_state.history.append(
                     {
@@ -217,6 +283,7 @@ with right:
                         "a": resp.get("answer", ""),
                         "sources": resp.get("sources", []),
                         "confidence": resp.get("confidence", "unknown"),
+                        "cached": resp.get("cached", False),
                     }
                 )
                 st.toast("✅ Answer received!")
@@ -231,7 +298,8 @@ with right:
                 st.markdown("### ✅ Answer")
                 st.success(item["a"] or "(empty answer)")
 
-                st.caption(f"Confidence: **{item.get('confidence', 'unknown')}**")
+                cache_note = " • served from cache" if item.get("cached") else ""
+                st.caption(f"Confidence: **{item.get('confidence', 'unknown')}**{cache_note}")
                 render_sources(item.get("sources", []))
                 st.divider()
         else:
@@ -21,6 +21,11 @@ def main():
 
     prefix = normalize_prefix(settings.API_PREFIX)
 
+    # Worker'lar dokümanları VECTOR_DB_PATH üzerinden paylaşır (bellek içi store process'e özel); DEBUG'da reload tek process
+    workers = 1 if settings.DEBUG else max(1, settings.API_WORKERS)
+    if workers > 1 and not settings.PERSIST_DOCUMENTS:
+        raise SystemExit("API_WORKERS > 1 için PERSIST_DOCUMENTS=True olmalı (dokümanlar worker'lar arasında diskten paylaşılır).")
+
     # Tarayıcıdan açılacak adres her zaman localhost
     base_url = f"http://localhost:{settings.API_PORT}"
 
@@ -34,6 +39,7 @@ def main():
 🌍 Local URL: {base_url}
 🤖 LLM Model: {settings.OLLAMA_MODEL}
 📚 Vektör DB: {settings.VECTOR_DB_TYPE.upper()}
+👷 Worker:    {workers}
 
 📖 API Dokümantasyonu:
    - Swagger UI: {base_url}{prefix}/docs
@@ -47,6 +53,7 @@ def main():
         host=settings.API_HOST,
         port=settings.API_PORT,
         reload=settings.DEBUG,
+        workers=workers,
         log_level="info" if settings.DEBUG else "warning",
     )
 
@@ -0,0 +1,102 @@
+"""
+Testler için ortak yardımcılar (gerçek embedding modeli / Ollama gerektirmez)
+"""
+import io
+import os
+import re
+import zlib
+
+import numpy as np
+import pytest
+
+# Testler diske doküman yazmasın (app modülleri import edilmeden önce)
+os.environ.setdefault("PERSIST_DOCUMENTS", "False")
+
+
+class FakeEmbeddingModel:
+    """SentenceTransformer yerine: kelime hash'lerinden deterministik vektör üretir"""
+
+    def __init__(self, dim: int = 32):
+        self.dim = dim
+        self.calls = []
+
+    def encode(self, texts, show_progress_bar=False, **kwargs):
+        self.calls.append(len(texts))
+        out = np.zeros((len(texts), self.dim), dtype="float32")
+        for row, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                out[row, zlib.crc32(word.encode()) % self.dim] += 1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-6)
+
+
+class FakeLLM:
+    """LLMService yerine: prompt'u görmeden sabit bir cevap döndürür"""
+
+    in_flight = 0
+    warmed = True
+
+    def __init__(self, answer: str = "The deadline is Friday."):
+        self.answer = answer
+        self.prompts = []
+
+    async def achat(self, message: str) -> str:
+        self.prompts.append(message)
+        return self.answer
+
+    async def astream(self, message: str):
+        self.prompts.append(message)
+        for token in self.answer.split(" "):
+            yield token + " "
+
+    async def warm_up(self) -> float:
+        return 0.0
+
+    def stats(self) -> dict:
+        return {"model": "fake"}
+
+    async def aclose(self) -> None:
+        pass
+
+
+SAMPLE_TEXT = (
+    "The project deadline is Friday. All reports must be submitted by noon. "
+    "Python is a programming language used for data analysis and web services. "
+    "FAISS is a library for efficient similarity search of dense vectors. "
+) * 20
+
+
+def make_pdf(pages) -> bytes:
+    """Her sayfası verilen metni (Helvetica, satır satır) içeren küçük bir PDF üretir"""
+    from pypdf import PdfWriter
+    from pypdf.generic import DictionaryObject, NameObject, StreamObject
+
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    }))
+    for text in pages:
+        page = writer.add_blank_page(612, 792)
+        content = StreamObject()
+        lines = " ".join(f"({line}) Tj T*" for line in text.split("\n") if line)
+        content.set_data(f"BT /F1 10 Tf 12 TL 36 756 Td {lines} ET".encode("latin-1"))
+        page[NameObject("/Contents")] = writer._add_object(content)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font}),
+        })
+
+    buf = io.BytesIO()
+    writer.write(buf)
+    return buf.getvalue()
+
+
+@pytest.fixture
+def rag_service():
+    from app.services.rag_service import RAGService
+
+    service = RAGService(embedding_model=FakeEmbeddingModel(), top_k=3)
+    service.llm_service = FakeLLM()
+    yield service
+    service.embedding_batcher.close()
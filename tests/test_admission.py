@@ -0,0 +1,85 @@
+"""
+LLM admission control testleri
+"""
+import asyncio
+
+import pytest
+
+from app.services.admission import AdmissionController, AdmissionRejected
+
+
+def test_fast_priority_served_before_long():
+    """Boşalan slot önce fast kuyruğuna verilmeli"""
+    async def run():
+        ctrl = AdmissionController(max_concurrent=1, max_queue=10, initial_service_sec=0.01)
+        order = []
+
+        async def worker(name, priority):
+            await ctrl.acquire(priority, deadline_sec=5)
+            order.append(name)
+            await asyncio.sleep(0.01)
+            ctrl.release(0.01)
+
+        await ctrl.acquire("long", deadline_sec=5)  # slot dolu
+        tasks = [asyncio.create_task(worker("long-1", "long")), asyncio.create_task(worker("long-2", "long"))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(worker("fast-1", "fast")))
+        await asyncio.sleep(0)
+        ctrl.release(0.01)
+        await asyncio.gather(*tasks)
+        return order, ctrl.stats()
+
+    order, stats = asyncio.run(run())
+    assert order == ["fast-1", "long-1", "long-2"]
+    assert stats["active"] == 0 and stats["admitted"] == 4
+
+
+def test_rejects_when_estimated_wait_exceeds_deadline():
+    """Tahmini bekleme deadline'ı aşıyorsa beklemeden reddedilmeli; kuyruk dolunca da"""
+    async def run():
+        ctrl = AdmissionController(max_concurrent=1, max_queue=1, initial_service_sec=30)
+        await ctrl.acquire("fast", deadline_sec=60)
+
+        with pytest.raises(AdmissionRejected) as exc:
+            await ctrl.acquire("fast", deadline_sec=10)
+        assert exc.value.retry_after == 30
+
+        waiter = asyncio.create_task(ctrl.acquire("fast", deadline_sec=60))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected):
+            await ctrl.acquire("long", deadline_sec=600)  # kuyruk dolu
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        return ctrl.stats()
+
+    stats = asyncio.run(run())
+    assert stats["rejected"] == 2 and stats["queued_fast"] == 0
+
+
+def test_waiter_times_out_and_leaves_queue():
+    """Deadline'ı dolan istek kuyruktan çıkmalı, slot sonraki isteğe geçmeli"""
+    async def run():
+        ctrl = AdmissionController(max_concurrent=1, max_queue=10, initial_service_sec=0.01)
+        await ctrl.acquire("fast", deadline_sec=1)
+        with pytest.raises(AdmissionRejected):
+            await ctrl.acquire("fast", deadline_sec=0.05)
+        ctrl.release(0.01)
+        await ctrl.acquire("long", deadline_sec=1)
+        return ctrl.stats()
+
+    stats = asyncio.run(run())
+    assert stats["timed_out"] == 1 and stats["active"] == 1 and stats["queued_fast"] == 0
+
+
+def test_release_without_sample_keeps_service_estimate():
+    """Hata/iptalle biten çağrı (service_sec=None) ortalamayı değiştirmeden slotu bırakmalı"""
+    async def run():
+        ctrl = AdmissionController(max_concurrent=1, max_queue=10, initial_service_sec=10)
+        await ctrl.acquire("fast", deadline_sec=60)
+        ctrl.release(None)
+        await ctrl.acquire("fast", deadline_sec=60)
+        ctrl.release(5.0)
+        return ctrl.stats()
+
+    stats = asyncio.run(run())
+    assert stats["avg_service_sec"] == 9.0 and stats["active"] == 0
@@ -0,0 +1,63 @@
+"""
+Semantik cevap cache'i için birim testleri
+"""
+import asyncio
+
+import numpy as np
+
+from app.services.answer_cache import AnswerCache, normalize_question
+from tests.conftest import SAMPLE_TEXT
+
+RESPONSE = {"question": "q", "answer": "Friday", "sources": [], "confidence": "high", "cached": False}
+
+
+def test_normalize_question():
+    assert normalize_question("What is the deadline?") == normalize_question("  what is THE deadline ")
+
+
+def test_exact_and_semantic_hits():
+    """Normalize eşleşme ve eşik üstü benzerlik hit, farklı k ve düşük benzerlik miss olmalı"""
+    cache = AnswerCache(similarity_threshold=0.9)
+    base = np.array([1.0, 0.0, 0.0], dtype="float32")
+    cache.put("doc", "What is the deadline?", 3, base, RESPONSE)
+
+    assert cache.get("doc", "what is the deadline", 3, np.array([0.0, 1.0, 0.0]))["answer"] == "Friday"
+    assert cache.get("doc", "what's the deadline", 3, np.array([0.98, 0.2, 0.0])) is not None
+    assert cache.get("doc", "what's the deadline", 5, base) is None
+    assert cache.get("doc", "who is the author", 3, np.array([0.0, 1.0, 0.0])) is None
+    assert cache.get("other-doc", "What is the deadline?", 3, base) is None
+
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["semantic_hits"], stats["misses"]) == (1, 1, 3)
+
+
+def test_lru_and_invalidate():
+    """Doküman başına LRU sınırı ve invalidate çalışmalı"""
+    cache = AnswerCache(max_entries_per_doc=2)
+    for i, q in enumerate(["first question", "second question", "third question"]):
+        vec = np.eye(3, dtype="float32")[i]
+        cache.put("doc", q, 3, vec, RESPONSE)
+
+    assert cache.get("doc", "first question", 3, np.eye(3)[0]) is None
+    assert cache.get("doc", "third question", 3, np.eye(3)[2]) is not None
+
+    cache.invalidate("doc")
+    assert cache.get("doc", "third question", 3, np.eye(3)[2]) is None
+
+
+def test_rag_repeated_question_skips_llm(rag_service):
+    """Aynı soru ikinci kez sorulunca LLM çağrılmamalı ve cached=True dönmeli"""
+    doc_id = rag_service.build_index_for_text(text=SAMPLE_TEXT, mode="fast")
+
+    first = asyncio.run(rag_service.ask_in_doc(doc_id, "What is the deadline?"))
+    second = asyncio.run(rag_service.ask_in_doc(doc_id, "what is the deadline"))
+
+    assert first["cached"] is False
+    assert second["cached"] is True
+    assert second["answer"] == first["answer"]
+    assert len(rag_service.llm_service.prompts) == 1
+
+    # Doküman yeniden indekslenince cache temizlenmeli
+    rag_service.build_index_for_text(text=SAMPLE_TEXT, mode="fast", doc_id=doc_id)
+    third = asyncio.run(rag_service.ask_in_doc(doc_id, "What is the deadline?"))
+    assert third["cached"] is False
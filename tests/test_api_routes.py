@@ -0,0 +1,337 @@
+"""
+API akış testleri (sahte embedding modeli ve sahte LLM ile)
+"""
+import asyncio
+import io
+import time
+import zipfile
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.routes import ClientDisconnected, cancel_on_disconnect
+from app.config import settings
+from app.main import app
+from app.services.buddy_store import BUDDY_DB
+from app.services.ingest_service import IngestJob, IngestService
+from tests.conftest import SAMPLE_TEXT, make_pdf
+
+
+@pytest.fixture
+def client(rag_service):
+    app.state.rag_service = rag_service
+    app.state.ingest_service = IngestService(rag_service, max_workers=1, max_queue=4)
+    yield TestClient(app)
+    app.state.ingest_service.shutdown()
+    app.state.rag_service = None
+    app.state.ingest_service = None
+
+
+def upload(client, text=SAMPLE_TEXT, mode="long"):
+    files = {"file": ("doc.txt", text.encode("utf-8"), "text/plain")}
+    return client.post("/api/v1/upload", params={"mode": mode}, files=files)
+
+
+def wait_ready(client, doc_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        data = client.get(f"/api/v1/documents/{doc_id}/status").json()
+        if data["status"] in ("ready", "failed"):
+            return data
+        time.sleep(0.02)
+    raise AssertionError("indeksleme zaman aşımına uğradı")
+
+
+def test_upload_is_accepted_and_becomes_ready(client):
+    """Upload 202 + pending dönmeli, sonra ready olmalı"""
+    response = upload(client)
+    assert response.status_code == 202
+    data = response.json()
+    assert data["status"] in ("pending", "running", "ready")
+
+    status = wait_ready(client, data["doc_id"])
+    assert status["status"] == "ready"
+    assert status["chunks"] > 0
+
+    ask = client.post("/api/v1/ask", json={"doc_id": data["doc_id"], "question": "What is the deadline?"})
+    assert ask.status_code == 200
+    assert ask.json()["answer"] == "The deadline is Friday."
+
+
+def test_ask_before_ready_returns_409(client):
+    """İndeksleme bitmeden gelen soru 409 almalı"""
+    app.state.ingest_service._jobs["pending-doc"] = IngestJob(doc_id="pending-doc", mode="fast", chars=10)
+
+    response = client.post("/api/v1/ask", json={"doc_id": "pending-doc", "question": "What is the deadline?"})
+    assert response.status_code == 409
+
+
+def test_unknown_doc_returns_404(client):
+    """Hiç yüklenmemiş doc_id 404 almalı"""
+    response = client.post("/api/v1/ask", json={"doc_id": "missing", "question": "What is the deadline?"})
+    assert response.status_code == 404
+
+
+def test_document_info_reports_memory(client):
+    """GET /documents/{doc_id} boyut ve bellek bilgisini döndürmeli"""
+    doc_id = upload(client).json()["doc_id"]
+    wait_ready(client, doc_id)
+
+    info = client.get(f"/api/v1/documents/{doc_id}").json()
+    assert info["index_type"] == "flat"
+    assert info["chunks"] > 0 and info["vector_bytes"] > 0
+    assert client.get("/api/v1/documents/missing").status_code == 404
+
+
+def test_large_upload_is_streamed_and_indexed(client):
+    """50000 karakterden uzun (çok byte'lı karakterli) metin long modda indekslenmeli"""
+    text = ("Teslim tarihi cuma günü. Çalışma şartları değişti. " * 2000).strip()
+    assert len(text) > 50000
+
+    response = upload(client, text=text)
+    assert response.status_code == 202
+    assert response.json()["chars"] == len(text)
+
+    status = wait_ready(client, response.json()["doc_id"], timeout=20)
+    assert status["status"] == "ready"
+    assert status["progress"] == 1.0
+
+
+def test_upload_validation_errors(client, monkeypatch):
+    """Bozuk UTF-8 400, boş dosya 422, boyut sınırını aşan dosya 413 almalı"""
+    files = {"file": ("doc.txt", b"\xff\xfe broken", "text/plain")}
+    assert client.post("/api/v1/upload", params={"mode": "long"}, files=files).status_code == 400
+    assert upload(client, text=" \n\t ").status_code == 422
+
+    monkeypatch.setattr(settings, "MAX_FILE_SIZE_MB", 1)
+    assert upload(client, text="x" * (1024 * 1024 + 1)).status_code == 413
+
+
+def test_markdown_upload_limits_use_converted_text(client):
+    """Markdown'da boş dosya kontrolü ve fast sınırı, bulk'taki gibi dönüştürülmüş metne uygulanmalı"""
+    files = {"file": ("doc.md", b"<br>\n```\n```\n", "text/markdown")}
+    assert client.post("/api/v1/upload", params={"mode": "fast"}, files=files).status_code == 422
+
+    link = "[Friday](http://example.com/" + "x" * 4000 + ")"
+    md = f"# Deadline\n\nThe deadline is {link}."
+    files = {"file": ("doc.md", md.encode("utf-8"), "text/markdown")}
+    response = client.post("/api/v1/upload", params={"mode": "fast"}, files=files)
+    assert response.status_code == 202
+    status = wait_ready(client, response.json()["doc_id"])
+    assert status["status"] == "ready"
+    assert status["chars"] == len("Deadline\n\nThe deadline is Friday.")
+
+
+def test_pdf_upload_cites_pages(client):
+    """PDF sayfaları indekslenmeli ve kaynaklarda sayfa numarası dönmeli"""
+    pages = ["Introduction to the service.", "", "The project deadline is Friday at noon."]
+    files = {"file": ("doc.pdf", make_pdf(pages), "application/pdf")}
+    response = client.post("/api/v1/upload", params={"mode": "long"}, files=files)
+    assert response.status_code == 202
+
+    doc_id = response.json()["doc_id"]
+    status = wait_ready(client, doc_id, timeout=30)
+    assert status["status"] == "ready"
+    assert status["chars"] > 0
+
+    ask = client.post("/api/v1/ask", json={"doc_id": doc_id, "question": "When is the project deadline?"})
+    pages_cited = {s["page"] for s in ask.json()["sources"]}
+    assert pages_cited <= {1, 3} and pages_cited
+
+
+def test_unsupported_extension_rejected(client):
+    files = {"file": ("doc.docx", b"data", "application/octet-stream")}
+    assert client.post("/api/v1/upload", files=files).status_code == 400
+
+
+def test_bulk_upload_files_and_zip(client):
+    """Dosyalar ve zip içeriği tek istekte indekslenmeli; hatalı dosyalar ayrı raporlanmalı"""
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("notes/a.txt", SAMPLE_TEXT)
+        zf.writestr("notes/b.md", "# Title\n\nThe deadline is **Friday**.")
+        zf.writestr("__MACOSX/notes/._a.txt", "junk")
+        zf.writestr("notes/empty.txt", "   ")
+    files = [
+        ("files", ("doc.txt", SAMPLE_TEXT.encode("utf-8"), "text/plain")),
+        ("files", ("docs.zip", archive.getvalue(), "application/zip")),
+        ("files", ("image.png", b"\x89PNG", "image/png")),
+    ]
+    response = client.post("/api/v1/upload/bulk", params={"mode": "long"}, files=files)
+    assert response.status_code == 200
+    data = response.json()
+
+    by_name = {d["filename"]: d for d in data["documents"]}
+    assert set(by_name) == {"doc.txt", "docs.zip/notes/a.txt", "docs.zip/notes/b.md", "docs.zip/notes/empty.txt", "image.png"}
+    assert by_name["docs.zip/notes/empty.txt"]["error"] == "File is empty."
+    assert by_name["image.png"]["error"] == "Unsupported file type."
+    assert len(data["doc_ids"]) == 3
+    assert data["stats"]["files"] == 5 and data["stats"]["failed"] == 2
+    assert data["stats"]["chunks"] == sum(d["chunks"] or 0 for d in data["documents"])
+
+    doc_id = by_name["docs.zip/notes/b.md"]["doc_id"]
+    assert wait_ready(client, doc_id)["status"] == "ready"
+    ask = client.post("/api/v1/ask", json={"doc_id": doc_id, "question": "What is the deadline?"})
+    assert ask.json()["sources"][0]["chunk"] == "Title\n\nThe deadline is Friday."
+
+
+def test_bulk_upload_limits(client, monkeypatch):
+    """Dosya sayısı sınırı 422, toplam boyut sınırı 413 almalı"""
+    files = [("files", (f"{i}.txt", b"hello world", "text/plain")) for i in range(3)]
+    monkeypatch.setattr(settings, "BULK_MAX_FILES", 2)
+    assert client.post("/api/v1/upload/bulk", files=files).status_code == 422
+
+    monkeypatch.setattr(settings, "BULK_MAX_FILES", 10)
+    monkeypatch.setattr(settings, "BULK_MAX_MB", 1)
+    big = [("files", ("big.txt", b"x" * (1024 * 1024 + 1), "text/plain"))]
+    assert client.post("/api/v1/upload/bulk", files=big).status_code == 413
+
+
+def test_server_timing_and_metrics(client, monkeypatch):
+    """/ask aşama sürelerini Server-Timing'de vermeli, /metrics histogram ve gauge'ları göstermeli"""
+    monkeypatch.setattr(app.state.rag_service, "answer_cache", None)
+    doc_id = upload(client).json()["doc_id"]
+    wait_ready(client, doc_id)
+
+    ask = client.post("/api/v1/ask", json={"doc_id": doc_id, "question": "Which library is used for search?"})
+    stages = {part.split(";")[0] for part in ask.headers["Server-Timing"].split(", ")}
+    assert {"embed", "search", "context", "llm", "total"} <= stages
+
+    body = client.get("/metrics").text
+    assert 'docqa_stage_duration_seconds_count{operation="ask",stage="llm"}' in body
+    assert 'docqa_stage_duration_seconds_count{operation="ingest",stage="embed"}' in body
+    assert 'route="/api/v1/ask"' in body
+    assert "docqa_store_documents " in body and "docqa_ingest_queued 0" in body
+    assert "# TYPE docqa_llm_cancelled_total counter" in body
+
+
+def test_health_and_ready(client):
+    """Health sayaçları upload sonrası güncellenmeli; servis yokken /ready 503 dönmeli"""
+    before = client.get("/api/v1/health").json()
+    doc_id = upload(client).json()["doc_id"]
+    chunks = wait_ready(client, doc_id)["chunks"]
+
+    data = client.get("/api/v1/health").json()
+    assert data["status"] == "healthy" and data["rag_ready"] is True
+    assert data["documents"] == before["documents"] + 1
+    assert data["chunks"] == before["chunks"] + chunks
+    assert client.get("/api/v1/ready").status_code == 200
+
+    rag_service = app.state.rag_service
+    app.state.rag_service = None
+    try:
+        assert client.get("/api/v1/health").json()["rag_ready"] is False
+        assert client.get("/api/v1/ready").status_code == 503
+    finally:
+        app.state.rag_service = rag_service
+
+
+def test_ask_shed_when_llm_queue_exceeds_deadline(client, monkeypatch):
+    """LLM kuyruğu istemci süresini aşacaksa /ask hemen 503 + Retry-After almalı"""
+    monkeypatch.setattr(app.state.rag_service, "answer_cache", None)
+    doc_id = upload(client).json()["doc_id"]
+    wait_ready(client, doc_id)
+
+    admission = app.state.rag_service.admission
+    monkeypatch.setattr(admission, "_active", admission.max_concurrent)  # tüm slotlar dolu
+    monkeypatch.setattr(admission, "_service_sec", 20.0)
+
+    payload = {"doc_id": doc_id, "question": "What is the deadline?"}
+    response = client.post("/api/v1/ask", json=payload, headers={"X-Request-Timeout": "5"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "20"
+    assert client.post("/api/v1/ask/stream", json=payload, headers={"X-Request-Timeout": "5"}).status_code == 503
+
+
+def test_cancel_on_disconnect_cancels_work():
+    """İstemci ayrılınca bekleyen iş iptal edilmeli; ayrılmazsa sonuç dönmeli"""
+    async def disconnect():
+        await asyncio.sleep(0.05)
+        return {"type": "http.disconnect"}
+
+    async def never():
+        await asyncio.Event().wait()
+
+    async def run():
+        cancelled = asyncio.Event()
+
+        async def slow_work():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        with pytest.raises(ClientDisconnected):
+            await cancel_on_disconnect(SimpleNamespace(receive=disconnect), slow_work())
+        assert cancelled.is_set()
+
+        async def quick_work():
+            return "ok"
+
+        return await cancel_on_disconnect(SimpleNamespace(receive=never), quick_work())
+
+    assert asyncio.run(run()) == "ok"
+
+
+def test_cancelled_handler_is_not_reported_as_disconnect():
+    """Handler dışarıdan iptal edilirse (kapanış) CancelledError korunmalı, work iptal edilmeli"""
+    async def never():
+        await asyncio.Event().wait()
+
+    async def run():
+        cancelled = asyncio.Event()
+
+        async def slow_work():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        handler = asyncio.ensure_future(cancel_on_disconnect(SimpleNamespace(receive=never), slow_work()))
+        await asyncio.sleep(0.05)
+        handler.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await handler
+        return cancelled.is_set()
+
+    assert asyncio.run(run()) is True
+
+
+def test_evicted_document_reported_and_rejected(client, monkeypatch):
+    """Kalıcı store yokken bellekten atılan doküman 'evicted' görünmeli, /ask 410 dönmeli"""
+    doc_id = upload(client).json()["doc_id"]
+    wait_ready(client, doc_id)
+
+    monkeypatch.setattr(BUDDY_DB, "idle_ttl_sec", 1e-9)
+    BUDDY_DB.evict_expired()
+
+    assert client.get(f"/api/v1/documents/{doc_id}/status").json()["status"] == "evicted"
+    response = client.post("/api/v1/ask", json={"doc_id": doc_id, "question": "What is FAISS?"})
+    assert response.status_code == 410
+
+
+def test_evicted_bulk_document_reported_and_rejected(client, monkeypatch):
+    """Toplu upload'daki doküman da job kaydı almalı: bellekten atılınca 'evicted' ve 410"""
+    files = [("files", ("doc.txt", SAMPLE_TEXT.encode("utf-8"), "text/plain"))]
+    doc_id = client.post("/api/v1/upload/bulk", params={"mode": "long"}, files=files).json()["doc_ids"][0]
+    status = client.get(f"/api/v1/documents/{doc_id}/status").json()
+    assert status["status"] == "ready" and status["chunks"] > 0
+
+    monkeypatch.setattr(BUDDY_DB, "idle_ttl_sec", 1e-9)
+    BUDDY_DB.evict_expired()
+
+    assert client.get(f"/api/v1/documents/{doc_id}/status").json()["status"] == "evicted"
+    response = client.post("/api/v1/ask", json={"doc_id": doc_id, "question": "What is FAISS?"})
+    assert response.status_code == 410
+
+
+def test_deleted_document_status_is_not_found(client):
+    """Silinen dokümanın job kaydı da kalkmalı"""
+    doc_id = upload(client).json()["doc_id"]
+    wait_ready(client, doc_id)
+
+    assert client.delete(f"/api/v1/documents/{doc_id}").status_code == 204
+    assert client.get(f"/api/v1/documents/{doc_id}/status").status_code == 404
@@ -0,0 +1,150 @@
+"""
+Ollama backend havuzu testleri (sahte Ollama instance'ları ile)
+"""
+import asyncio
+import json
+
+import httpx
+
+from app.services.backend_pool import BackendPool
+from app.services.llm_service import LLMService
+
+URLS = ["http://ollama-a:11434", "http://ollama-b:11434", "http://ollama-c:11434"]
+
+
+class FakeOllamas:
+    """Host'a göre cevap veren sahte Ollama'lar; down olanlar bağlantıyı reddeder"""
+
+    def __init__(self, latency=None, down=()):
+        self.latency = latency or {}
+        self.down = set(down)
+        self.calls = {}
+
+    async def __call__(self, request):
+        host = request.url.host
+        self.calls[host] = self.calls.get(host, 0) + 1
+        if host in self.down:
+            raise httpx.ConnectError("connection refused", request=request)
+        await asyncio.sleep(self.latency.get(host, 0.0))
+        if json.loads(request.content).get("stream"):
+            lines = [json.dumps({"response": host}), json.dumps({"done": True, "eval_count": 1})]
+            return httpx.Response(200, content="\n".join(lines).encode())
+        return httpx.Response(200, json={"response": host, "load_duration": 1_000_000})
+
+
+def make_llm(fake, urls=URLS):
+    llm = LLMService(base_urls=urls)
+    llm._client = httpx.AsyncClient(transport=httpx.MockTransport(fake))
+    return llm
+
+
+def test_least_outstanding_avoids_busy_backend():
+    """Yavaş backend'de bekleyen istek varken yeni istekler diğerlerine gitmeli"""
+    fake = FakeOllamas(latency={"ollama-a": 0.3, "ollama-b": 0.01, "ollama-c": 0.01})
+
+    async def run():
+        llm = make_llm(fake)
+        answers = []
+        for _ in range(3):
+            answers.append(asyncio.create_task(llm.achat("Hello")))
+            await asyncio.sleep(0.05)
+        answers = await asyncio.gather(*answers)
+        await llm.aclose()
+        return answers, llm.stats()["backends"]
+
+    answers, backends = asyncio.run(run())
+    assert sorted(answers) == ["ollama-a", "ollama-b", "ollama-c"]
+    assert all(b["outstanding"] == 0 for b in backends)
+
+    # a meşgulken gelen istekler b ve c'ye gider, a'ya ikinci istek gitmez
+    fake.calls.clear()
+    fake.latency["ollama-a"] = 1.0
+
+    async def busy():
+        llm = make_llm(fake)
+        slow = asyncio.create_task(llm.achat("Hello"))
+        await asyncio.sleep(0.05)
+        for _ in range(4):
+            await llm.achat("Hello")
+        slow.cancel()
+        await asyncio.gather(slow, return_exceptions=True)
+        await llm.aclose()
+
+    asyncio.run(busy())
+    assert fake.calls["ollama-a"] == 1
+    assert fake.calls["ollama-b"] + fake.calls["ollama-c"] == 4
+
+
+def test_connect_failure_retries_and_ejects():
+    """Bağlanılamayan backend'de istek başka backend'e gitmeli; art arda hatada havuzdan çıkmalı"""
+    fake = FakeOllamas(down={"ollama-a"})
+
+    async def run():
+        llm = make_llm(fake, URLS[:2])
+        llm.pool.failure_threshold = 2
+        answers = [await llm.achat("Hello") for _ in range(4)]
+        tokens = [t async for t in llm.astream("Hello")]
+        await llm.aclose()
+        return answers, tokens, llm.stats()
+
+    answers, tokens, stats = asyncio.run(run())
+    assert answers == ["ollama-b"] * 4
+    assert tokens == ["ollama-b"]
+    a, b = stats["backends"]
+    assert a["healthy"] is False and a["ejections"] == 1 and a["errors"] == 2
+    # Çıkarıldıktan sonra a'ya istek gitmez
+    assert fake.calls["ollama-a"] == 2
+    assert b["healthy"] is True and b["outstanding"] == 0
+
+
+def test_all_backends_down_raises():
+    """Hiçbir backend'e bağlanılamazsa her biri bir kez denenip hata dönmeli"""
+    fake = FakeOllamas(down={"ollama-a", "ollama-b", "ollama-c"})
+
+    async def run():
+        llm = make_llm(fake)
+        try:
+            await llm.achat("Hello")
+        except RuntimeError as e:
+            return str(e)
+        finally:
+            await llm.aclose()
+
+    assert "iletişim" in asyncio.run(run())
+    assert fake.calls == {"ollama-a": 1, "ollama-b": 1, "ollama-c": 1}
+
+
+def test_ejected_backend_returns_after_eject_period(monkeypatch):
+    """Çıkarma süresi dolan backend tekrar seçilebilmeli, başarılı cevapta sağlıklı sayılmalı"""
+    now = [100.0]
+    monkeypatch.setattr("app.services.backend_pool.time.monotonic", lambda: now[0])
+    pool = BackendPool(URLS[:2], failure_threshold=1, eject_sec=30)
+
+    a = pool.acquire()
+    assert a.url == URLS[0]
+    pool.release(a, ok=False)
+    assert [pool.acquire().url for _ in range(2)] == [URLS[1], URLS[1]]
+
+    now[0] += 31
+    for b in pool.backends:
+        b.outstanding = 0
+    picked = [pool.acquire() for _ in range(2)]
+    assert {b.url for b in picked} == set(URLS[:2])
+    pool.release(picked[0] if picked[0].url == URLS[0] else picked[1], ok=True)
+    assert pool.stats()[0]["healthy"] is True
+
+
+def test_warm_up_loads_every_backend():
+    """Warm-up her backend'e gitmeli; biri kapalı olsa da başarılı sayılmalı"""
+    fake = FakeOllamas(down={"ollama-c"})
+
+    async def run():
+        llm = make_llm(fake)
+        load_ms = await llm.warm_up()
+        await llm.aclose()
+        return load_ms, llm.stats()
+
+    load_ms, stats = asyncio.run(run())
+    assert load_ms >= 0.0
+    assert fake.calls == {"ollama-a": 1, "ollama-b": 1, "ollama-c": 1}
+    assert stats["warmups"] == 1 and stats["warmup_failures"] == 1
@@ -0,0 +1,224 @@
+"""
+Doküman store'u (kalıcılık) için birim testleri
+"""
+import sys
+import time
+
+import faiss
+import numpy as np
+
+from app.config import settings
+from app.services import index_factory
+from app.services.buddy_store import BUDDY_DB, DocIndex, DocStore, estimate_doc_bytes
+from app.services.document_service import DocumentService, join_pages
+from tests.conftest import FakeEmbeddingModel, SAMPLE_TEXT
+
+
+def test_persisted_document_survives_restart(rag_service, tmp_path):
+    """Diske yazılan doküman yeni bir store'da aynı chunk'lar ve arama sonuçlarıyla açılmalı"""
+    doc_id = rag_service.build_index_for_text(text=SAMPLE_TEXT, mode="long")
+    original = BUDDY_DB[doc_id]
+
+    store = DocStore(str(tmp_path))
+    store[doc_id] = original
+
+    # "Restart": aynı klasör üzerinde yeni store
+    reopened = DocStore(str(tmp_path))
+    assert len(reopened) == 1
+    assert reopened.total_chunks() == len(original)
+    assert doc_id in reopened
+
+    loaded = reopened[doc_id]
+    assert loaded.mode == "long"
+    assert loaded.text == original.text
+    assert np.array_equal(loaded.offsets, original.offsets)
+
+    query = FakeEmbeddingModel().encode(["What is FAISS?"])
+    d1, i1 = original.index.search(query, 3)
+    d2, i2 = loaded.index.search(query, 3)
+    np.testing.assert_array_equal(i1, i2)
+    np.testing.assert_allclose(d1, d2)
+
+
+def test_delete_removes_files(rag_service, tmp_path):
+    """Silinen doküman diskten de kalkmalı"""
+    doc_id = rag_service.build_index_for_text(text=SAMPLE_TEXT, mode="fast")
+    store = DocStore(str(tmp_path))
+    store[doc_id] = BUDDY_DB[doc_id]
+
+    del store[doc_id]
+    assert doc_id not in store
+    assert doc_id not in DocStore(str(tmp_path))
+
+
+def test_unsafe_doc_id_is_not_resolved(tmp_path):
+    """doc_id path'e dönüştüğü için '../' gibi değerler aranmamalı"""
+    store = DocStore(str(tmp_path))
+    assert "../etc" not in store
+
+
+def test_lru_eviction_spills_to_disk(rag_service, tmp_path):
+    """Bütçe aşılınca en az kullanılan doküman bellekten atılmalı, diskten geri yüklenmeli"""
+    first = BUDDY_DB[rag_service.build_index_for_text(text=SAMPLE_TEXT, mode="fast")]
+    one_doc = estimate_doc_bytes(first)
+
+    store = DocStore(str(tmp_path), max_bytes=int(one_doc * 2.5))
+    store["a"] = first
+    store["b"] = first
+    _ = store["a"]  # "b" en uzun süredir kullanılmayan olsun
+    store["c"] = first
+
+    stats = store.stats()
+    assert stats["evictions"] == 1
+    assert stats["spills"] == 1
+    assert stats["resident_documents"] == 2
+    assert "b" in store  # diskte duruyor
+    assert store["b"].text == first.text
+    assert store.stats()["misses"] == 1
+
+
+def test_eviction_without_backing_store_forgets_document(rag_service):
+    """Kalıcı store yoksa atılan doküman tamamen unutulmalı"""
+    doc = BUDDY_DB[rag_service.build_index_for_text(text=SAMPLE_TEXT, mode="fast")]
+    store = DocStore(None, max_bytes=int(estimate_doc_bytes(doc) * 1.5))
+    store["a"] = doc
+    store["b"] = doc
+
+    assert "a" not in store
+    assert "b" in store
+    assert len(store) == 1
+
+
+def test_oversized_document_is_not_evicted_on_read(rag_service):
+    """Tek başına bütçeyi aşan doküman okunduğu anda atılmamalı"""
+    doc = BUDDY_DB[rag_service.build_index_for_text(text=SAMPLE_TEXT, mode="fast")]
+    store = DocStore(None, max_bytes=1)
+    store["a"] = doc
+
+    assert store["a"] is doc
+    assert store["a"] is doc
+    assert store.stats()["evictions"] == 0
+
+
+def test_idle_ttl_evicts(rag_service):
+    """idle_ttl_sec süresince erişilmeyen doküman atılmalı"""
+    doc = BUDDY_DB[rag_service.build_index_for_text(text=SAMPLE_TEXT, mode="fast")]
+    store = DocStore(None, idle_ttl_sec=0.01)
+    store["a"] = doc
+    time.sleep(0.02)
+    store.evict_expired()
+    assert "a" not in store
+    assert store.stats()["evictions"] == 1
+
+
+def test_describe_reports_memory_without_loading(rag_service, tmp_path, monkeypatch):
+    """describe, diskteki dokümanı yüklemeden boyut ve bellek bilgisini döndürmeli"""
+    monkeypatch.setattr(settings, "VECTOR_QUANTIZATION", "int8")
+    doc_id = rag_service.build_index_for_text(text=SAMPLE_TEXT, mode="long")
+    store = DocStore(str(tmp_path))
+    store[doc_id] = BUDDY_DB[doc_id]
+
+    info = store.describe(doc_id)
+    assert info["quantization"] == "int8"
+    assert info["resident"] and info["resident_bytes"] > info["vector_bytes"] > 0
+
+    restarted = DocStore(str(tmp_path))
+    info = restarted.describe(doc_id)
+    assert not info["resident"] and info["resident_bytes"] is None
+    assert info["vector_bytes"] == info["chunks"] * 32  # int8: boyut başına 1 byte
+    assert restarted.stats()["resident_documents"] == 0
+
+
+def test_doc_index_builds_chunks_from_offsets(rag_service):
+    """Chunk'lar offset'lerden üretilmeli ve splitter çıktısıyla aynı olmalı"""
+    doc_id = rag_service.build_index_for_text(text=SAMPLE_TEXT * 20, mode="long")
+    doc = BUDDY_DB[doc_id]
+
+    expected = DocumentService(chunk_size=600, chunk_overlap=80).split_text(SAMPLE_TEXT * 20)
+    assert [doc.chunk(i) for i in range(len(doc))] == expected
+    assert not hasattr(doc, "__dict__")
+
+    # Metin bir kez tutulur: overlap'li chunk kopyaları maliyete eklenmez
+    chunk_bytes = sum(sys.getsizeof(c) for c in expected)
+    assert estimate_doc_bytes(doc) < sys.getsizeof(doc.text) + chunk_bytes
+
+
+def test_page_starts_survive_restart(rag_service, tmp_path):
+    """PDF sayfa offset'leri diske yazılıp geri okunmalı"""
+    text, page_starts = join_pages([SAMPLE_TEXT, SAMPLE_TEXT])
+    doc_id, _ = rag_service.build_index_from_stream([text], mode="long", page_starts=page_starts)
+    store = DocStore(str(tmp_path))
+    store[doc_id] = BUDDY_DB[doc_id]
+
+    loaded = DocStore(str(tmp_path))[doc_id]
+    assert loaded.page(0) == 1
+    assert loaded.page(len(loaded) - 1) == 2
+
+
+def test_counters_track_catalog_and_memory(rag_service, tmp_path):
+    """Health sayaçları ekleme, LRU eviction ve silmede artımlı güncellenmeli"""
+    doc = BUDDY_DB[rag_service.build_index_for_text(text=SAMPLE_TEXT, mode="long")]
+    store = DocStore(str(tmp_path), max_bytes=estimate_doc_bytes(doc) + 1)
+
+    store["a"] = doc
+    store["b"] = doc  # bütçe tek doküman: "a" bellekten atılır, diskte kalır
+    counters = store.counters()
+    assert counters["documents"] == 2 and counters["chunks"] == 2 * len(doc)
+    assert counters["resident_documents"] == 1
+    assert counters["resident_bytes"] == estimate_doc_bytes(doc)
+    assert 0 < counters["resident_vector_bytes"] < counters["resident_bytes"]
+
+    store["b"] = doc  # aynı doc_id'nin üzerine yazmak sayıyı artırmamalı
+    del store["a"]
+    assert store.counters()["chunks"] == len(doc) == store.total_chunks()
+    assert DocStore(str(tmp_path)).counters()["chunks"] == len(doc)
+
+
+def test_workers_share_store_through_catalog_log(rag_service, tmp_path, monkeypatch):
+    """Başka bir worker process'inin eklediği / sildiği doküman diğer store'a yansımalı"""
+    doc = BUDDY_DB[rag_service.build_index_for_text(text=SAMPLE_TEXT, mode="long")]
+    worker_b = DocStore(str(tmp_path))
+    assert len(worker_b) == 0  # katalog keşfedildi
+
+    # worker A: aynı klasör, farklı process
+    worker_a = DocStore(str(tmp_path))
+    monkeypatch.setattr("app.services.buddy_store.os.getpid", lambda: 999999)
+    worker_a["shared"] = doc
+    monkeypatch.undo()
+
+    assert list(worker_b) == ["shared"]
+    assert worker_b.counters()["chunks"] == len(doc)
+    loaded = worker_b["shared"]
+    assert loaded.chunk(0) == doc.chunk(0)
+    # Offset'ler kopyalanmadan, salt okunur mmap olarak açılır
+    assert not loaded.starts.flags.writeable and not loaded.starts.flags.owndata
+    # Index'in vektör kodları da dosyadan kullanılır, process'e kopyalanmaz
+    assert not faiss.downcast_index(loaded.index).codes.is_owned
+
+    monkeypatch.setattr("app.services.buddy_store.os.getpid", lambda: 999999)
+    del worker_a["shared"]
+    monkeypatch.undo()
+
+    assert "shared" not in worker_b
+    assert len(worker_b) == 0 and worker_b.counters()["resident_documents"] == 0
+
+
+def test_loaded_indexes_map_vectors_without_copy(tmp_path, monkeypatch):
+    """Diskten açılan flat / SQ / HNSW index'lerinin vektör kodları process'e kopyalanmamalı"""
+    vectors = np.random.default_rng(0).normal(size=(300, 16)).astype("float32")
+    offsets = [(i, i + 1) for i in range(len(vectors))]
+    store = DocStore(str(tmp_path))
+    for doc_id, (index_type, quantization) in {
+        "flat": ("flat", "none"), "sq": ("flat", "fp16"), "hnsw": ("hnsw", "none"),
+    }.items():
+        monkeypatch.setattr(settings, "VECTOR_QUANTIZATION", quantization)
+        index = index_factory.build_index(vectors, index_type)
+        store[doc_id] = DocIndex("long", "x" * (len(vectors) + 1), index, offsets)
+
+    reopened = DocStore(str(tmp_path))
+    for doc_id in ("flat", "sq", "hnsw"):
+        doc = reopened[doc_id]
+        loaded = faiss.downcast_index(doc.index)
+        storage = faiss.downcast_index(loaded.storage) if isinstance(loaded, faiss.IndexHNSW) else loaded
+        assert not storage.codes.is_owned, doc_id
+        assert index_factory.search(doc.index, vectors[:1], 1)[1][0][0] == 0
@@ -0,0 +1,50 @@
+"""
+Context builder testleri: eşik, örtüşen chunk birleştirme ve token bütçesi
+"""
+from types import SimpleNamespace
+
+from app.services.context_builder import build_context, estimate_tokens
+
+TEXT = "".join(f"sentence number {i:03d}. " for i in range(100))
+
+
+def hit(doc, start, end, rank, distance=0.2, page=None):
+    return {"doc": doc, "start": start, "end": end, "chunk": doc.text[start:end],
+            "rank": rank, "distance": distance, "page": page}
+
+
+def test_overlapping_hits_are_merged_once():
+    """Örtüşen / bitişik chunk'lar tek blok olmalı, ortak metin bir kez yer almalı"""
+    doc = SimpleNamespace(text=TEXT)
+    results = [hit(doc, 100, 200, 1), hit(doc, 600, 700, 2), hit(doc, 150, 250, 3), hit(doc, 250, 300, 4)]
+
+    blocks, used, info = build_context(results, max_tokens=1000)
+
+    assert [b["chunk"] for b in blocks] == [TEXT[100:300], TEXT[600:700]]
+    assert [r["rank"] for r in used] == [1, 2, 3, 4]
+    assert info["merged"] == 2 and info["dropped"] == 0
+    assert info["tokens_saved"] == sum(estimate_tokens(r["chunk"]) for r in results) - info["context_tokens"] > 0
+
+
+def test_low_relevance_hits_dropped_but_best_kept():
+    """Eşik altı hit'ler atılmalı; hepsi eşik altındaysa en iyisi kalmalı"""
+    doc = SimpleNamespace(text=TEXT)
+    results = [hit(doc, 0, 50, 1, distance=0.5), hit(doc, 500, 550, 2, distance=1.5)]
+
+    blocks, used, info = build_context(results, max_tokens=1000, min_relevance=0.5)
+    assert [r["rank"] for r in used] == [1] and info["dropped"] == 1
+
+    blocks, used, info = build_context(results, max_tokens=1000, min_relevance=0.9)
+    assert [b["chunk"] for b in blocks] == [TEXT[0:50]] and info["dropped"] == 1
+
+
+def test_context_fits_token_budget():
+    """Bağlam bütçeyi aşmamalı; alakası yüksek blok önce girmeli"""
+    doc_a, doc_b = SimpleNamespace(text=TEXT), SimpleNamespace(text=TEXT[::-1])
+    results = [hit(doc_b, 0, 400, 1), hit(doc_a, 0, 400, 2)]
+
+    blocks, used, info = build_context(results, max_tokens=120)
+
+    assert blocks[0]["chunk"] == doc_b.text[0:400]
+    assert blocks[1]["chunk"] == TEXT[0:80]
+    assert info["context_tokens"] == 120 and info["truncated"] == 1
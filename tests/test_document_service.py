@@ -0,0 +1,148 @@
+"""
+Text splitter, streaming okuma ve PDF / Markdown için testler: span / streaming
+çıktısı, eski (liste tabanlı) split_text ile birebir aynı olmalı
+"""
+import io
+import multiprocessing
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from app.services.document_service import (
+    FileTooLarge, SimpleTextSplitter, decode_blocks, extract_pdf_pages, iter_markdown_text,
+    join_pages, spool_text_upload, strip_stream
+)
+from tests.conftest import make_pdf
+
+ALPHABET = "ab çğış\n\t  .  xyz"
+
+
+def reference_split(text, chunk_size, chunk_overlap):
+    """İlk sürümdeki split_text (referans davranış)"""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        next_start = end - chunk_overlap
+        if next_start <= start:
+            break
+        start = next_start
+    return chunks
+
+
+def random_pieces(rng, text):
+    """Metni rastgele (boş parçalar dahil) noktalardan böler"""
+    cuts = sorted(rng.randint(0, len(text)) for _ in range(rng.randint(0, 8)))
+    bounds = [0, *cuts, len(text)]
+    return [text[a:b] for a, b in zip(bounds, bounds[1:])]
+
+
+def test_spans_match_reference_on_random_inputs():
+    """Rastgele metin / chunk ayarlarında span'ler ve stream aynı chunk'ları vermeli"""
+    rng = random.Random(1234)
+    for _ in range(500):
+        text = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 400)))
+        chunk_size = rng.randint(1, 60)
+        chunk_overlap = rng.randint(0, chunk_size - 1)
+        splitter = SimpleTextSplitter(chunk_size, chunk_overlap)
+        expected = reference_split(text, chunk_size, chunk_overlap)
+
+        spans = list(splitter.iter_spans(text))
+        assert [text[s:e] for s, e in spans] == expected
+        assert splitter.split_text(text) == expected
+        assert list(splitter.iter_spans_stream(random_pieces(rng, text))) == spans
+
+
+def test_iter_spans_is_lazy():
+    """Generator ilk span'i metnin tamamı okunmadan üretmeli"""
+    consumed = []
+
+    def pieces():
+        for i in range(1000):
+            consumed.append(i)
+            yield "word " * 20
+
+    first = next(SimpleTextSplitter(50, 10).iter_spans_stream(pieces()))
+    assert first == (0, 49)
+    assert len(consumed) == 1
+
+
+def test_invalid_overlap_raises():
+    with pytest.raises(ValueError):
+        SimpleTextSplitter(10, 10).split_spans("some text")
+
+
+def test_streamed_decode_and_strip_match_whole_text():
+    """Rastgele byte sınırlarında decode + strip, tüm metnin decode().strip() sonucu ile aynı olmalı"""
+    rng = random.Random(99)
+    for _ in range(300):
+        text = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 200)))
+        raw = text.encode("utf-8")
+        cuts = sorted(rng.randint(0, len(raw)) for _ in range(rng.randint(0, 6)))
+        bounds = [0, *cuts, len(raw)]
+        blocks = [raw[a:b] for a, b in zip(bounds, bounds[1:])]
+
+        assert "".join(strip_stream(decode_blocks(blocks))) == text.strip()
+
+
+def test_spool_text_upload_counts_and_validates():
+    """Spool stripped karakter sayısını döndürmeli, bozuk UTF-8 ve sınır aşımında hata vermeli"""
+    dest = io.BytesIO()
+    raw = "  çok şey\n".encode("utf-8")
+    assert spool_text_upload(io.BytesIO(raw), dest) == len("çok şey")
+    assert dest.getvalue() == raw
+
+    with pytest.raises(UnicodeDecodeError):
+        spool_text_upload(io.BytesIO(b"ok \xff"), io.BytesIO())
+    with pytest.raises(FileTooLarge):
+        spool_text_upload(io.BytesIO(b"x" * 100), io.BytesIO(), max_bytes=10)
+
+
+def test_spool_markdown_counts_converted_text():
+    """Markdown upload'da sayılan, indekslenecek düz metnin uzunluğu olmalı; dosya aynen yazılmalı"""
+    dest = io.BytesIO()
+    raw = "# Başlık\n\nBir **önemli** [bağlantı](http://x.y)\n".encode("utf-8")
+    assert spool_text_upload(io.BytesIO(raw), dest, markdown=True) == len("Başlık\n\nBir önemli bağlantı")
+    assert dest.getvalue() == raw
+    assert spool_text_upload(io.BytesIO(b"<br>\n```\n```\n"), io.BytesIO(), markdown=True) == 0
+
+
+def test_markdown_is_converted_to_plain_text():
+    """Markdown işaretleri atılmalı; satır parça sınırında bölünse de sonuç aynı olmalı"""
+    md = "# Başlık\n\nBir **önemli** [bağlantı](http://x.y) ve `kod`.\n```\nx = 1\n```\n<br>son"
+    expected = "Başlık\n\nBir önemli bağlantı ve kod.\n\nx = 1\n\nson"
+    assert "".join(iter_markdown_text([md])) == expected
+    assert "".join(iter_markdown_text([md[:13], md[13:40], md[40:]])) == expected
+
+
+def test_markdown_fenced_code_is_kept_verbatim():
+    """Kod bloğundaki satırlar (# yorum, **kwargs, `x`) değiştirilmeden kalmalı"""
+    md = "Örnek:\n```python\n# yorum\ndef f(**kwargs):\n    return `x`\n```\n~~~\n## ~~~ değil\n```\n~~~\n**son**"
+    expected = "Örnek:\n\n# yorum\ndef f(**kwargs):\n    return `x`\n\n\n## ~~~ değil\n```\n\nson"
+    assert "".join(iter_markdown_text([md])) == expected
+    assert "".join(iter_markdown_text([md[i:i + 7] for i in range(0, len(md), 7)])) == expected
+
+
+def test_join_pages_maps_offsets_to_pages(tmp_path):
+    """Sayfa offset'leri chunk'ların sayfasını vermeli; boş sayfalar atlanmalı"""
+    text, starts = join_pages([" first page ", "", "third page\n"])
+    assert text == "first page\n\nthird page"
+    assert list(np.searchsorted(starts, [0, text.index("third")], side="right")) == [1, 3]
+
+
+def test_pdf_pages_extracted_in_process_pool(tmp_path):
+    """Process pool ile paralel extraction sıralı sonuçla aynı olmalı"""
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(make_pdf([f"Page {i} text" for i in range(1, 6)]))
+
+    sequential = extract_pdf_pages(str(path), pages_per_task=2)
+    with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn")) as pool:
+        parallel = extract_pdf_pages(str(path), pool, pages_per_task=2)
+
+    assert parallel == sequential
+    assert [p.strip() for p in parallel] == [f"Page {i} text" for i in range(1, 6)]
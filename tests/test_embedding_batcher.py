@@ -0,0 +1,46 @@
+"""
+Embedding micro-batcher için birim testleri
+"""
+import threading
+
+import numpy as np
+
+from app.services.embedding_batcher import EmbeddingBatcher
+from tests.conftest import FakeEmbeddingModel
+
+
+def test_concurrent_requests_share_one_batch():
+    """Eşzamanlı istekler tek encode çağrısında toplanmalı, herkes kendi satırını almalı"""
+    model = FakeEmbeddingModel()
+    batcher = EmbeddingBatcher(model, max_batch_size=64, max_wait_ms=200)
+    questions = [f"question number {i}" for i in range(8)]
+    results = {}
+
+    def ask(q):
+        results[q] = batcher.encode([q])
+
+    threads = [threading.Thread(target=ask, args=(q,)) for q in questions]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(model.calls) < len(questions)
+    for q in questions:
+        np.testing.assert_allclose(results[q], model.encode([q]))
+
+    stats = batcher.stats()
+    assert stats["requests"] == 8
+    assert stats["items"] == 8
+    assert stats["batches"] == len(model.calls) - len(questions)
+    batcher.close()
+
+
+def test_batch_respects_max_size():
+    """max_batch_size dolunca beklemeden encode edilmeli"""
+    model = FakeEmbeddingModel()
+    batcher = EmbeddingBatcher(model, max_batch_size=4, max_wait_ms=1000)
+    out = batcher.encode(["a b", "c d", "e f", "g h", "i j"])
+    assert out.shape == (5, model.dim)
+    assert batcher.stats()["batch_size_histogram"]["<=8"] == 1
+    batcher.close()
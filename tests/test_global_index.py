@@ -0,0 +1,82 @@
+"""
+Global (dokümanlar arası) vektör index'i için birim testleri
+"""
+import asyncio
+
+import numpy as np
+
+from app.services.buddy_store import BUDDY_DB, DocStore
+from app.services.global_index import GlobalIndex
+from tests.conftest import SAMPLE_TEXT
+
+
+def test_add_search_filter_and_remove():
+    """Arama tüm korpusta veya seçili dokümanlarda yapılmalı; silme sadece o dokümanı kaldırmalı"""
+    index = GlobalIndex()
+    a = np.eye(4, dtype="float32")[:2]  # doc-a: chunk 0 -> e0, chunk 1 -> e1
+    b = np.eye(4, dtype="float32")[2:]  # doc-b: chunk 0 -> e2, chunk 1 -> e3
+    index.add_document("doc-a", a)
+    index.add_document("doc-b", b)
+
+    query = np.eye(4, dtype="float32")[[3]]
+    top = index.search(query, 1)[0][0]
+    assert top[:2] == ("doc-b", 1)
+
+    filtered = index.search(query, 2, doc_ids=["doc-a"])[0]
+    assert {hit[0] for hit in filtered} == {"doc-a"}
+
+    index.remove_document("doc-b")
+    assert index.stats() == {"documents": 1, "vectors": 2}
+    assert all(hit[0] == "doc-a" for hit in index.search(query, 4)[0])
+    assert index.search(query, 2, doc_ids=["doc-b"]) == [[]]
+
+
+def test_rebuild_from_store(rag_service, tmp_path):
+    """Açılışta store'daki dokümanlar global index'e eklenmeli"""
+    doc_id = rag_service.build_index_for_text(text=SAMPLE_TEXT, mode="fast")
+    store = DocStore(str(tmp_path))
+    store[doc_id] = BUDDY_DB[doc_id]
+
+    index = GlobalIndex()
+    index.rebuild(DocStore(str(tmp_path)))
+    assert index.stats() == {"documents": 1, "vectors": len(BUDDY_DB[doc_id])}
+
+
+def test_ask_global_across_documents(rag_service):
+    """doc_id olmadan soru tüm dokümanlardan kaynak döndürmeli"""
+    rag_service.global_index = GlobalIndex()
+    first = rag_service.build_index_for_text(text=SAMPLE_TEXT, mode="fast")
+    second = rag_service.build_index_for_text(text="Rome is the capital of Italy. " * 30, mode="fast")
+
+    result = asyncio.run(rag_service.ask_global("What is the capital of Italy?", top_k=2))
+    assert result["sources"][0]["file"] == second
+
+    only_first = asyncio.run(rag_service.ask_global("What is the capital of Italy?", top_k=2, doc_ids=[first]))
+    assert {s["file"] for s in only_first["sources"]} == {first}
+
+    rag_service.delete_document(second)
+    assert second not in rag_service.global_index
+    assert second not in BUDDY_DB
+
+
+def test_sync_applies_changes_from_other_workers(rag_service, tmp_path, monkeypatch):
+    """Başka worker'ın store'a eklediği / sildiği doküman sync ile global index'e yansımalı"""
+    doc_id = rag_service.build_index_for_text(text=SAMPLE_TEXT, mode="fast")
+    store = DocStore(str(tmp_path))
+    index = GlobalIndex()
+    index.rebuild(store)
+
+    other = DocStore(str(tmp_path))
+    monkeypatch.setattr("app.services.buddy_store.os.getpid", lambda: 999999)
+    other[doc_id] = BUDDY_DB[doc_id]
+    monkeypatch.undo()
+
+    assert index.sync(store) == [doc_id]
+    assert index.stats() == {"documents": 1, "vectors": len(BUDDY_DB[doc_id])}
+    assert index.sync(store) == []
+
+    monkeypatch.setattr("app.services.buddy_store.os.getpid", lambda: 999999)
+    del other[doc_id]
+    monkeypatch.undo()
+    index.sync(store)
+    assert index.stats()["documents"] == 0
@@ -0,0 +1,86 @@
+"""
+FAISS index factory için birim testleri
+"""
+import faiss
+import numpy as np
+
+from app.config import settings
+from app.services import index_factory
+
+
+def clustered_vectors(n, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(32, dim))
+    return (centers[rng.integers(0, 32, n)] + 0.3 * rng.normal(size=(n, dim))).astype("float32")
+
+
+def test_auto_choice_by_size(monkeypatch):
+    """Otomatik modda küçük girdiler flat, büyükler HNSW / IVF-PQ seçilmeli"""
+    monkeypatch.setattr(settings, "VECTOR_DB_TYPE", "faiss")
+    monkeypatch.setattr(settings, "HNSW_MIN_VECTORS", 100)
+    monkeypatch.setattr(settings, "IVFPQ_MIN_VECTORS", 5000)
+    assert index_factory.choose_index_type(9) == "flat"
+    assert index_factory.choose_index_type(100) == "hnsw"
+    assert index_factory.choose_index_type(5000) == "ivfpq"
+    # Zorlanan IVF-PQ eğitim için yetersiz veride flat'e düşmeli
+    assert index_factory.choose_index_type(50, "ivfpq") == "flat"
+
+
+def test_cosine_distance_matches_l2_on_normalized(monkeypatch):
+    """Cosine modunda dönen mesafe, normalize vektörlerdeki L2² ile aynı olmalı"""
+    vectors = clustered_vectors(200)
+    query = vectors[:3]
+
+    monkeypatch.setattr(settings, "VECTOR_METRIC", "cosine")
+    ip_index = index_factory.build_index(vectors, "flat")
+    d_ip, i_ip = index_factory.search(ip_index, query, 5)
+
+    normalized = vectors.copy()
+    faiss.normalize_L2(normalized)
+    l2_index = faiss.IndexFlatL2(normalized.shape[1])
+    l2_index.add(normalized)
+    d_l2, i_l2 = l2_index.search(normalized[:3], 5)
+
+    np.testing.assert_array_equal(i_ip, i_l2)
+    np.testing.assert_allclose(d_ip, d_l2, atol=1e-4)
+
+
+def test_ann_indexes_recall_close_to_flat():
+    """HNSW ve IVF-PQ, flat sonuçlarının çoğunu bulmalı"""
+    vectors = clustered_vectors(4000)
+    queries = clustered_vectors(50, seed=1)
+    _, exact = index_factory.search(index_factory.build_index(vectors, "flat"), queries, 10)
+
+    for kind, min_recall in (("hnsw", 0.9), ("ivfpq", 0.4)):
+        index = index_factory.build_index(vectors, kind)
+        assert index_factory.index_type_of(index) == kind
+        _, found = index_factory.search(index, queries, 10)
+        recall = np.mean([len(set(a) & set(b)) / 10 for a, b in zip(exact, found)])
+        assert recall >= min_recall, (kind, recall)
+
+
+def test_quantized_storage_is_smaller_and_close_to_float32():
+    """fp16 / int8 depolama belleği küçültmeli, sonuçlar float32'ye yakın kalmalı"""
+    vectors = clustered_vectors(2000)
+    queries = clustered_vectors(50, seed=2)
+    baseline = index_factory.build_index(vectors, "flat", quantization="none")
+    d_exact, exact = index_factory.search(baseline, queries, 10)
+
+    previous = index_factory.index_bytes(baseline)
+    for quantization in ("fp16", "int8"):
+        index = index_factory.build_index(vectors, "flat", quantization=quantization)
+        assert index_factory.quantization_of(index) == quantization
+        assert index_factory.index_bytes(index) < previous
+        previous = index_factory.index_bytes(index)
+
+        distances, found = index_factory.search(index, queries, 10)
+        recall = np.mean([len(set(a) & set(b)) / 10 for a, b in zip(exact, found)])
+        assert recall >= 0.9, (quantization, recall)
+        np.testing.assert_allclose(distances[:, 0], d_exact[:, 0], atol=0.05)
+
+
+def test_build_without_copy_normalizes_in_place():
+    """copy=False iken girdi dizisi yerinde normalize edilir (ek kopya yok)"""
+    vectors = clustered_vectors(100)
+    index_factory.build_index(vectors, "flat", copy=False)
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, atol=1e-5)
@@ -0,0 +1,139 @@
+"""
+Ingest kuyruğu için birim testleri
+"""
+import os
+import tempfile
+import threading
+import time
+
+import pytest
+
+from app.config import settings
+from app.services.buddy_store import BUDDY_DB
+from app.services.ingest_service import BulkFile, IngestService, IngestQueueFull
+from tests.conftest import SAMPLE_TEXT
+
+
+def wait_for(job, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while job.status in ("pending", "running") and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return job
+
+
+def submit_text(ingest, tmp_path, text, mode="fast"):
+    """Metni geçici dosyaya yazıp upload gibi kuyruğa ekler"""
+    fd, path = tempfile.mkstemp(suffix=".txt", dir=tmp_path)
+    with os.fdopen(fd, "wb") as f:
+        f.write(text.encode("utf-8"))
+    return ingest.submit_file(path, mode, chars=len(text.strip()))
+
+
+def test_submit_returns_pending_then_ready(rag_service, tmp_path):
+    """Upload hemen pending dönmeli, worker bitirince ready olmalı"""
+    ingest = IngestService(rag_service, max_workers=1, max_queue=2)
+    job = submit_text(ingest, tmp_path, SAMPLE_TEXT)
+    assert job.status in ("pending", "running", "ready")
+
+    wait_for(job)
+    assert job.status == "ready"
+    assert job.chunks > 0
+    ingest.shutdown()
+
+
+def test_ready_when_document_exceeds_store_budget(rag_service, tmp_path, monkeypatch):
+    """Bellek bütçesini tek başına aşan doküman da ready olmalı, chunk sayısı store'dan okunmamalı"""
+    monkeypatch.setattr(BUDDY_DB, "max_bytes", 1)
+    ingest = IngestService(rag_service, max_workers=1, max_queue=2)
+    job = wait_for(submit_text(ingest, tmp_path, SAMPLE_TEXT))
+
+    assert job.status == "ready" and job.chunks > 0
+    assert len(BUDDY_DB[job.doc_id]) == job.chunks
+    ingest.shutdown()
+
+
+def test_queue_full_is_rejected(tmp_path):
+    """Worker + kuyruk kapasitesi dolunca IngestQueueFull fırlatılmalı"""
+    release = threading.Event()
+
+    class BlockingRAG:
+        def build_index_from_stream(self, pieces, mode, doc_id=None, **kwargs):
+            release.wait(5)
+            raise RuntimeError("boom")
+
+    ingest = IngestService(BlockingRAG(), max_workers=1, max_queue=1)
+    first = submit_text(ingest, tmp_path, "a")
+    submit_text(ingest, tmp_path, "b")
+    with pytest.raises(IngestQueueFull):
+        submit_text(ingest, tmp_path, "c")
+    assert len(list(tmp_path.iterdir())) == 2  # reddedilen upload silinir
+
+    release.set()
+    wait_for(first)
+    assert first.status == "failed"
+    assert first.error == "boom"
+    ingest.shutdown()
+
+
+def test_shutdown_removes_files_of_queued_jobs(tmp_path):
+    """Shutdown'da kuyruktan düşen job'ların geçici dosyaları silinmeli"""
+    release = threading.Event()
+
+    class BlockingRAG:
+        def build_index_from_stream(self, pieces, mode, doc_id=None, **kwargs):
+            release.wait(5)
+            return doc_id, 0
+
+    ingest = IngestService(BlockingRAG(), max_workers=1, max_queue=2)
+    submit_text(ingest, tmp_path, "a")
+    time.sleep(0.05)  # ilk job çalışmaya başlasın
+    queued = submit_text(ingest, tmp_path, "b")
+    bulk_path = tmp_path / "bulk.txt"
+    bulk_path.write_text("c", encoding="utf-8")
+    ingest.submit_bulk([BulkFile(filename="c.txt", kind="text", path=str(bulk_path))], "fast")
+
+    ingest.shutdown()
+    release.set()
+    assert queued.status == "pending"
+    assert not bulk_path.exists()
+    assert len(list(tmp_path.iterdir())) == 1  # sadece çalışan job'un dosyası
+
+
+def test_submit_file_reports_progress_and_removes_file(rag_service, tmp_path, monkeypatch):
+    """Dosyadan indeksleme ilerlemeyi raporlamalı, bitince geçici dosyayı silmeli"""
+    monkeypatch.setattr(settings, "INGEST_EMBED_BATCH_SIZE", 2)
+    text = SAMPLE_TEXT * 20
+    path = tmp_path / "upload.txt"
+    path.write_bytes(("  \n" + text + "\n\n").encode("utf-8"))
+
+    seen = []
+    original = rag_service.build_index_from_stream
+
+    def tracking(pieces, **kwargs):
+        progress = kwargs.pop("progress")
+        return original(pieces, progress=lambda c, n: (seen.append((c, n)), progress(c, n)), **kwargs)
+
+    monkeypatch.setattr(rag_service, "build_index_from_stream", tracking)
+    ingest = IngestService(rag_service, max_workers=1, max_queue=2)
+    job = wait_for(ingest.submit_file(str(path), "long", chars=len(text.strip())))
+
+    assert job.status == "ready"
+    assert job.processed_chars == job.chars
+    assert len(seen) > 1 and seen == sorted(seen)
+    assert BUDDY_DB[job.doc_id].text == text.strip()
+    assert not path.exists()
+    ingest.shutdown()
+
+
+def test_job_status_visible_to_other_workers(rag_service, tmp_path):
+    """jobs_dir paylaşılınca job'u almayan servis de durumunu görmeli"""
+    jobs_dir = str(tmp_path / "jobs")
+    ingest = IngestService(rag_service, max_workers=1, max_queue=2, jobs_dir=jobs_dir)
+    other = IngestService(rag_service, max_workers=1, max_queue=2, jobs_dir=jobs_dir)
+
+    job = wait_for(submit_text(ingest, tmp_path, SAMPLE_TEXT))
+    seen = other.get(job.doc_id)
+    assert seen.status == "ready" and seen.chunks == job.chunks
+    assert other.get("missing") is None and other.get("../x") is None
+    ingest.shutdown()
+    other.shutdown()
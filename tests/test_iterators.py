@@ -0,0 +1,59 @@
+"""
+Ingest iterator yardımcıları için birim testleri
+"""
+import threading
+import time
+
+import pytest
+
+from app.utils.iterators import batched, prefetch
+
+
+def test_batched_groups_items():
+    assert list(batched(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(batched([], 3)) == []
+
+
+def test_prefetch_preserves_order_and_runs_ahead():
+    """Üretici, tüketici beklerken sonraki elemanları hazırlamalı"""
+    produced = []
+
+    def source():
+        for i in range(5):
+            produced.append(i)
+            yield i
+
+    it = prefetch(source(), depth=2)
+    assert next(it) == 0
+    time.sleep(0.05)
+    assert len(produced) >= 3  # 0 tüketildi, 1-2 kuyrukta
+    assert list(it) == [1, 2, 3, 4]
+
+
+def test_prefetch_propagates_errors():
+    def source():
+        yield 1
+        raise RuntimeError("okuma hatası")
+
+    it = prefetch(source())
+    assert next(it) == 1
+    with pytest.raises(RuntimeError, match="okuma hatası"):
+        next(it)
+
+
+def test_prefetch_stops_producer_when_consumer_closes():
+    """Tüketici erken bırakırsa üretici thread'i sonlanmalı"""
+    def source():
+        i = 0
+        while True:
+            yield i
+            i += 1
+
+    before = threading.active_count()
+    it = prefetch(source(), depth=1)
+    next(it)
+    it.close()
+    deadline = time.monotonic() + 2
+    while threading.active_count() > before and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert threading.active_count() == before
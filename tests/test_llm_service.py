@@ -1,9 +1,15 @@
 """
 LLM Service için birim testleri
 """
+import asyncio
+import json
 import sys
+import time
 sys.path.insert(0, 'D:\\projeler\\caseStudyLLM\\document-qa-service')
 
+import httpx
+
+from app.config import settings
 from app.services.llm_service import LLMService
 
 
@@ -37,6 +43,111 @@ def test_chat_with_error():
     print("✅ test_chat_with_error PASSED")
 
 
+def test_achat_concurrent_requests_overlap():
+    """Eşzamanlı achat çağrıları sırayla değil, paralel ilerlemeli"""
+    async def slow_generate(request):
+        await asyncio.sleep(0.2)
+        return httpx.Response(200, json={"response": "ok"})
+
+    async def run():
+        llm = LLMService()
+        llm._client = httpx.AsyncClient(
+            base_url=llm.base_url, transport=httpx.MockTransport(slow_generate)
+        )
+        start = time.perf_counter()
+        answers = await asyncio.gather(*[llm.achat("Hello") for _ in range(5)])
+        elapsed = time.perf_counter() - start
+        await llm.aclose()
+        return answers, elapsed
+
+    answers, elapsed = asyncio.run(run())
+    assert answers == ["ok"] * 5
+    # Sıralı olsaydı ~1.0 sn sürerdi
+    assert elapsed < 0.6
+    print("✅ test_achat_concurrent_requests_overlap PASSED")
+
+
+def test_payload_options_and_cold_warm_stats():
+    """Generation ayarları ve keep_alive gönderilmeli; load_duration'a göre cold/warm ayrılmalı"""
+    payloads = []
+    load_ns = iter([2_000_000_000, 1_000_000])  # ilk çağrı model yükler
+
+    async def generate(request):
+        payloads.append(json.loads(request.content))
+        return httpx.Response(200, json={"response": "ok", "load_duration": next(load_ns)})
+
+    async def run():
+        llm = LLMService()
+        llm._client = httpx.AsyncClient(base_url=llm.base_url, transport=httpx.MockTransport(generate))
+        await llm.achat("Hello")
+        await llm.achat("Hello again")
+        await llm.aclose()
+        return llm.stats()
+
+    stats = asyncio.run(run())
+    assert payloads[0]["options"] == {
+        "num_predict": settings.MAX_TOKENS,
+        "num_ctx": settings.OLLAMA_NUM_CTX,
+        "temperature": settings.TEMPERATURE,
+    }
+    assert payloads[0]["keep_alive"] == settings.OLLAMA_KEEP_ALIVE
+    assert stats["cold"]["count"] == 1 and stats["cold"]["avg_load_ms"] == 2000.0
+    assert stats["warm"]["count"] == 1
+
+
+def test_warm_up_loads_model():
+    """Warm-up boş prompt ve gerçek isteklerle aynı options ile modeli yüklemeli, süresi ölçülmeli"""
+    async def generate(request):
+        body = json.loads(request.content)
+        assert body["prompt"] == "" and body["keep_alive"] == settings.OLLAMA_KEEP_ALIVE
+        assert body["options"]["num_ctx"] == settings.OLLAMA_NUM_CTX
+        await asyncio.sleep(0.05)
+        # Ollama'nın sadece yükleme yapan cevabında load_duration yok
+        return httpx.Response(200, json={"response": "", "done": True, "done_reason": "load"})
+
+    async def run():
+        llm = LLMService()
+        llm._client = httpx.AsyncClient(base_url=llm.base_url, transport=httpx.MockTransport(generate))
+        load_ms = await llm.warm_up()
+        await llm.aclose()
+        return load_ms, llm.stats()
+
+    load_ms, stats = asyncio.run(run())
+    assert load_ms >= 50.0
+    assert stats["warmups"] == 1 and stats["last_warmup_ms"] == round(load_ms, 1)
+
+
+def test_cancelled_generation_is_counted():
+    """İptal edilen achat ve yarıda kapatılan stream sayılmalı, harcanmayan token tahmin edilmeli"""
+    async def generate(request):
+        body = json.loads(request.content)
+        if body["stream"]:
+            lines = [json.dumps({"response": t}) for t in ("a", "b", "c")]
+            return httpx.Response(200, content="\n".join(lines).encode())
+        await asyncio.sleep(5)
+        return httpx.Response(200, json={"response": "ok"})
+
+    async def run():
+        llm = LLMService()
+        llm._client = httpx.AsyncClient(base_url=llm.base_url, transport=httpx.MockTransport(generate))
+        task = asyncio.create_task(llm.achat("Hello"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+        stream = llm.astream("Hello")
+        assert await stream.__anext__() == "a"
+        await stream.aclose()
+        await llm.aclose()
+        return llm.stats()
+
+    stats = asyncio.run(run())
+    assert stats["cancelled"] == 2
+    assert stats["in_flight"] == 0
+    # Ortalama yokken MAX_TOKENS beklenir; stream 1 token üretmişti
+    assert stats["tokens_saved"] == 2 * settings.MAX_TOKENS - 1
+
+
 if __name__ == "__main__":
     print("🧪 LLM Service Testleri Başlıyor...\n")
     
@@ -44,6 +155,7 @@ if __name__ == "__main__":
         test_llm_service_init()
         test_chat_function()
         test_chat_with_error()
+        test_achat_concurrent_requests_overlap()
         print("\n✅ Tüm testler başarılı!")
     except AssertionError as e:
         print(f"\n❌ Test başarısız: {e}")
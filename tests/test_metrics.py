@@ -0,0 +1,37 @@
+"""
+Metrik histogramı ve Server-Timing testleri
+"""
+from app.services import metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    """Bucket'lar kümülatif, +Inf toplam adede eşit olmalı"""
+    hist = metrics.Histogram("test_seconds", "test", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        hist.observe(value, "embed")
+
+    lines = hist.render()
+    assert 'test_seconds_bucket{stage="embed",le="0.1"} 2' in lines
+    assert 'test_seconds_bucket{stage="embed",le="1.0"} 3' in lines
+    assert 'test_seconds_bucket{stage="embed",le="+Inf"} 4' in lines
+    assert 'test_seconds_count{stage="embed"} 4' in lines
+    assert hist.count("embed") == 4 and hist.count("llm") == 0
+
+
+def test_stage_timings_collected_per_request():
+    """Aşama süreleri sadece istek context'indeyken Server-Timing listesine yazılmalı"""
+    with metrics.stage("ask", "search"):
+        pass
+
+    timings, token = metrics.start_request()
+    try:
+        with metrics.stage("ask", "embed"):
+            pass
+        metrics.observe("ask", "llm", 0.25)
+        metrics.observe("ask", "llm", 0.25)
+    finally:
+        metrics.end_request(token)
+
+    assert set(timings) == {"embed", "llm"}
+    assert timings["llm"] == 500.0
+    assert metrics.server_timing(timings, 600.0).endswith("llm;dur=500.0, total;dur=600.0")
@@ -0,0 +1,166 @@
+"""
+RAG Service için birim testleri
+"""
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.services.buddy_store import BUDDY_DB
+from tests.conftest import SAMPLE_TEXT
+
+
+def test_build_index_and_ask(rag_service, monkeypatch):
+    """Upload edilen metin indekslenmeli ve soru cevaplanmalı"""
+    monkeypatch.setattr(settings, "MIN_RELEVANCE_SCORE", 0.0)
+    doc_id = rag_service.build_index_for_text(text=SAMPLE_TEXT, mode="fast")
+    assert doc_id in BUDDY_DB
+
+    result = asyncio.run(rag_service.ask_in_doc(doc_id, "What is the deadline?"))
+    assert result["answer"] == "The deadline is Friday."
+    assert len(result["sources"]) == 3
+    assert result["confidence"] == "high"
+
+
+def test_ask_stream_event_order(rag_service):
+    """Stream önce sources, sonra token'lar, en son done göndermeli"""
+    doc_id = rag_service.build_index_for_text(text=SAMPLE_TEXT, mode="fast")
+
+    async def collect():
+        return [e async for e in rag_service.ask_in_doc_stream(doc_id, "What is FAISS?")]
+
+    events = asyncio.run(collect())
+    kinds = [e["type"] for e in events]
+    assert kinds[0] == "sources"
+    assert kinds[-1] == "done"
+    assert set(kinds[1:-1]) == {"token"}
+    assert "".join(e["text"] for e in events[1:-1]).strip() == "The deadline is Friday."
+    assert events[-1]["timings"]["total_ms"] >= events[-1]["timings"]["retrieval_ms"]
+
+
+def test_cached_stream_done_matches_uncached(rag_service):
+    """Cache'ten gelen stream'in done olayı ilk cevaptakiyle aynı alanları (context dahil) taşımalı"""
+    doc_id = rag_service.build_index_for_text(text=SAMPLE_TEXT, mode="fast")
+
+    async def collect():
+        return [e async for e in rag_service.ask_in_doc_stream(doc_id, "What is FAISS?")]
+
+    first, second = asyncio.run(collect())[-1], asyncio.run(collect())[-1]
+    assert first["cached"] is False and second["cached"] is True
+    assert set(first) == set(second)
+    assert second["context"] == first["context"]
+
+
+def test_ask_batch_single_encode_and_ordered_answers(rag_service):
+    """Batch sorular tek encode çağrısında embed edilmeli, cevaplar sırayla dönmeli"""
+    doc_id = rag_service.build_index_for_text(text=SAMPLE_TEXT, mode="long")
+    questions = ["What is the deadline?", "What is FAISS?", "What is Python?"]
+    model = rag_service.embedding_model
+    calls_before = len(model.calls)
+
+    result = asyncio.run(rag_service.ask_batch_in_doc(doc_id, questions))
+
+    assert model.calls[calls_before:] == [3]
+    assert [a["question"] for a in result["answers"]] == questions
+    assert all("total_ms" in a["timings"] for a in result["answers"])
+    assert len(rag_service.llm_service.prompts) == 3
+    assert set(result["timings"]) == {"embed_ms", "search_ms", "total_ms"}
+
+
+def test_ask_batch_cancels_remaining_answers_on_failure(rag_service, monkeypatch):
+    """Bir sorunun LLM çağrısı hata verince diğer üretimler iptal edilmeli, slotlar bırakılmalı"""
+    monkeypatch.setattr(rag_service, "answer_cache", None)
+    doc_id = rag_service.build_index_for_text(text=SAMPLE_TEXT, mode="long")
+    cancelled = []
+
+    async def achat(prompt):
+        if "What is FAISS?" in prompt:
+            await asyncio.sleep(0.01)
+            raise RuntimeError("LLM servisi ile iletişim kurulamadı")
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(prompt)
+            raise
+
+    monkeypatch.setattr(rag_service.llm_service, "achat", achat)
+    questions = ["What is the deadline?", "What is FAISS?", "What is Python?"]
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await rag_service.ask_batch_in_doc(doc_id, questions)
+        # Hata döndüğü anda (event loop kapanmadan) diğerleri bitmiş olmalı
+        return len(cancelled), rag_service.admission.stats()["active"]
+
+    assert asyncio.run(run()) == (2, 0)
+
+
+def test_failed_llm_call_does_not_lower_service_estimate(rag_service, monkeypatch):
+    """Hata veren LLM çağrısı slotu bırakmalı ama bekleme tahminine örnek eklememeli"""
+    monkeypatch.setattr(rag_service, "answer_cache", None)
+    doc_id = rag_service.build_index_for_text(text=SAMPLE_TEXT, mode="fast")
+
+    async def achat(prompt):
+        raise RuntimeError("LLM servisi ile iletişim kurulamadı")
+
+    monkeypatch.setattr(rag_service.llm_service, "achat", achat)
+    before = rag_service.admission.stats()["avg_service_sec"]
+    with pytest.raises(RuntimeError):
+        asyncio.run(rag_service.ask_in_doc(doc_id, "What is the deadline?"))
+
+    stats = rag_service.admission.stats()
+    assert stats["avg_service_sec"] == before and stats["active"] == 0
+
+
+def test_build_index_embeds_in_batches(rag_service, monkeypatch):
+    """Chunk'lar INGEST_EMBED_BATCH_SIZE'lık batch'lerle embed edilmeli, sonuç aynı kalmalı"""
+    text = SAMPLE_TEXT * 30
+    whole = BUDDY_DB[rag_service.build_index_for_text(text=text, mode="fast")]
+
+    monkeypatch.setattr(settings, "INGEST_EMBED_BATCH_SIZE", 4)
+    rag_service.embedding_model.calls.clear()
+    doc = BUDDY_DB[rag_service.build_index_for_text(text=text, mode="fast")]
+
+    assert max(rag_service.embedding_model.calls) == 4
+    assert sum(rag_service.embedding_model.calls) == len(doc) == len(whole)
+    np.testing.assert_array_equal(doc.offsets, whole.offsets)
+    np.testing.assert_allclose(doc.index.reconstruct_n(0, len(doc)), whole.index.reconstruct_n(0, len(whole)))
+
+
+def test_build_index_bulk_batches_across_documents(rag_service, monkeypatch):
+    """Toplu indekslemede chunk'lar dokümanlar arası batch'lenmeli, index'ler tekil indekslemeyle aynı olmalı"""
+    texts = [SAMPLE_TEXT, SAMPLE_TEXT * 3, "Short note about FAISS."]
+    singles = [BUDDY_DB[rag_service.build_index_for_text(text=t, mode="fast")] for t in texts]
+
+    monkeypatch.setattr(settings, "INGEST_EMBED_BATCH_SIZE", 8)
+    rag_service.embedding_model.calls.clear()
+    results, stats = rag_service.build_index_bulk([(t, None) for t in texts], mode="fast")
+
+    total = sum(len(d) for d in singles)
+    assert stats["chunks"] == total and stats["documents"] == 3
+    assert rag_service.embedding_model.calls == [8] * (total // 8) + ([total % 8] if total % 8 else [])
+    for (doc_id, chunks), single in zip(results, singles):
+        doc = BUDDY_DB[doc_id]
+        assert chunks == len(doc) == len(single)
+        np.testing.assert_array_equal(doc.offsets, single.offsets)
+        np.testing.assert_allclose(
+            doc.index.reconstruct_n(0, len(doc)), single.index.reconstruct_n(0, len(single)), atol=1e-6
+        )
+
+
+def test_ask_reports_merged_context(rag_service, monkeypatch):
+    """Komşu chunk'lar prompt'a birleşik girmeli, context bilgisi cevapta dönmeli"""
+    monkeypatch.setattr(settings, "MIN_RELEVANCE_SCORE", 0.0)
+    doc_id = rag_service.build_index_for_text(text=SAMPLE_TEXT, mode="fast")
+    doc = BUDDY_DB[doc_id]
+
+    result = asyncio.run(rag_service.ask_in_doc(doc_id, "What is the deadline?", top_k=len(doc)))
+    context = result["context"]
+    prompt = rag_service.llm_service.prompts[-1]
+
+    # Tüm chunk'lar tek blokta: doküman metni prompt'ta bir kez
+    assert prompt.count("[Doc ") == 1 and doc.text.strip() in prompt
+    assert context["merged"] == len(result["sources"]) - 1 == len(doc) - 1
+    assert context["tokens_saved"] > 0
+    assert context["prompt_chars"] == len(prompt)
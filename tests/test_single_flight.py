@@ -0,0 +1,99 @@
+"""
+Single-flight birleştirme için birim testleri
+"""
+import asyncio
+
+import pytest
+
+from app.services.single_flight import SingleFlight
+from tests.conftest import SAMPLE_TEXT
+
+
+def test_concurrent_calls_share_one_execution():
+    """Aynı key ile eşzamanlı çağrılar fn'i bir kez çalıştırmalı"""
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"answer": 42}
+
+    async def run():
+        flight = SingleFlight()
+        results = await asyncio.gather(*[flight.do("k", work) for _ in range(5)])
+        return flight, results
+
+    flight, results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(r == {"answer": 42} for r in results)
+    assert flight.stats() == {"leaders": 1, "followers": 4, "in_flight": 0}
+
+
+def test_shared_call_cancelled_only_when_last_waiter_leaves():
+    """Bir bekleyen ayrılınca iş sürmeli; son bekleyen de ayrılınca iptal edilmeli"""
+    async def run():
+        flight = SingleFlight()
+        started = asyncio.Event()
+        finished = []
+
+        async def work():
+            started.set()
+            await asyncio.sleep(0.1)
+            finished.append(1)
+            return "done"
+
+        a = asyncio.create_task(flight.do("k", work))
+        b = asyncio.create_task(flight.do("k", work))
+        await started.wait()
+        a.cancel()
+        assert await b == "done"
+
+        c = asyncio.create_task(flight.do("k2", work))
+        await asyncio.sleep(0.01)
+        c.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await c
+        await asyncio.sleep(0.15)
+        return finished
+
+    assert asyncio.run(run()) == [1]
+
+
+def test_stream_fanout_delivers_same_events():
+    """Streaming bekleyenler aynı olay akışını baştan itibaren almalı"""
+    produced = []
+
+    async def source():
+        produced.append(1)
+        for i in range(5):
+            await asyncio.sleep(0.01)
+            yield i
+
+    async def consume(flight):
+        return [e async for e in flight.stream("k", source)]
+
+    async def run():
+        flight = SingleFlight()
+        first = asyncio.create_task(consume(flight))
+        await asyncio.sleep(0.025)  # ikinci dinleyen akış ortasında katılıyor
+        second = asyncio.create_task(consume(flight))
+        return await asyncio.gather(first, second)
+
+    first, second = asyncio.run(run())
+    assert produced == [1]
+    assert first == second == [0, 1, 2, 3, 4]
+
+
+def test_rag_concurrent_identical_questions_call_llm_once(rag_service):
+    """Aynı anda gelen aynı soru tek LLM çağrısı yapmalı"""
+    rag_service.answer_cache = None
+    doc_id = rag_service.build_index_for_text(text=SAMPLE_TEXT, mode="fast")
+
+    async def run():
+        return await asyncio.gather(*[
+            rag_service.ask_in_doc(doc_id, "What is the deadline?") for _ in range(4)
+        ])
+
+    results = asyncio.run(run())
+    assert len(rag_service.llm_service.prompts) == 1
+    assert len({r["answer"] for r in results}) == 1